@@ -1,11 +1,11 @@
-from flask import Flask, request, jsonify, render_template, send_file, Response
+from flask import Flask, request, jsonify, render_template, send_file, Response, stream_with_context
 from flask_cors import CORS
 from google.cloud import bigquery
+from google.api_core.exceptions import NotFound
 import os
 import json
 from datetime import datetime, timedelta
 import requests
-from functools import lru_cache
 import redis
 import hashlib
 import io
@@ -20,15 +20,43 @@ import subprocess
 # import pdfkit  # Replaced with weasyprint
 import asyncio
 import atexit
+import logging
+import click
+import pyarrow as pa
 from dotenv import load_dotenv
+from services.timing import RequestTiming, span, timed
+from services import metrics
+from services.json_provider import FastJSONProvider, dumps as dumps_json, dumps_bytes as dumps_json_bytes, loads as loads_json
+from services.result_formatting import format_listing_table, format_records, MONTHLY_RECORD_SPEC, SEASONAL_RECORD_SPEC
+from services.bq_fetch import ResultFetcher
+from services.fragment_cache import FragmentCache, MISSING as FRAGMENT_MISSING
+from services.query_ledger import QueryLedger
+from services.query_budget import QueryBudget, QueryBudgetExceeded, parse_limits
+from services.monthly_rollup import MonthlyRollup
+from services.dataset_registry import DatasetRegistry, ROLLUP_TABLE
+from services.cache_warmer import RequestRecorder, CacheWarmer, WARM_HEADER, request_member
+from services.geocoder import OfflineGeocoder, centroid_query, KIND_CITY, KIND_NEIGHBORHOOD, KIND_MSA, KIND_POSTAL, KIND_STATE
+from services.fieldsets import FieldSet, FieldSelectionError
+from services.http_caching import ConditionalCaching, cache_policy, SNAPSHOT_POLICY, NO_STORE_POLICY
+from services.compression import ResponseCompression
+from services.pagination import (
+    PaginationError, parse_page_size, decode_cursor, sort_keys, page_start, keyset_clause, pagination_info
+)
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO'))
+
+# Per-request spans -> Server-Timing header and timing logs (registered first so it closes last)
+RequestTiming(app, sample_rate=float(os.getenv('TIMING_SAMPLE_RATE', 1.0)))
+metrics.RequestMetrics(app)
+
 # Configuration from environment variables
 CLICKUP_API_TOKEN = os.getenv('CLICKUP_API_TOKEN', '')
 PORT = int(os.getenv('PORT', 5004))
@@ -56,6 +84,25 @@ elif 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ:
 
 client = bigquery.Client()
 
+# Results with at least this many rows are downloaded over the BigQuery Storage Read API
+BQ_STORAGE_ROW_THRESHOLD = int(os.getenv('BQ_STORAGE_ROW_THRESHOLD', 5000))
+result_fetcher = ResultFetcher(client, row_threshold=BQ_STORAGE_ROW_THRESHOLD,
+                               on_job_complete=lambda job, statement: record_query_job(job, statement))
+
+# Rolling record of BigQuery jobs (bytes, slot time, wall time) behind /api/debug/query-stats
+query_ledger = QueryLedger(
+    max_records=int(os.getenv('QUERY_LEDGER_SIZE', 1000)),
+    slow_query_ms=float(os.getenv('SLOW_QUERY_MS', 2000)),
+    log_path=os.getenv('QUERY_LOG_PATH') or None
+)
+
+# Byte caps per statement (BQ_STATEMENT_BYTE_LIMITS="nearby=5e9,top_revenue=5e9") over a global default
+query_budget = QueryBudget(
+    default_limit=int(float(os.getenv('BQ_MAX_BYTES_BILLED', 20e9))),
+    limits=parse_limits(os.getenv('BQ_STATEMENT_BYTE_LIMITS', '')),
+    dry_run=os.getenv('BQ_DRY_RUN_GUARD', 'true').lower() == 'true'
+)
+
 # Initialize Redis for caching (optional - will work without it)
 try:
     cache = redis.Redis(host='localhost', port=6379, decode_responses=True)
@@ -69,12 +116,236 @@ except:
 GOOGLE_MAPS_API_KEY = "YOUR_GOOGLE_MAPS_API_KEY"  # Replace with your API key
 DEFAULT_CACHE_TTL = 3600  # 1 hour
 
+# Current monthly snapshot and its tables; `flask --app app cutover-dataset` switches every worker
+datasets = DatasetRegistry(
+    project=os.getenv('BQ_PROJECT', 'aerial-velocity-439702-t7'),
+    default_version=os.getenv('DATASET_VERSION', 'airdna_june2025'),
+    cache=cache if CACHE_ENABLED else None,
+    rollup_table=os.getenv('MONTHLY_ROLLUP_TABLE', ROLLUP_TABLE),  # May use {project} and {version}
+    tag_ttl=DEFAULT_CACHE_TTL * 2  # Longest TTL passed to cache_set()
+)
+
+# Per-property entries (comp rows, projections, details) shared by single and batch lookups
+property_fragments = FragmentCache(cache=cache if CACHE_ENABLED else None, ttl=DEFAULT_CACHE_TTL * 24)
+MISSING_PROPERTY_TTL = DEFAULT_CACHE_TTL  # Unknown ids are re-checked sooner than real entries expire
+
+# Monthly rows with precomputed YoY/MoM and rolling averages, clustered by Property ID
+# (rebuilt with `flask --app app build-monthly-rollup` after each data load), one per snapshot
+monthly_rollups = {}
+
+def current_monthly_rollup():
+    dataset = datasets.current()
+    rollup = monthly_rollups.get(dataset.version)
+    if rollup is None:
+        rollup = monthly_rollups.setdefault(dataset.version, MonthlyRollup(
+            client,
+            source_table=dataset.monthly_table,
+            rollup_table=dataset.rollup_table,
+            version=dataset.version
+        ))
+    return rollup
+
+LOCATION_KINDS = [KIND_CITY, KIND_NEIGHBORHOOD, KIND_MSA, KIND_POSTAL, KIND_STATE]
+
+# Offline geocoder over place centroids from the property table, persisted for all workers
+geocoder = OfflineGeocoder(
+    cache_path=os.getenv('GEOCODER_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'airdna_geocoder.json')),
+    version=datasets.version  # Reloaded by ensure_loaded() after a cutover
+)
+
+# Compression is registered first so it runs after the ETag / 304 handling
+compression = ResponseCompression(app, min_size=int(os.getenv('COMPRESSION_MIN_SIZE', 1024)))
+
+# ETags, 304 revalidation and Cache-Control for GET responses
+ConditionalCaching(app, version=lambda: datasets.version)
+
+# Cached endpoints whose successful requests are counted for warming, by cache prefix
+WARMED_ENDPOINTS = {
+    'search_nearby': 'nearby',
+    'top_revenue': 'top_revenue',
+    'property_details': 'property_details',
+    'property_full_data': 'property_full',
+    'analyze_comparables': 'comps_analysis'
+}
+request_recorder = RequestRecorder(
+    cache=cache if CACHE_ENABLED else None,
+    sample_rate=float(os.getenv('WARM_SAMPLE_RATE', 1.0)),
+    log_path=os.getenv('WARM_LOG_PATH')
+)
+
+@app.after_request
+def record_warmed_request(response):
+    prefix = WARMED_ENDPOINTS.get(request.endpoint)
+    if prefix and response.status_code == 200 and WARM_HEADER not in request.headers:
+        request_recorder.record(prefix, request_member(
+            request.method, request.path, request.args.to_dict(), request.get_json(silent=True)
+        ))
+    return response
+
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+PAGINATION_MAX_ROWS = int(os.getenv('PAGINATION_MAX_ROWS', 1000))  # Rows ranked and cached per paginated search
+MAX_PAGE_SIZE = 500
+
 # Helper function to create cache key
 def make_cache_key(prefix, params):
-    """Create a consistent cache key from parameters"""
-    key_str = f"{prefix}:{json.dumps(params, sort_keys=True)}"
+    """Create a consistent cache key from parameters and the dataset version"""
+    key_str = f"{datasets.version}:{prefix}:{json.dumps(params, sort_keys=True)}"
     return hashlib.md5(key_str.encode()).hexdigest()
 
+# Helper function to serve a cached JSON payload
+def cached_json_response(payload):
+    """Serve a cached JSON string as-is instead of decoding and re-encoding it"""
+    return app.response_class(payload, mimetype=app.json.mimetype)
+
+# Helper functions for timed cache access
+def cache_get(key, prefix='other'):
+    """Read a cached payload, counting hits and misses per key prefix"""
+    with span('cache_get'):
+        value = cache.get(key)
+    metrics.observe_cache(prefix, value is not None)
+    return value
+
+def cache_set(key, value, ttl=DEFAULT_CACHE_TTL, tags=()):
+    """Store a payload, recording it under tags for targeted invalidation"""
+    with span('cache_set'):
+        cache.setex(key, ttl, value)
+        datasets.tag(key, tags, ttl)
+
+# Helper functions for timed BigQuery access
+def submit_query(query, statement='query', dry_run=False, params=None):
+    """
+    Submit a query job capped at the statement's maximum_bytes_billed
+    
+    With dry_run=True the query is estimated first and rejected with
+    QueryBudgetExceeded if it is over budget. params are BigQuery query
+    parameters. Submission and execution wait are timed separately.
+    """
+    if dry_run:
+        query_budget.check(client, query, statement)
+    job_config = query_budget.job_config(statement)
+    if params:
+        job_config = job_config or bigquery.QueryJobConfig()
+        job_config.query_parameters = params
+    with span('bq_submit'):
+        query_job = client.query(query, job_config=job_config)
+    query_ledger.submitted(query_job)
+    return query_job
+
+def record_query_job(query_job, statement):
+    """Export stats of a finished query job under its statement name"""
+    metrics.observe_bigquery_job(statement, query_job)
+    query_ledger.record(query_job, statement)
+
+def query_rows(query, statement, params=None):
+    """Run a query and wait for all result rows"""
+    query_job = submit_query(query, statement, params=params)
+    with span('bq_wait'), query_budget.enforced(statement):
+        rows = list(query_job.result())
+    record_query_job(query_job, statement)
+    return rows
+
+# Helper function to answer over-budget queries
+def query_budget_response(error):
+    return jsonify({
+        'success': False,
+        'error': str(error),
+        'error_code': 'QUERY_TOO_EXPENSIVE',
+        'details': error.details
+    }), 422
+
+# Searches with these parameters can scan far more than usual, so they are dry-run before they start
+UNUSUAL_SEARCH_RADIUS_MILES = 100
+UNUSUAL_SEARCH_LIMIT = 500
+
+def is_unusual_search(limit, radius_miles=0, location_filter=''):
+    """Very large limits, wide radii and free-text LIKE location filters"""
+    return limit > UNUSUAL_SEARCH_LIMIT or radius_miles > UNUSUAL_SEARCH_RADIUS_MILES or bool(location_filter)
+
+# Helper function to detect streaming requests
+def wants_ndjson_stream():
+    """Streaming is requested with ?stream=1 or an Accept: application/x-ndjson header"""
+    return (request.args.get('stream', '').lower() in ('1', 'true')
+            or NDJSON_MIMETYPE in request.headers.get('Accept', ''))
+
+# Helper function to encode one NDJSON line
+def ndjson_line(obj):
+    return dumps_json_bytes(obj) + b'\n'
+
+# Helper function to stream a search as NDJSON
+def ndjson_response(lines):
+    """Chunked response that flushes each line as it is produced"""
+    response = Response(stream_with_context(lines), mimetype=NDJSON_MIMETYPE)
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# Helper function to merge a ?fields= parameter into a JSON body
+def with_query_fields(data):
+    """Sparse fieldsets can be given in the query string or body; either way they key the cache"""
+    data = data or {}
+    if request.args.get('fields'):
+        return {**data, 'fields': request.args['fields']}
+    return data
+
+# Helper function to read pagination parameters
+def pagination_params(data):
+    """(page_size, cursor) when the request asks for a page, otherwise None"""
+    if 'page_size' not in data and 'cursor' not in data:
+        return None
+    return parse_page_size(data.get('page_size', 50), MAX_PAGE_SIZE), data.get('cursor')
+
+# Helper function to serve one page of a ranked search
+def paginate_search(prefix, data, paging, run_query, sort_column, descending, rank_column=None, sections=None):
+    """
+    Serve one page of a ranked search using keyset cursors
+    
+    The first page ranks up to PAGINATION_MAX_ROWS rows once and caches the
+    ranked list; later pages are sliced from it by cursor. Pages past the
+    cached ranking, or any page without Redis, run a keyset query for that
+    page only. run_query(limit, after) returns an Arrow table ordered by
+    (sort_column, Property ID).
+    
+    Returns:
+        Tuple of (properties, pagination info)
+    """
+    page_size, cursor = paging
+    params = {key: value for key, value in data.items() if key not in ('cursor', 'page_size', 'limit')}
+    query_key = make_cache_key(f"ranked:{prefix}", params)
+    after = decode_cursor(cursor, query_key) if cursor else None
+    with_rank = rank_column is not None
+    
+    ranked = None
+    if CACHE_ENABLED:
+        cached_ranking = cache_get(query_key, f"ranked:{prefix}")
+        if cached_ranking:
+            ranked = loads_json(cached_ranking)
+        elif after is None:
+            table = run_query(PAGINATION_MAX_ROWS, None)
+            ranked = {
+                'keys': sort_keys(table, sort_column),
+                'properties': format_listing_table(table, with_rank=with_rank, sections=sections),
+                'complete': table.num_rows < PAGINATION_MAX_ROWS
+            }
+            cache_set(query_key, dumps_json(ranked), tags=[f"ranked:{prefix}"])
+    
+    if ranked is not None:
+        keys = ranked['keys']
+        start = page_start(keys, after, descending)
+        if start < len(keys) or ranked['complete']:
+            end = min(start + page_size, len(keys))
+            has_more = end < len(keys) or not ranked['complete']
+            last_key = keys[end - 1] if end > start else None
+            return ranked['properties'][start:end], pagination_info(page_size, last_key, has_more, query_key)
+    
+    # Fetch one extra row to learn whether another page exists
+    table = run_query(page_size + 1, after)
+    has_more = table.num_rows > page_size
+    table = table.slice(0, page_size)
+    start_rank = table.column(rank_column)[0].as_py() if with_rank and table.num_rows else 1
+    properties = format_listing_table(table, with_rank=with_rank, start_rank=start_rank, sections=sections)
+    keys = sort_keys(table, sort_column)
+    return properties, pagination_info(page_size, keys[-1] if keys else None, has_more, query_key)
+
 # Helper function to parse listing images
 def parse_listing_images(images_string, main_image_url):
     """Parse listing images field and return array of image URLs"""
@@ -123,154 +394,219 @@ def format_occupancy(decimal_value):
     percentage = float(decimal_value) * 100
     return f"{percentage:.1f}"
 
+# Helper function to load the geocoder index
+def load_geocoder_rows():
+    return query_rows(
+        centroid_query(datasets.current().property_table),
+        'geocoder_centroids'
+    )
+
 # Helper function to geocode address
-@lru_cache(maxsize=1000)
 def geocode_address(address):
-    """Convert address to lat/lng using Google Geocoding API"""
-    # For now, return some default coordinates
-    # In production, use Google Geocoding API
-    default_coords = {
-        "miami beach, fl": {"lat": 25.7907, "lng": -80.1300},
-        "miami, fl": {"lat": 25.7617, "lng": -80.1918},
-        "new york, ny": {"lat": 40.7128, "lng": -74.0060},
-        "los angeles, ca": {"lat": 34.0522, "lng": -118.2437},
-        "san diego, ca": {"lat": 32.7157, "lng": -117.1611},
-        "austin, tx": {"lat": 30.2672, "lng": -97.7431},
-        "orlando, fl": {"lat": 28.5383, "lng": -81.3792},
-        "nashville, tn": {"lat": 36.1627, "lng": -86.7816}
-    }
+    """Resolve a free-text location to the centroid of the best matching city, neighborhood or postal code
     
-    address_lower = address.lower()
-    for key, coords in default_coords.items():
-        if key in address_lower:
-            return coords
-    
-    # Default to Miami if not found
-    return {"lat": 25.7617, "lng": -80.1918}
+    Returns:
+        dict with lat, lng and the matched place, or None if nothing matches
+    """
+    with span('geocode'):
+        geocoder.ensure_loaded(load_geocoder_rows, datasets.version)
+        place = geocoder.lookup(address)
+    if place is None:
+        return None
+    return {'lat': place.lat, 'lng': place.lng, 'matched': place.label}
+
+# Helper function to resolve a canonical location id (from /api/locations/suggest)
+def resolve_location_id(location_id):
+    geocoder.ensure_loaded(load_geocoder_rows, datasets.version)
+    return geocoder.place(location_id)
+
+# Helper function to answer unknown location ids
+def unknown_location_id_response(location_id):
+    return jsonify({
+        'success': False,
+        'error': f"Unknown location_id '{location_id}'",
+        'error_code': 'UNKNOWN_LOCATION_ID'
+    }), 400
+
+# Helper function to answer unresolvable locations
+def location_not_found_response(location):
+    return jsonify({
+        'success': False,
+        'error': f"Could not find a city, neighborhood or postal code matching '{location}'",
+        'error_code': 'LOCATION_NOT_FOUND'
+    }), 400
 
 # Route: Home page
 @app.route('/')
 def index():
     return render_template('dashboard.html')
 
+# Route: Location autocomplete
+@app.route('/api/locations/suggest')
+@cache_policy(SNAPSHOT_POLICY)
+def suggest_locations():
+    """
+    Cities, neighborhoods, metro areas, postal codes and states starting with ?q=, most properties first
+    
+    Each suggestion's id can be sent as location_id to the search APIs.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'q is required', 'error_code': 'INVALID_PARAMETER'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', 10)), 50))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'limit must be an integer', 'error_code': 'INVALID_PARAMETER'}), 400
+    kinds = {kind.strip() for kind in request.args.get('kinds', '').split(',') if kind.strip()} or None
+    unknown_kinds = (kinds or set()) - set(LOCATION_KINDS)
+    if unknown_kinds:
+        return jsonify({
+            'success': False,
+            'error': f"Unknown kinds: {', '.join(sorted(unknown_kinds))}. Available: {', '.join(LOCATION_KINDS)}",
+            'error_code': 'INVALID_PARAMETER'
+        }), 400
+    
+    geocoder.ensure_loaded(load_geocoder_rows, datasets.version)
+    suggestions = geocoder.suggest(query, limit=limit, kinds=kinds)
+    return jsonify({
+        'success': True,
+        'query': query,
+        'suggestions': [place.as_dict() for place in suggestions]
+    })
+
+# Sparse fieldsets for listing searches (nearby / top-revenue); each group is one response section
+LISTING_FIELDSET = FieldSet(
+    always=[
+        '`Property ID`',
+        '`Listing Title`',
+        'City',
+        'CAST(Bedrooms AS INT64) as Bedrooms',
+        '`Revenue LTM _USD_` as revenue_annual'
+    ],
+    groups={
+        'location': ['State', 'Latitude', 'Longitude'],
+        'details': [
+            '`Property Type`',
+            '`Overall Rating` as rating',
+            '`Airbnb Superhost` as is_superhost',
+            'License',
+            '`Number of Reviews` as review_count',
+            '`Has Pool` as has_pool',
+            '`Has Hot Tub` as has_hot_tub',
+            '`Listing Main Image URL` as main_image_url'
+        ],
+        'metrics': ['`Occupancy Rate LTM` as occupancy_rate', 'CAST(`ADR _USD_` AS FLOAT64) as adr']
+    },
+    aliases={
+        'map': ['location', 'metrics'],
+        'card': ['details', 'metrics']
+    }
+)
+
 # Route: Search properties by distance
 @app.route('/api/properties/nearby', methods=['POST'])
 def search_nearby():
     try:
         # Get parameters
-        data = request.json
+        data = with_query_fields(request.json)
         address = data.get('address', 'Miami, FL')
         min_beds = int(data.get('min_beds', 1))
         max_beds = int(data.get('max_beds', 10))
         radius_miles = float(data.get('radius_miles', 25))
         limit = int(data.get('limit', 50))
+        sections = LISTING_FIELDSET.parse(data.get('fields'))
+        
+        paging = pagination_params(data)
         
         # Check cache first
         cache_key = make_cache_key('nearby', data)
-        if CACHE_ENABLED:
-            cached_result = cache.get(cache_key)
+        if CACHE_ENABLED and not paging:
+            cached_result = cache_get(cache_key, 'nearby')
             if cached_result:
-                return json.loads(cached_result)
-        
-        # Geocode address
-        coords = geocode_address(address)
+                return cached_json_response(cached_result)
+        
+        # A canonical location id is used as-is; free text is geocoded
+        location_id = data.get('location_id')
+        if location_id:
+            place = resolve_location_id(location_id)
+            if place is None:
+                return unknown_location_id_response(location_id)
+            address = place.label
+            coords = {'lat': place.lat, 'lng': place.lng, 'matched': place.label}
+        else:
+            coords = geocode_address(address)
+            if coords is None:
+                return location_not_found_response(address)
         lat, lng = coords['lat'], coords['lng']
         
-        # BigQuery query for nearby properties
-        query = f"""
-        WITH property_distances AS (
-            SELECT 
-                `Property ID`,
-                `Listing Title`,
-                City,
-                State,
-                CAST(Bedrooms AS INT64) as Bedrooms,
-                `Property Type`,
-                `Revenue LTM _USD_` as revenue_annual,
-                `Occupancy Rate LTM` as occupancy_rate,
-                CAST(`ADR _USD_` AS FLOAT64) as adr,
-                `Overall Rating` as rating,
-                `Airbnb Superhost` as is_superhost,
-                Latitude,
-                Longitude,
-                License,
-                `Number of Reviews` as review_count,
-                `Has Pool` as has_pool,
-                `Has Hot Tub` as has_hot_tub,
-                `Listing Main Image URL` as main_image_url,
-                ST_DISTANCE(
-                    ST_GEOGPOINT(Longitude, Latitude),
-                    ST_GEOGPOINT({lng}, {lat})
-                ) / 1609.34 as distance_miles
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
-            WHERE Latitude IS NOT NULL 
-                AND Longitude IS NOT NULL
-                AND `Revenue LTM _USD_` > 0
-                AND `Active Listing Nights LTM` > 30
-                AND CAST(Bedrooms AS INT64) BETWEEN {min_beds} AND {max_beds}
-                AND CAST(`Number of Reviews` AS INT64) > 0
-        ),
-        percentiles AS (
+        # BigQuery query for nearby properties, ordered by (distance, Property ID)
+        listing_columns = LISTING_FIELDSET.select_list(sections, ',\n                    ')
+        
+        def build_query(limit, after=None):
+            return f"""
+            WITH property_distances AS (
+                SELECT 
+                    {listing_columns},
+                    ST_DISTANCE(
+                        ST_GEOGPOINT(Longitude, Latitude),
+                        ST_GEOGPOINT({lng}, {lat})
+                    ) / 1609.34 as distance_miles
+                FROM `{datasets.current().property_table}`
+                WHERE Latitude IS NOT NULL 
+                    AND Longitude IS NOT NULL
+                    AND `Revenue LTM _USD_` > 0
+                    AND `Active Listing Nights LTM` > 30
+                    AND CAST(Bedrooms AS INT64) BETWEEN {min_beds} AND {max_beds}
+                    AND CAST(`Number of Reviews` AS INT64) > 0
+            ),
+            percentiles AS (
+                SELECT 
+                    APPROX_QUANTILES(revenue_annual, 100)[OFFSET(90)] as p90,
+                    APPROX_QUANTILES(revenue_annual, 100)[OFFSET(75)] as p75,
+                    APPROX_QUANTILES(revenue_annual, 100)[OFFSET(50)] as p50,
+                    APPROX_QUANTILES(revenue_annual, 100)[OFFSET(25)] as p25
+                FROM property_distances
+                WHERE distance_miles <= {radius_miles}
+            )
             SELECT 
-                APPROX_QUANTILES(revenue_annual, 100)[OFFSET(90)] as p90,
-                APPROX_QUANTILES(revenue_annual, 100)[OFFSET(75)] as p75,
-                APPROX_QUANTILES(revenue_annual, 100)[OFFSET(50)] as p50,
-                APPROX_QUANTILES(revenue_annual, 100)[OFFSET(25)] as p25
-            FROM property_distances
-            WHERE distance_miles <= {radius_miles}
-        )
-        SELECT 
-            p.*,
-            CASE 
-                WHEN p.revenue_annual >= pc.p90 THEN 'top_10'
-                WHEN p.revenue_annual >= pc.p75 THEN 'top_25'
-                WHEN p.revenue_annual >= pc.p50 THEN 'above_average'
-                WHEN p.revenue_annual >= pc.p25 THEN 'average'
-                ELSE 'below_average'
-            END as performance_tier
-        FROM property_distances p
-        CROSS JOIN percentiles pc
-        WHERE p.distance_miles <= {radius_miles}
-        ORDER BY p.distance_miles ASC
-        LIMIT {limit}
-        """
+                p.*,
+                CASE 
+                    WHEN p.revenue_annual >= pc.p90 THEN 'top_10'
+                    WHEN p.revenue_annual >= pc.p75 THEN 'top_25'
+                    WHEN p.revenue_annual >= pc.p50 THEN 'above_average'
+                    WHEN p.revenue_annual >= pc.p25 THEN 'average'
+                    ELSE 'below_average'
+                END as performance_tier
+            FROM property_distances p
+            CROSS JOIN percentiles pc
+            WHERE p.distance_miles <= {radius_miles}
+                {keyset_clause('p', 'distance_miles', after, descending=False)}
+            ORDER BY p.distance_miles ASC, p.`Property ID`
+            LIMIT {limit}
+            """
         
-        # Execute query
-        query_job = client.query(query)
-        results = list(query_job.result())
-        
-        # Format response
-        properties = []
-        for row in results:
-            properties.append({
-                'property_id': row['Property ID'],
-                'title': row['Listing Title'] or f"{row['Bedrooms']}BR in {row['City']}",
-                'location': {
-                    'city': row['City'],
-                    'state': row['State'],
-                    'lat': row['Latitude'],
-                    'lng': row['Longitude'],
-                    'distance_miles': round(row['distance_miles'], 1)
-                },
-                'details': {
-                    'bedrooms': row['Bedrooms'],
-                    'property_type': row['Property Type'],
-                    'has_license': bool(row['License']),
-                    'is_superhost': row['is_superhost'],
-                    'rating': float(row['rating']) if row['rating'] else None,
-                    'review_count': int(row['review_count']) if row['review_count'] else 0,
-                    'has_pool': row['has_pool'],
-                    'has_hot_tub': row['has_hot_tub'],
-                    'main_image_url': row['main_image_url']
-                },
-                'metrics': {
-                    'revenue_annual': int(row['revenue_annual']),
-                    'occupancy_rate': round(row['occupancy_rate'] * 100, 1) if row['occupancy_rate'] else 0,
-                    'adr': int(row['adr']) if row['adr'] else 0,
-                    'performance_tier': row['performance_tier']
-                }
+        unusual = is_unusual_search(limit, radius_miles)
+        
+        def run_query(limit, after=None):
+            with query_budget.enforced('nearby'):
+                query_job = submit_query(build_query(limit, after), 'nearby', dry_run=unusual)
+                return result_fetcher.fetch_arrow(query_job, 'nearby')
+        
+        if paging:
+            properties, pagination = paginate_search('nearby', data, paging, run_query,
+                                                     'distance_miles', descending=False, sections=sections)
+            return jsonify({
+                'success': True,
+                'search_location': address,
+                'coordinates': coords,
+                'total_results': len(properties),
+                'properties': properties,
+                'pagination': pagination
             })
         
+        # Execute query and format the result columns in bulk
+        properties = format_listing_table(run_query(limit), sections=sections)
+        
         response = {
             'success': True,
             'search_location': address,
@@ -281,10 +617,16 @@ def search_nearby():
         
         # Cache the result
         if CACHE_ENABLED:
-            cache.setex(cache_key, DEFAULT_CACHE_TTL, json.dumps(response))
+            cache_set(cache_key, dumps_json(response), tags=['nearby'])
         
         return jsonify(response)
         
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_PAGINATION'}), 400
+    except FieldSelectionError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_FIELDS'}), 400
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -293,76 +635,112 @@ def search_nearby():
 def top_revenue():
     try:
         # Get parameters
-        data = request.json
+        data = with_query_fields(request.json)
         location_filter = data.get('location', '').strip()
+        location_id = data.get('location_id')
         min_beds = int(data.get('min_beds', 1))
         max_beds = int(data.get('max_beds', 10))
         limit = int(data.get('limit', 100))
+        sections = LISTING_FIELDSET.parse(data.get('fields'))
         
         # Distance filter parameters
         distance_from = data.get('distance_from', '').strip()
         max_distance = float(data.get('max_distance', 0))
         
+        stream = wants_ndjson_stream()
+        paging = None if stream else pagination_params(data)
+        
         # Check cache
         cache_key = make_cache_key('top_revenue', data)
-        if CACHE_ENABLED:
-            cached_result = cache.get(cache_key)
+        if CACHE_ENABLED and not paging:
+            cached_result = cache_get(cache_key, 'top_revenue')
             if cached_result:
-                return json.loads(cached_result)
+                if stream:
+                    return ndjson_response(stream_cached_properties(loads_json(cached_result)))
+                return cached_json_response(cached_result)
         
-        # Build location filter
+        # Build location filter; canonical location ids become equality filters instead of a LIKE scan
         location_clause = ""
-        if location_filter:
+        if location_id:
+            place = resolve_location_id(location_id)
+            if place is None:
+                return unknown_location_id_response(location_id)
+            location_clause = f"AND {place.filter_sql()}"
+            location_filter = place.label
+        elif location_filter:
             location_clause = f"AND (LOWER(City) LIKE LOWER('%{location_filter}%') OR LOWER(State) LIKE LOWER('%{location_filter}%'))"
         
+        listing_columns = LISTING_FIELDSET.select_list(sections, ',\n                    ')
+        
         # Handle distance filtering
         if distance_from and max_distance > 0:
             # Geocode the location
             coords = geocode_address(distance_from)
+            if coords is None:
+                return location_not_found_response(distance_from)
             lat, lng = coords['lat'], coords['lng']
             
             # Build distance-based query
-            query = f"""
-            WITH distance_filtered AS (
+            def build_query(limit, after=None):
+                return f"""
+                WITH distance_filtered AS (
+                    SELECT 
+                        {listing_columns},
+                        ST_DISTANCE(
+                            ST_GEOGPOINT(Longitude, Latitude),
+                            ST_GEOGPOINT({lng}, {lat})
+                        ) / 1609.34 as distance_miles
+                    FROM `{datasets.current().property_table}`
+                    WHERE `Revenue LTM _USD_` > 0
+                        AND `Active Listing Nights LTM` > 30
+                        AND CAST(Bedrooms AS INT64) BETWEEN {min_beds} AND {max_beds}
+                        AND CAST(`Number of Reviews` AS INT64) > 0
+                        AND Latitude IS NOT NULL
+                        AND Longitude IS NOT NULL
+                        {location_clause}
+                ),
+                ranked_properties AS (
+                    SELECT 
+                        *,
+                        ROW_NUMBER() OVER (ORDER BY revenue_annual DESC, `Property ID`) as revenue_rank
+                    FROM distance_filtered
+                    WHERE distance_miles <= {max_distance}
+                ),
+                total_count AS (
+                    SELECT COUNT(*) as total_properties
+                    FROM ranked_properties
+                )
                 SELECT 
-                    `Property ID`,
-                    `Listing Title`,
-                    City,
-                    State,
-                    CAST(Bedrooms AS INT64) as Bedrooms,
-                    `Property Type`,
-                    `Revenue LTM _USD_` as revenue_annual,
-                    `Occupancy Rate LTM` as occupancy_rate,
-                    CAST(`ADR _USD_` AS FLOAT64) as adr,
-                    `Overall Rating` as rating,
-                    `Airbnb Superhost` as is_superhost,
-                    Latitude,
-                    Longitude,
-                    License,
-                    `Number of Reviews` as review_count,
-                    `Has Pool` as has_pool,
-                    `Has Hot Tub` as has_hot_tub,
-                    `Listing Main Image URL` as main_image_url,
-                    ST_DISTANCE(
-                        ST_GEOGPOINT(Longitude, Latitude),
-                        ST_GEOGPOINT({lng}, {lat})
-                    ) / 1609.34 as distance_miles
-                FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+                    r.*,
+                    t.total_properties,
+                    CASE 
+                        WHEN r.revenue_rank <= t.total_properties * 0.1 THEN 'top_10'
+                        WHEN r.revenue_rank <= t.total_properties * 0.25 THEN 'top_25'
+                        WHEN r.revenue_rank <= t.total_properties * 0.5 THEN 'above_average'
+                        ELSE 'average'
+                    END as performance_tier
+                FROM ranked_properties r
+                CROSS JOIN total_count t
+                WHERE TRUE
+                    {keyset_clause('r', 'revenue_annual', after, descending=True)}
+                ORDER BY r.revenue_annual DESC, r.`Property ID`
+                LIMIT {limit}
+                """
+        else:
+            # Standard query without distance filter
+            def build_query(limit, after=None):
+                return f"""
+            WITH ranked_properties AS (
+                SELECT 
+                    {listing_columns},
+                    ROW_NUMBER() OVER (ORDER BY `Revenue LTM _USD_` DESC, `Property ID`) as revenue_rank
+                FROM `{datasets.current().property_table}`
                 WHERE `Revenue LTM _USD_` > 0
                     AND `Active Listing Nights LTM` > 30
                     AND CAST(Bedrooms AS INT64) BETWEEN {min_beds} AND {max_beds}
                     AND CAST(`Number of Reviews` AS INT64) > 0
-                    AND Latitude IS NOT NULL
-                    AND Longitude IS NOT NULL
                     {location_clause}
             ),
-            ranked_properties AS (
-                SELECT 
-                    *,
-                    ROW_NUMBER() OVER (ORDER BY revenue_annual DESC) as revenue_rank
-                FROM distance_filtered
-                WHERE distance_miles <= {max_distance}
-            ),
             total_count AS (
                 SELECT COUNT(*) as total_properties
                 FROM ranked_properties
@@ -378,101 +756,37 @@ def top_revenue():
                 END as performance_tier
             FROM ranked_properties r
             CROSS JOIN total_count t
-            WHERE r.revenue_rank <= {limit}
-            ORDER BY r.revenue_annual DESC
+            WHERE TRUE
+                {keyset_clause('r', 'revenue_annual', after, descending=True)}
+            ORDER BY r.revenue_annual DESC, r.`Property ID`
+            LIMIT {limit}
             """
-        else:
-            # Standard query without distance filter
-            query = f"""
-        WITH ranked_properties AS (
-            SELECT 
-                `Property ID`,
-                `Listing Title`,
-                City,
-                State,
-                CAST(Bedrooms AS INT64) as Bedrooms,
-                `Property Type`,
-                `Revenue LTM _USD_` as revenue_annual,
-                `Occupancy Rate LTM` as occupancy_rate,
-                CAST(`ADR _USD_` AS FLOAT64) as adr,
-                `Overall Rating` as rating,
-                `Airbnb Superhost` as is_superhost,
-                Latitude,
-                Longitude,
-                License,
-                `Number of Reviews` as review_count,
-                `Has Pool` as has_pool,
-                `Has Hot Tub` as has_hot_tub,
-                `Listing Main Image URL` as main_image_url,
-                ROW_NUMBER() OVER (ORDER BY `Revenue LTM _USD_` DESC) as revenue_rank
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
-            WHERE `Revenue LTM _USD_` > 0
-                AND `Active Listing Nights LTM` > 30
-                AND CAST(Bedrooms AS INT64) BETWEEN {min_beds} AND {max_beds}
-                AND CAST(`Number of Reviews` AS INT64) > 0
-                {location_clause}
-        ),
-        total_count AS (
-            SELECT COUNT(*) as total_properties
-            FROM ranked_properties
-        )
-        SELECT 
-            r.*,
-            t.total_properties,
-            CASE 
-                WHEN r.revenue_rank <= t.total_properties * 0.1 THEN 'top_10'
-                WHEN r.revenue_rank <= t.total_properties * 0.25 THEN 'top_25'
-                WHEN r.revenue_rank <= t.total_properties * 0.5 THEN 'above_average'
-                ELSE 'average'
-            END as performance_tier
-        FROM ranked_properties r
-        CROSS JOIN total_count t
-        WHERE r.revenue_rank <= {limit}
-        ORDER BY r.revenue_annual DESC
-        """
         
-        # Execute query
-        query_job = client.query(query)
-        results = list(query_job.result())
-        
-        # Format response
-        properties = []
-        for i, row in enumerate(results):
-            location_data = {
-                'city': row['City'],
-                'state': row['State'],
-                'lat': row['Latitude'],
-                'lng': row['Longitude']
-            }
-            
-            # Add distance if it exists in the results
-            if 'distance_miles' in row:
-                location_data['distance_miles'] = round(row['distance_miles'], 1)
-            
-            properties.append({
-                'rank': i + 1,
-                'property_id': row['Property ID'],
-                'title': row['Listing Title'] or f"{row['Bedrooms']}BR in {row['City']}",
-                'location': location_data,
-                'details': {
-                    'bedrooms': row['Bedrooms'],
-                    'property_type': row['Property Type'],
-                    'has_license': bool(row['License']),
-                    'is_superhost': row['is_superhost'],
-                    'rating': float(row['rating']) if row['rating'] else None,
-                    'review_count': int(row['review_count']) if row['review_count'] else 0,
-                    'has_pool': row['has_pool'],
-                    'has_hot_tub': row['has_hot_tub'],
-                    'main_image_url': row['main_image_url']
-                },
-                'metrics': {
-                    'revenue_annual': int(row['revenue_annual']),
-                    'occupancy_rate': round(row['occupancy_rate'] * 100, 1) if row['occupancy_rate'] else 0,
-                    'adr': int(row['adr']) if row['adr'] else 0,
-                    'performance_tier': row['performance_tier']
-                }
+        unusual = is_unusual_search(limit, max_distance if distance_from else 0, '' if location_id else location_filter)
+        
+        if stream:
+            query_job = submit_query(build_query(limit), 'top_revenue_stream', dry_run=unusual)
+            return ndjson_response(stream_top_revenue(query_job, location_filter, sections))
+        
+        def run_query(limit, after=None):
+            with query_budget.enforced('top_revenue'):
+                query_job = submit_query(build_query(limit, after), 'top_revenue', dry_run=unusual)
+                return result_fetcher.fetch_arrow(query_job, 'top_revenue')
+        
+        if paging:
+            properties, pagination = paginate_search('top_revenue', data, paging, run_query, 'revenue_annual',
+                                                     descending=True, rank_column='revenue_rank', sections=sections)
+            return jsonify({
+                'success': True,
+                'location_filter': location_filter,
+                'total_results': len(properties),
+                'properties': properties,
+                'pagination': pagination
             })
         
+        # Execute query and format the result columns in bulk
+        properties = format_listing_table(run_query(limit), with_rank=True, sections=sections)
+        
         response = {
             'success': True,
             'location_filter': location_filter,
@@ -482,106 +796,175 @@ def top_revenue():
         
         # Cache the result
         if CACHE_ENABLED:
-            cache.setex(cache_key, DEFAULT_CACHE_TTL, json.dumps(response))
+            cache_set(cache_key, dumps_json(response), tags=['top_revenue'])
         
         return jsonify(response)
         
+    except PaginationError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_PAGINATION'}), 400
+    except FieldSelectionError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_FIELDS'}), 400
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-# Route: Get property details with monthly data
-@app.route('/api/properties/<property_id>', methods=['GET'])
-def property_details(property_id):
+def stream_top_revenue(query_job, location_filter, sections=None):
+    """
+    Yield top revenue properties as NDJSON while the result pages download
+    
+    One line per property, followed by a summary line. Streamed results are
+    not cached so memory stays bounded by the page size.
+    """
+    total = 0
     try:
-        # Comprehensive query for property details and all monthly data
-        query = f"""
+        for batch in result_fetcher.iter_batches(query_job, 'top_revenue_stream'):
+            table = pa.Table.from_batches([batch])
+            for prop in format_listing_table(table, with_rank=True, start_rank=total + 1, sections=sections):
+                yield ndjson_line(prop)
+            total += table.num_rows
+        yield ndjson_line({
+            'success': True,
+            'location_filter': location_filter,
+            'total_results': total
+        })
+    except Exception as e:
+        yield ndjson_line({'success': False, 'error': str(e), 'total_results': total})
+
+def stream_cached_properties(response):
+    """Replay a cached search response as NDJSON lines"""
+    for prop in response.get('properties', []):
+        yield ndjson_line(prop)
+    summary = {key: value for key, value in response.items() if key != 'properties'}
+    yield ndjson_line(summary)
+
+# Sparse fieldsets for /api/properties/<id>
+DETAILS_FIELDSET = FieldSet(
+    always=['`Property ID`'],
+    groups={
+        'header': [
+            '`Listing Title`', '`Property Type`', '`Listing Type`', 'CAST(Bedrooms AS INT64) as Bedrooms',
+            'Bathrooms', '`Max Guests`', 'City', 'State', '`Postal Code`', 'Neighborhood',
+            '`Metropolitan Statistical Area`', 'Latitude', 'Longitude',
+            '`Listing Main Image URL`', '`Listing URL`'
+        ],
+        'host': [
+            '`Overall Rating`', '`Number of Reviews`', '`Airbnb Superhost`', '`Response Rate`',
+            '`Host Type`', '`Property Manager`'
+        ],
+        'financials': [
+            '`Price Tier`', '`Revenue LTM _USD_`', '`Occupancy Rate LTM`',
+            'CAST(`ADR _USD_` AS FLOAT64) as ADR_LTM', '`Number of Bookings LTM`'
+        ],
+        'amenities': [
+            '`Has Pool`', '`Has Hot Tub`', '`Has Air Con`', '`Has Kitchen`', '`Has Parking`', '`Pets Allowed`'
+        ],
+        'policies': [
+            '`Cancellation Policy`', '`Minimum Stay`', 'License', '`Created Date`',
+            '`Airbnb Property ID`', '`Vrbo Property ID`'
+        ],
+        'stats': [],
+        'monthly': [],
+        'seasonal': []
+    },
+    aliases={
+        'property': ['header', 'host', 'financials', 'amenities', 'policies'],
+        'card': ['header', 'financials']
+    }
+)
+
+DETAILS_MONTHLY_ARRAY = """ARRAY_AGG(STRUCT(
+                m.`Reporting Month` as month,
+                m.revenue,
+                m.revenue_potential,
+                m.occupancy_rate,
+                m.adr,
+                m.reservations,
+                m.reservation_days,
+                m.available_days,
+                m.blocked_days,
+                m.active_nights,
+                m.cleaning_fees,
+                m.is_active as active,
+                m.was_scraped as scraped
+            ) ORDER BY m.`Reporting Month`) as monthly_data"""
+
+# Stats reported for properties without any active months
+EMPTY_DETAILS_STATS = {
+    'months_of_data': 0, 'total_revenue': None, 'total_revenue_potential': None, 'avg_occupancy': None,
+    'avg_adr': None, 'best_month_revenue': None, 'worst_month_revenue': None, 'total_reservations': None,
+    'total_reservation_days': None, 'total_available_days': None, 'total_blocked_days': None,
+    'total_cleaning_fees': None, 'utilization_rate': None, 'optimization_score': None
+}
+
+# Helper function to build the property details query
+def details_query(groups):
+    """
+    Set-based details query for every id in the @property_ids array parameter
+    
+    Returns one row per existing property; only the requested monthly
+    sections are computed.
+    """
+    property_columns = DETAILS_FIELDSET.select_list(groups, ',\n                ')
+    select_items = ['p.`Property ID` as property_id', 'TO_JSON_STRING(p) as property_info']
+    joins = []
+    if 'stats' in groups:
+        select_items.append('s.stats')
+        joins.append('LEFT JOIN aggregated_stats s ON s.`Property ID` = p.`Property ID`')
+    if 'monthly' in groups:
+        select_items.append('ma.monthly_data')
+        joins.append('LEFT JOIN monthly_arrays ma ON ma.`Property ID` = p.`Property ID`')
+    if 'seasonal' in groups:
+        select_items.append('sa.seasonal_data')
+        joins.append('LEFT JOIN seasonal_arrays sa ON sa.`Property ID` = p.`Property ID`')
+    select_list = ',\n            '.join(select_items)
+    join_clause = '\n        '.join(joins)
+    
+    return f"""
         WITH property_info AS (
             SELECT 
-                `Property ID`,
-                `Listing Title`,
-                `Property Type`,
-                `Listing Type`,
-                CAST(Bedrooms AS INT64) as Bedrooms,
-                Bathrooms,
-                `Max Guests`,
-                City,
-                State,
-                `Postal Code`,
-                Neighborhood,
-                `Metropolitan Statistical Area`,
-                Latitude,
-                Longitude,
-                `Price Tier`,
-                `Cancellation Policy`,
-                `Minimum Stay`,
-                `Revenue LTM _USD_`,
-                `Occupancy Rate LTM`,
-                CAST(`ADR _USD_` AS FLOAT64) as ADR_LTM,
-                `Number of Bookings LTM`,
-                `Overall Rating`,
-                `Number of Reviews`,
-                `Airbnb Superhost`,
-                `Response Rate`,
-                `Host Type`,
-                `Property Manager`,
-                `Has Pool`,
-                `Has Hot Tub`,
-                `Has Air Con`,
-                `Has Kitchen`,
-                `Has Parking`,
-                `Pets Allowed`,
-                `Listing Main Image URL`,
-                `Listing URL`,
-                `Created Date`,
-                `Airbnb Property ID`,
-                `Vrbo Property ID`,
-                License
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
-            WHERE `Property ID` = '{property_id}'
+                {property_columns}
+            FROM `{datasets.current().property_table}`
+            WHERE `Property ID` IN UNNEST(@property_ids)
         ),
         monthly_data AS (
-            SELECT 
-                `Reporting Month`,
-                `Revenue _USD_` as revenue,
-                `Revenue Potential _USD_` as revenue_potential,
-                `Occupancy Rate` as occupancy_rate,
-                `ADR _USD_` as adr,
-                `Number of Reservations` as reservations,
-                `Reservation Days` as reservation_days,
-                `Available Days` as available_days,
-                `Blocked Days` as blocked_days,
-                `Active Listing Nights` as active_nights,
-                `Cleaning Fee Total _USD_` as cleaning_fees,
-                Active,
-                `Scraped During Month` as scraped
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025monthly`
-            WHERE `Property ID` = '{property_id}'
-                AND `Reporting Month` >= DATE_SUB(CURRENT_DATE(), INTERVAL 24 MONTH)
-            ORDER BY `Reporting Month` DESC
+            {current_monthly_rollup().properties_months_sql('property_ids', months=24)}
         ),
         aggregated_stats AS (
             SELECT
-                COUNT(*) as months_of_data,
-                SUM(revenue) as total_revenue,
-                SUM(revenue_potential) as total_revenue_potential,
-                AVG(occupancy_rate) as avg_occupancy,
-                AVG(CASE WHEN revenue > 0 THEN adr END) as avg_adr,
-                MAX(revenue) as best_month_revenue,
-                MIN(CASE WHEN revenue > 0 THEN revenue END) as worst_month_revenue,
-                SUM(reservations) as total_reservations,
-                SUM(reservation_days) as total_reservation_days,
-                SUM(available_days) as total_available_days,
-                SUM(blocked_days) as total_blocked_days,
-                SUM(cleaning_fees) as total_cleaning_fees,
-                -- Calculate utilization rate
-                SAFE_DIVIDE(SUM(reservation_days), SUM(active_nights)) as utilization_rate,
-                -- Revenue optimization score
-                SAFE_DIVIDE(SUM(revenue), SUM(revenue_potential)) as optimization_score
+                `Property ID`,
+                TO_JSON_STRING(STRUCT(
+                    COUNT(*) as months_of_data,
+                    SUM(revenue) as total_revenue,
+                    SUM(revenue_potential) as total_revenue_potential,
+                    AVG(occupancy_rate) as avg_occupancy,
+                    AVG(CASE WHEN revenue > 0 THEN adr END) as avg_adr,
+                    MAX(revenue) as best_month_revenue,
+                    MIN(CASE WHEN revenue > 0 THEN revenue END) as worst_month_revenue,
+                    SUM(reservations) as total_reservations,
+                    SUM(reservation_days) as total_reservation_days,
+                    SUM(available_days) as total_available_days,
+                    SUM(blocked_days) as total_blocked_days,
+                    SUM(cleaning_fees) as total_cleaning_fees,
+                    -- Calculate utilization rate
+                    SAFE_DIVIDE(SUM(reservation_days), SUM(active_nights)) as utilization_rate,
+                    -- Revenue optimization score
+                    SAFE_DIVIDE(SUM(revenue), SUM(revenue_potential)) as optimization_score
+                )) as stats
             FROM monthly_data
             WHERE active_nights > 0
+            GROUP BY `Property ID`
+        ),
+        monthly_arrays AS (
+            SELECT
+                m.`Property ID`,
+                {DETAILS_MONTHLY_ARRAY}
+            FROM monthly_data m
+            GROUP BY m.`Property ID`
         ),
         seasonal_performance AS (
             SELECT 
+                `Property ID`,
                 EXTRACT(MONTH FROM `Reporting Month`) as month_num,
                 FORMAT_DATE('%B', `Reporting Month`) as month_name,
                 AVG(revenue) as avg_revenue,
@@ -590,82 +973,162 @@ def property_details(property_id):
                 COUNT(*) as years_of_data
             FROM monthly_data
             WHERE revenue > 0
-            GROUP BY month_num, month_name
-            ORDER BY month_num
+            GROUP BY `Property ID`, month_num, month_name
+        ),
+        seasonal_arrays AS (
+            SELECT
+                `Property ID`,
+                ARRAY_AGG(STRUCT(month_num, month_name, avg_revenue, avg_occupancy, avg_adr, years_of_data)
+                          ORDER BY month_num) as seasonal_data
+            FROM seasonal_performance
+            GROUP BY `Property ID`
         )
         SELECT 
-            (SELECT TO_JSON_STRING(t) FROM property_info t) as property_info,
-            (SELECT TO_JSON_STRING(t) FROM aggregated_stats t) as stats,
-            ARRAY_AGG(STRUCT(
-                m.`Reporting Month` as month,
-                m.revenue,
-                m.revenue_potential,
-                m.occupancy_rate,
-                m.adr,
-                m.reservations,
-                m.reservation_days,
-                m.available_days,
-                m.blocked_days,
-                m.active_nights,
-                m.cleaning_fees,
-                m.Active as active,
-                m.scraped
-            ) ORDER BY m.`Reporting Month`) as monthly_data,
-            ARRAY(SELECT AS STRUCT * FROM seasonal_performance) as seasonal_data
-        FROM monthly_data m
+            {select_list}
+        FROM property_info p
+        {join_clause}
         """
+
+# Helper function to format one property details row
+def format_property_details(row, groups):
+    details = {'property': json.loads(row.property_info) if row.property_info else {}}
+    if 'stats' in groups:
+        details['stats'] = json.loads(row.stats) if row.stats else dict(EMPTY_DETAILS_STATS)
+    
+    # Format monthly and seasonal data column-wise
+    if 'monthly' in groups:
+        details['monthly_data'] = format_records(row.monthly_data, MONTHLY_RECORD_SPEC)
+    if 'seasonal' in groups:
+        details['seasonal_performance'] = format_records(row.seasonal_data, SEASONAL_RECORD_SPEC)
+    return details
+
+# Helper function to fetch property details for many ids in one query
+def fetch_property_details(property_ids, groups, statement='property_details'):
+    """
+    Returns:
+        Dict of property_id -> details payload for the properties that exist
+    """
+    params = [bigquery.ArrayQueryParameter('property_ids', 'STRING', list(property_ids))]
+    rows = query_rows(details_query(groups), statement, params=params)
+    return {row.property_id: format_property_details(row, groups) for row in rows}
+
+# Helper function to version per-property cache entries
+def property_cache_version(groups):
+    """Per-property entries are keyed by dataset version and the field groups they hold"""
+    return f"{datasets.version}:{'+'.join(sorted(groups))}"
+
+def load_property_details(property_ids, groups, statement='property_details'):
+    """
+    Details for many properties, read through the per-property cache
+    
+    Misses are fetched with one query; ids with no property are cached as
+    missing for MISSING_PROPERTY_TTL so repeated 404s skip BigQuery too.
+    
+    Returns:
+        (dict of property_id -> details for the properties that exist, number served from cache)
+    """
+    version = property_cache_version(groups)
+    details = property_fragments.get_many('details', version, property_ids)
+    for pid in property_ids:
+        metrics.observe_cache(statement, pid in details)
+    
+    missing_ids = [pid for pid in property_ids if pid not in details]
+    if missing_ids:
+        fetched = fetch_property_details(missing_ids, groups, statement)
+        property_fragments.set_many('details', version, fetched)
+        property_fragments.set_many('details', version, {
+            pid: FRAGMENT_MISSING for pid in missing_ids if pid not in fetched
+        }, ttl=MISSING_PROPERTY_TTL)
+        details.update(fetched)
+    
+    found = {pid: entry for pid, entry in details.items() if entry != FRAGMENT_MISSING}
+    return found, len(property_ids) - len(missing_ids)
+
+# Route: Get property details with monthly data
+@app.route('/api/properties/<property_id>', methods=['GET'])
+@cache_policy(SNAPSHOT_POLICY)
+def property_details(property_id):
+    try:
+        groups = DETAILS_FIELDSET.parse(request.args.get('fields'))
         
-        query_job = client.query(query)
-        results = list(query_job.result())
-        
-        if not results or not results[0].property_info:
+        details = load_property_details([property_id], groups)[0].get(property_id)
+        if details is None:
             return jsonify({'success': False, 'error': 'Property not found'}), 404
         
-        # Parse JSON strings
-        property_info = json.loads(results[0].property_info) if results[0].property_info else {}
-        stats = json.loads(results[0].stats) if results[0].stats else {}
+        return jsonify({'success': True, **details})
         
-        # Format monthly data
-        monthly_data = []
-        if results[0].monthly_data:
-            for month in results[0].monthly_data:
-                monthly_data.append({
-                    'month': month['month'].strftime('%Y-%m-%d') if month['month'] else None,
-                    'revenue': float(month['revenue']) if month['revenue'] else 0,
-                    'revenue_potential': float(month['revenue_potential']) if month['revenue_potential'] else 0,
-                    'occupancy_rate': float(month['occupancy_rate']) if month['occupancy_rate'] else 0,
-                    'adr': float(month['adr']) if month['adr'] else 0,
-                    'reservations': int(month['reservations']) if month['reservations'] else 0,
-                    'reservation_days': int(month['reservation_days']) if month['reservation_days'] else 0,
-                    'available_days': int(month['available_days']) if month['available_days'] else 0,
-                    'blocked_days': int(month['blocked_days']) if month['blocked_days'] else 0,
-                    'active_nights': int(month['active_nights']) if month['active_nights'] else 0,
-                    'cleaning_fees': float(month['cleaning_fees']) if month['cleaning_fees'] else 0,
-                    'active': month['active'],
-                    'scraped': month['scraped']
-                })
+    except FieldSelectionError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_FIELDS'}), 400
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+MAX_BATCH_PROPERTIES = 250
+
+def validate_batch_request(data):
+    """Validate a batch property lookup request"""
+    errors = []
+    
+    property_ids = data.get('property_ids')
+    if not property_ids:
+        errors.append({
+            'field': 'property_ids',
+            'code': 'REQUIRED',
+            'message': 'Property IDs are required'
+        })
+    elif not isinstance(property_ids, list) or not all(isinstance(pid, str) and pid for pid in property_ids):
+        errors.append({
+            'field': 'property_ids',
+            'code': 'INVALID_TYPE',
+            'message': 'Property IDs must be an array of strings'
+        })
+    elif len(property_ids) > MAX_BATCH_PROPERTIES:
+        errors.append({
+            'field': 'property_ids',
+            'code': 'LIMIT_EXCEEDED',
+            'message': f'Maximum {MAX_BATCH_PROPERTIES} properties allowed'
+        })
+    
+    return errors
+
+# Route: Batch property details
+@app.route('/api/properties/batch', methods=['POST'])
+def property_details_batch():
+    """
+    Details for many properties in one call
+    
+    Properties already in the per-property cache are served from it; the
+    rest are fetched with one set-based query and cached for later lookups.
+    Unknown ids are listed in not_found (and negatively cached).
+    """
+    try:
+        data = with_query_fields(request.json)
+        validation_errors = validate_batch_request(data)
+        if validation_errors:
+            return jsonify({
+                'success': False,
+                'error': 'Validation failed',
+                'details': validation_errors
+            }), 400
         
-        # Format seasonal data
-        seasonal_data = []
-        if results[0].seasonal_data:
-            for season in results[0].seasonal_data:
-                seasonal_data.append({
-                    'month_num': season['month_num'],
-                    'month_name': season['month_name'],
-                    'avg_revenue': float(season['avg_revenue']) if season['avg_revenue'] else 0,
-                    'avg_occupancy': float(season['avg_occupancy']) if season['avg_occupancy'] else 0,
-                    'avg_adr': float(season['avg_adr']) if season['avg_adr'] else 0,
-                    'years_of_data': season['years_of_data']
-                })
+        property_ids = list(dict.fromkeys(data['property_ids']))
+        groups = DETAILS_FIELDSET.parse(data.get('fields'))
         
+        details, cached = load_property_details(property_ids, groups, 'property_details_batch')
+        properties = [{'property_id': pid, **details[pid]} for pid in property_ids if pid in details]
         return jsonify({
             'success': True,
-            'property': property_info,
-            'stats': stats,
-            'monthly_data': monthly_data,
-            'seasonal_performance': seasonal_data
+            'total_results': len(properties),
+            'properties': properties,
+            'not_found': [pid for pid in property_ids if pid not in details],
+            'cached': cached
         })
         
+    except FieldSelectionError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_FIELDS'}), 400
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
@@ -681,120 +1144,79 @@ def property_page(property_id):
                          return_url=return_url,
                          filters=filters)
 
+# Sparse fieldsets for /api/properties/<id>/full
+FULL_FIELDSET = FieldSet(
+    always=['`Property ID`'],
+    groups={
+        'header': [
+            '`Listing Title`', '`Listing URL`', '`Listing Main Image URL`',
+            '`Property Type`', '`Listing Type`', 'CAST(Bedrooms AS INT64) as bedrooms',
+            'Bathrooms as bathrooms', '`Max Guests` as max_guests',
+            'State', 'City', '`Postal Code`', 'Neighborhood',
+            '`Metropolitan Statistical Area`', 'Latitude', 'Longitude'
+        ],
+        'host': [
+            '`Host Type`', '`Property Manager`', '`Airbnb Superhost`',
+            '`Response Rate`', '`Overall Rating`', '`Number of Reviews`'
+        ],
+        'financials': [
+            '`Revenue LTM _USD_` as revenue_ltm',
+            '`Revenue Potential LTM _USD_` as revenue_potential_ltm',
+            '`ADR _USD_` as adr_ltm',
+            '`Occupancy Rate LTM` as occupancy_ltm',
+            '`Number of Bookings LTM` as bookings_ltm'
+        ],
+        'amenities': [
+            '`Has Pool`', '`Has Hot Tub`', '`Has Air Con`',
+            '`Has Gym`', '`Has Kitchen`', '`Has Parking`', '`Pets Allowed`'
+        ],
+        'policies': [
+            '`Minimum Stay`', '`Cancellation Policy`', 'Instantbook', '`Check in`', '`Check out`',
+            '`Price Tier`', 'License', '`Created Date`', '`Cleaning Fee _USD_`'
+        ],
+        # Listing Images can be very large; only selected when asked for
+        'images': ['`Number of Photos`', '`Listing Images`', '`Listing Main Image URL`'],
+        'monthly': [],
+        'market': [],
+        'insights': []
+    },
+    aliases={
+        'property': ['header', 'host', 'financials', 'amenities', 'policies', 'images'],
+        'card': ['header', 'financials']
+    },
+    dependencies={'insights': ['financials', 'monthly', 'market']}
+)
+
 # Route: Enhanced Property Data API
 @app.route('/api/properties/<property_id>/full', methods=['GET'])
+@cache_policy(SNAPSHOT_POLICY)
 def property_full_data(property_id):
     """Returns comprehensive property data with calculations"""
     try:
-        # Query 1: Get all static property data
+        groups = FULL_FIELDSET.parse(request.args.get('fields'))
+        version = property_cache_version(groups)
+        cached_response = property_fragments.get_many('full', version, [property_id]).get(property_id)
+        metrics.observe_cache('property_full', cached_response is not None)
+        if cached_response == FRAGMENT_MISSING:
+            return jsonify({'success': False, 'error': 'Property not found'}), 404
+        if cached_response is not None:
+            return jsonify(cached_response)
+        
+        fetch = FULL_FIELDSET.required(groups)
+        property_columns = FULL_FIELDSET.select_list(fetch, ',\n            ')
+        
+        # Query 1: Get the requested static property data
         property_query = f"""
         SELECT 
-            -- Identifiers
-            `Property ID`,
-            `Listing Title`,
-            `Listing URL`,
-            `Listing Main Image URL`,
-            
-            -- Property Basics
-            `Property Type`,
-            `Listing Type`,
-            CAST(Bedrooms AS INT64) as bedrooms,
-            Bathrooms as bathrooms,
-            `Max Guests` as max_guests,
-            
-            -- Location (all fields from schema)
-            Country, State, City, `Postal Code`, Neighborhood,
-            `Metropolitan Statistical Area`, Latitude, Longitude,
-            
-            -- Host Info
-            `Host Type`, `Property Manager`, `Airbnb Superhost`,
-            `Response Rate`, `Overall Rating`, `Number of Reviews`,
-            
-            -- Financial Metrics (LTM)
-            `Revenue LTM _USD_` as revenue_ltm,
-            `Revenue Potential LTM _USD_` as revenue_potential_ltm,
-            `ADR _USD_` as adr_ltm,
-            `Occupancy Rate LTM` as occupancy_ltm,
-            `Number of Bookings LTM` as bookings_ltm,
-            `Cleaning Fee LTM _USD_` as cleaning_ltm,
-            
-            -- Availability Metrics
-            `Active Listing Nights LTM`,
-            `Count Reservation Days LTM`,
-            `Count Available Days LTM`,
-            `Count Blocked Days LTM`,
-            
-            -- All Ratings
-            `Communication Rating`, `Accuracy Rating`, 
-            `Cleanliness Rating`, `Checkin Rating`,
-            `Location Rating`, `Value Rating`,
-            
-            -- Amenities (all from schema)
-            `Has Pool`, `Has Hot Tub`, `Has Air Con`,
-            `Has Gym`, `Has Kitchen`, `Has Parking`, 
-            `Pets Allowed`,
-            
-            -- Policies
-            `Minimum Stay`, `Cancellation Policy`, Instantbook,
-            `Check in`, `Check out`,
-            
-            -- Pricing Structure
-            `Price Tier`, `Weekly Discount`, `Monthly Discount`,
-            `Cleaning Fee _USD_`,
-            
-            -- Compliance & Meta
-            License, `Created Date`, `Last Scraped Date`,
-            `Number of Photos`,
-            `Listing Images`
-            
-        FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+            {property_columns}
+        FROM `{datasets.current().property_table}`
         WHERE `Property ID` = '{property_id}'
         """
         
-        # Query 2: Get all monthly data with calculations
+        # Query 2: Get all monthly data; derived metrics come precomputed from the rollup
         monthly_query = f"""
-        WITH monthly_metrics AS (
-            SELECT 
-                `Reporting Month`,
-                `Revenue _USD_` as revenue,
-                `Revenue Potential _USD_` as revenue_potential,
-                `Occupancy Rate` as occupancy_rate,
-                `ADR _USD_` as adr,
-                `Number of Reservations` as reservations,
-                `Reservation Days` as reservation_days,
-                `Available Days` as available_days,
-                `Blocked Days` as blocked_days,
-                `Active Listing Nights` as active_nights,
-                `Cleaning Fee Total _USD_` as cleaning_fees,
-                Active as is_active,
-                `Scraped During Month` as was_scraped
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025monthly`
-            WHERE `Property ID` = '{property_id}'
-            ORDER BY `Reporting Month` DESC
-        ),
-        
-        -- Calculate derived metrics
-        monthly_with_calculations AS (
-            SELECT *,
-                -- Year-over-year calculations
-                LAG(revenue, 12) OVER (ORDER BY `Reporting Month`) as revenue_yoy_prev,
-                LAG(occupancy_rate, 12) OVER (ORDER BY `Reporting Month`) as occupancy_yoy_prev,
-                LAG(adr, 12) OVER (ORDER BY `Reporting Month`) as adr_yoy_prev,
-                
-                -- Month-over-month
-                LAG(revenue, 1) OVER (ORDER BY `Reporting Month`) as revenue_mom_prev,
-                
-                -- Rolling averages
-                AVG(revenue) OVER (ORDER BY `Reporting Month` 
-                    ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) as revenue_3mo_avg,
-                AVG(occupancy_rate) OVER (ORDER BY `Reporting Month` 
-                    ROWS BETWEEN 11 PRECEDING AND CURRENT ROW) as occupancy_12mo_avg,
-                    
-                -- Revenue gap
-                (revenue_potential - revenue) as revenue_gap,
-                SAFE_DIVIDE(revenue, revenue_potential) as revenue_optimization_score
-                
-            FROM monthly_metrics
+        WITH monthly_with_calculations AS (
+            {current_monthly_rollup().property_months_sql(property_id)}
         ),
         
         -- Aggregate statistics
@@ -854,7 +1276,7 @@ def property_full_data(property_id):
         market_query = f"""
         WITH property_details AS (
             SELECT City, CAST(Bedrooms AS INT64) as bedrooms
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+            FROM `{datasets.current().property_table}`
             WHERE `Property ID` = '{property_id}'
         ),
         market_stats AS (
@@ -863,7 +1285,7 @@ def property_full_data(property_id):
                 AVG(`Revenue LTM _USD_`) as avg_revenue,
                 AVG(`Occupancy Rate LTM`) as avg_occupancy,
                 AVG(CAST(`ADR _USD_` AS FLOAT64)) as avg_adr
-            FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property` p
+            FROM `{datasets.current().property_table}` p
             JOIN property_details pd ON p.City = pd.City 
                 AND CAST(p.Bedrooms AS INT64) = pd.bedrooms
             WHERE `Revenue LTM _USD_` > 0
@@ -880,69 +1302,96 @@ def property_full_data(property_id):
         """
         
         # Execute all queries
-        property_job = client.query(property_query)
-        property_results = list(property_job.result())
+        property_results = query_rows(property_query, 'property_full')
         
         if not property_results:
+            property_fragments.set_many('full', version, {property_id: FRAGMENT_MISSING}, ttl=MISSING_PROPERTY_TTL)
             return jsonify({'success': False, 'error': 'Property not found'}), 404
         
-        monthly_job = client.query(monthly_query)
-        monthly_results = list(monthly_job.result())
+        monthly_results = []
+        if 'monthly' in fetch:
+            monthly_results = query_rows(monthly_query, 'property_full_monthly')
         
-        market_job = client.query(market_query)
-        market_results = list(market_job.result())
+        market_results = []
+        if 'market' in fetch:
+            market_results = query_rows(market_query, 'property_full_market')
         
-        # Process property data
-        property_data = {}
+        # Process property data, one section per field group
         prop = property_results[0]
+        property_sections = {}
+        
+        if 'header' in fetch:
+            property_sections['header'] = {
+                'listing_title': prop['Listing Title'],
+                'listing_url': prop['Listing URL'],
+                'main_image_url': prop['Listing Main Image URL'],
+                'property_type': prop['Property Type'],
+                'listing_type': prop['Listing Type'],
+                'bedrooms': prop['bedrooms'],
+                'bathrooms': prop['bathrooms'],
+                'max_guests': prop['max_guests'],
+                'city': prop['City'],
+                'state': prop['State'],
+                'postal_code': prop['Postal Code'],
+                'neighborhood': prop['Neighborhood'],
+                'metro_area': prop['Metropolitan Statistical Area'],
+                'latitude': prop['Latitude'],
+                'longitude': prop['Longitude']
+            }
         
-        property_data = {
-            'property_id': prop['Property ID'],
-            'listing_title': prop['Listing Title'],
-            'listing_url': prop['Listing URL'],
-            'main_image_url': prop['Listing Main Image URL'],
-            'property_type': prop['Property Type'],
-            'listing_type': prop['Listing Type'],
-            'bedrooms': prop['bedrooms'],
-            'bathrooms': prop['bathrooms'],
-            'max_guests': prop['max_guests'],
-            'city': prop['City'],
-            'state': prop['State'],
-            'postal_code': prop['Postal Code'],
-            'neighborhood': prop['Neighborhood'],
-            'metro_area': prop['Metropolitan Statistical Area'],
-            'latitude': prop['Latitude'],
-            'longitude': prop['Longitude'],
-            'host_type': prop['Host Type'],
-            'property_manager': prop['Property Manager'],
-            'is_superhost': prop['Airbnb Superhost'],
-            'response_rate': prop['Response Rate'],
-            'overall_rating': float(prop['Overall Rating']) if prop['Overall Rating'] else None,
-            'review_count': int(prop['Number of Reviews']) if prop['Number of Reviews'] else 0,
-            'revenue_ltm': int(prop['revenue_ltm']) if prop['revenue_ltm'] else 0,
-            'revenue_potential_ltm': int(prop['revenue_potential_ltm']) if prop['revenue_potential_ltm'] else 0,
-            'adr_ltm': float(prop['adr_ltm']) if prop['adr_ltm'] else 0,
-            'occupancy_ltm': float(prop['occupancy_ltm']) if prop['occupancy_ltm'] else 0,
-            'bookings_ltm': int(prop['bookings_ltm']) if prop['bookings_ltm'] else 0,
-            'has_pool': prop['Has Pool'],
-            'has_hot_tub': prop['Has Hot Tub'],
-            'has_air_con': prop['Has Air Con'],
-            'has_gym': prop['Has Gym'],
-            'has_kitchen': prop['Has Kitchen'],
-            'has_parking': prop['Has Parking'],
-            'pets_allowed': prop['Pets Allowed'],
-            'minimum_stay': prop['Minimum Stay'],
-            'cancellation_policy': prop['Cancellation Policy'],
-            'instantbook': prop['Instantbook'],
-            'check_in': prop['Check in'],
-            'check_out': prop['Check out'],
-            'price_tier': prop['Price Tier'],
-            'license': prop['License'],
-            'created_date': prop['Created Date'],
-            'cleaning_fee': prop['Cleaning Fee _USD_'],
-            'number_of_photos': int(float(prop['Number of Photos'])) if prop['Number of Photos'] and str(prop['Number of Photos']).strip() else 0,
-            'listing_images': parse_listing_images(prop['Listing Images'], prop['Listing Main Image URL']) if prop.get('Listing Images') else []
-        }
+        if 'host' in fetch:
+            property_sections['host'] = {
+                'host_type': prop['Host Type'],
+                'property_manager': prop['Property Manager'],
+                'is_superhost': prop['Airbnb Superhost'],
+                'response_rate': prop['Response Rate'],
+                'overall_rating': float(prop['Overall Rating']) if prop['Overall Rating'] else None,
+                'review_count': int(prop['Number of Reviews']) if prop['Number of Reviews'] else 0
+            }
+        
+        if 'financials' in fetch:
+            property_sections['financials'] = {
+                'revenue_ltm': int(prop['revenue_ltm']) if prop['revenue_ltm'] else 0,
+                'revenue_potential_ltm': int(prop['revenue_potential_ltm']) if prop['revenue_potential_ltm'] else 0,
+                'adr_ltm': float(prop['adr_ltm']) if prop['adr_ltm'] else 0,
+                'occupancy_ltm': float(prop['occupancy_ltm']) if prop['occupancy_ltm'] else 0,
+                'bookings_ltm': int(prop['bookings_ltm']) if prop['bookings_ltm'] else 0
+            }
+        
+        if 'amenities' in fetch:
+            property_sections['amenities'] = {
+                'has_pool': prop['Has Pool'],
+                'has_hot_tub': prop['Has Hot Tub'],
+                'has_air_con': prop['Has Air Con'],
+                'has_gym': prop['Has Gym'],
+                'has_kitchen': prop['Has Kitchen'],
+                'has_parking': prop['Has Parking'],
+                'pets_allowed': prop['Pets Allowed']
+            }
+        
+        if 'policies' in fetch:
+            property_sections['policies'] = {
+                'minimum_stay': prop['Minimum Stay'],
+                'cancellation_policy': prop['Cancellation Policy'],
+                'instantbook': prop['Instantbook'],
+                'check_in': prop['Check in'],
+                'check_out': prop['Check out'],
+                'price_tier': prop['Price Tier'],
+                'license': prop['License'],
+                'created_date': prop['Created Date'],
+                'cleaning_fee': prop['Cleaning Fee _USD_']
+            }
+        
+        if 'images' in fetch:
+            property_sections['images'] = {
+                'number_of_photos': int(float(prop['Number of Photos'])) if prop['Number of Photos'] and str(prop['Number of Photos']).strip() else 0,
+                'listing_images': parse_listing_images(prop['Listing Images'], prop['Listing Main Image URL']) if prop.get('Listing Images') else []
+            }
+        
+        property_data = {'property_id': prop['Property ID']}
+        for group, section in property_sections.items():
+            if group in groups:
+                property_data.update(section)
         
         # Process monthly data
         monthly_data = {'records': [], 'summary': {}, 'seasonal_patterns': []}
@@ -1010,6 +1459,7 @@ def property_full_data(property_id):
         
         # Generate insights
         insights = []
+        revenue_ltm = property_sections.get('financials', {}).get('revenue_ltm', 0)
         
         # Revenue optimization insight
         if monthly_data['summary'].get('total_missed_revenue', 0) > 10000:
@@ -1021,14 +1471,14 @@ def property_full_data(property_id):
             })
         
         # Market performance insight
-        if market_data and property_data['revenue_ltm'] > market_data.get('p90_revenue', 0):
+        if market_data and revenue_ltm > market_data.get('p90_revenue', 0):
             insights.append({
                 'type': 'success',
                 'title': 'Top 10% Performer',
                 'message': 'This property outperforms 90% of similar properties in the area',
                 'priority': 'high'
             })
-        elif market_data and property_data['revenue_ltm'] > market_data.get('p75_revenue', 0):
+        elif market_data and revenue_ltm > market_data.get('p75_revenue', 0):
             insights.append({
                 'type': 'success',
                 'title': 'Top 25% Performer',
@@ -1052,23 +1502,59 @@ def property_full_data(property_id):
             })
         
         # Response
-        return jsonify({
-            'success': True,
-            'property': property_data,
-            'monthly': monthly_data,
-            'market': market_data,
-            'insights': insights
-        })
+        response = {'success': True, 'property': property_data}
+        if 'monthly' in groups:
+            response['monthly'] = monthly_data
+        if 'market' in groups:
+            response['market'] = market_data
+        if 'insights' in groups:
+            response['insights'] = insights
+        property_fragments.set_many('full', version, {property_id: response})
+        return jsonify(response)
         
+    except FieldSelectionError as e:
+        return jsonify({'success': False, 'error': str(e), 'error_code': 'INVALID_FIELDS'}), 400
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
 # Health check endpoint
 @app.route('/api/health', methods=['GET'])
+@cache_policy(NO_STORE_POLICY)
 def health_check():
     return jsonify({
         'status': 'healthy',
         'cache_enabled': CACHE_ENABLED,
+        'bigquery_downloads': result_fetcher.stats(),
+        'bigquery_budget': query_budget.stats(),
+        'dataset': datasets.stats(),
+        'monthly_rollup': current_monthly_rollup().status(),
+        'geocoder': geocoder.stats(),
+        'timestamp': datetime.utcnow().isoformat()
+    })
+
+# Prometheus metrics (aggregated across gunicorn workers when PROMETHEUS_MULTIPROC_DIR is set)
+@app.route('/metrics')
+@cache_policy(NO_STORE_POLICY)
+def prometheus_metrics():
+    if not metrics.PROMETHEUS_AVAILABLE:
+        return jsonify({'success': False, 'error': 'prometheus_client is not installed'}), 501
+    payload, content_type = metrics.render()
+    return Response(payload, headers={'Content-Type': content_type})
+
+# Debug endpoint summarizing BigQuery cost and latency per statement
+@app.route('/api/debug/query-stats')
+@cache_policy(NO_STORE_POLICY)
+def query_stats():
+    """Bytes, slot time, cache hits and wall time per statement, plus the slow-query log"""
+    try:
+        recent = max(0, min(int(request.args.get('recent', 0)), 200))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'recent must be an integer', 'error_code': 'INVALID_PARAMETER'}), 400
+    return jsonify({
+        'success': True,
+        **query_ledger.summary(recent=recent),
         'timestamp': datetime.utcnow().isoformat()
     })
 
@@ -1077,18 +1563,27 @@ def health_check():
 def debug_property(property_id):
     """Debug endpoint to inspect raw property data"""
     try:
+        cached_analysis = property_fragments.get_many('debug', datasets.version, [property_id]).get(property_id)
+        metrics.observe_cache('debug_property', cached_analysis is not None)
+        if cached_analysis == FRAGMENT_MISSING:
+            return jsonify({'error': 'Property not found'}), 404
+        if cached_analysis is not None:
+            return jsonify(cached_analysis)
+        
         query = f"""
         SELECT 
             `Listing Images`,
             `Listing Main Image URL`,
             `Number of Photos`
-        FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+        FROM `{datasets.current().property_table}`
         WHERE `Property ID` = '{property_id}'
         LIMIT 1
         """
         
-        results = list(client.query(query).result())
+        results = query_rows(query, 'debug_property')
         if not results:
+            property_fragments.set_many('debug', datasets.version, {property_id: FRAGMENT_MISSING},
+                                        ttl=MISSING_PROPERTY_TTL)
             return jsonify({'error': 'Property not found'}), 404
             
         prop = results[0]
@@ -1116,6 +1611,7 @@ def debug_property(property_id):
             }
         }
         
+        property_fragments.set_many('debug', datasets.version, {property_id: analysis})
         return jsonify(analysis)
         
     except Exception as e:
@@ -1125,6 +1621,8 @@ def debug_property(property_id):
 # PDF GENERATION SERVICE
 # ==============================================================================
 
+@timed('chart_render')
+@metrics.CHART_RENDER.labels(kind='standard').time()
 def generate_chart_image(chart_type, data, title="", width=10, height=6):
     """Generate chart image as base64 encoded PNG"""
     try:
@@ -1237,12 +1735,12 @@ def prepare_analysis_pdf_data(property_id):
             `Max Guests`,
             `Listing Type`,
             `Overall Rating`
-        FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+        FROM `{datasets.current().property_table}`
         WHERE `Property ID` = '{property_id}'
         LIMIT 1
         """
         
-        property_results = list(client.query(property_query).result())
+        property_results = query_rows(property_query, 'pdf_property')
         if not property_results:
             raise Exception(f"Property {property_id} not found")
         
@@ -1252,18 +1750,16 @@ def prepare_analysis_pdf_data(property_id):
         monthly_query = f"""
         SELECT 
             EXTRACT(MONTH FROM `Reporting Month`) as month,
-            AVG(`Revenue _USD_`) as avg_revenue,
-            AVG(`Occupancy Rate`) as avg_occupancy,
-            AVG(`ADR _USD_`) as avg_adr,
+            AVG(revenue) as avg_revenue,
+            AVG(occupancy_rate) as avg_occupancy,
+            AVG(adr) as avg_adr,
             COUNT(*) as data_points
-        FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025monthly`
-        WHERE `Property ID` = '{property_id}'
-            AND `Reporting Month` >= DATE_SUB(CURRENT_DATE(), INTERVAL 24 MONTH)
+        FROM ({current_monthly_rollup().property_months_sql(property_id, months=24)})
         GROUP BY EXTRACT(MONTH FROM `Reporting Month`)
         ORDER BY month
         """
         
-        monthly_results = list(client.query(monthly_query).result())
+        monthly_results = query_rows(monthly_query, 'pdf_monthly')
         
         # Process monthly data
         months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
@@ -1691,6 +2187,19 @@ def preview_pdf_html(property_id):
 
 import numpy as np
 from scipy import stats
+from services.outlier_detection import (
+    OUTLIER_METHODS, ANALYSIS_TYPES, METRIC_NAMES, MIN_PROPERTIES,
+    metrics_matrix, detect_outliers, resolve_method, describe_method, applicable_method
+)
+from services.comp_statistics import compute_statistics, weights_vector, correlation_value, WEIGHT_FIELDS
+
+# Bump when the projection logic changes so cached per-property projections are not reused
+PROJECTION_MODEL_VERSION = 'v1'
+ROW_FRAGMENT_VERSION = 'v1'
+
+def fragment_version(model_version):
+    """Comp rows and projections come from the current snapshot, so their entries carry its version"""
+    return f"{datasets.version}:{model_version}"
 
 class ComparableAnalysisError(Exception):
     """Custom exception for comparable analysis errors"""
@@ -1729,172 +2238,210 @@ def validate_analysis_request(data):
             'message': 'Maximum 10 properties allowed'
         })
     
+    weight_by = data.get('weight_by')
+    if weight_by and weight_by not in WEIGHT_FIELDS:
+        errors.append({
+            'field': 'weight_by',
+            'code': 'INVALID_VALUE',
+            'message': f"weight_by must be one of: {', '.join(WEIGHT_FIELDS)}"
+        })
+    
+    analysis_type = data.get('analysis_type', 'standard')
+    if analysis_type not in ANALYSIS_TYPES:
+        errors.append({
+            'field': 'analysis_type',
+            'code': 'INVALID_VALUE',
+            'message': f"analysis_type must be one of: {', '.join(ANALYSIS_TYPES)}"
+        })
+    
     return errors
 
 def apply_outlier_detection(data, method='2_sigma'):
-    """Apply 2-sigma outlier detection to property data"""
-    if len(data) < 3:
+    """Apply vectorized outlier detection (2-sigma, IQR, MAD or Mahalanobis) to property data"""
+    if len(data) < MIN_PROPERTIES:
         return data, []  # Need at least 3 properties for meaningful outlier detection
     
-    revenues = [float(prop.get('revenue_ltm', 0)) for prop in data]
-    occupancies = [float(prop.get('occupancy_ltm', 0)) for prop in data]
+    metrics = metrics_matrix(data)
+    outlier_mask, scores, overall = detect_outliers(metrics, method)
     
-    # Calculate z-scores
-    revenue_mean = np.mean(revenues)
-    revenue_std = np.std(revenues)
-    occupancy_mean = np.mean(occupancies)
-    occupancy_std = np.std(occupancies)
+    clean_data = [prop for prop, is_outlier in zip(data, outlier_mask) if not is_outlier]
     
-    clean_data = []
+    config = OUTLIER_METHODS[method]
+    score_label = config['score_label']
     outliers_removed = []
+    for i in np.flatnonzero(outlier_mask):
+        prop = data[i]
+        outlier = {
+            'property_id': prop.get('Property ID'),
+            'title': prop.get('Listing Title', 'Unknown'),
+            'method': method
+        }
+        for name, score in zip(METRIC_NAMES, scores[i]):
+            outlier[f"{name}_{score_label}"] = round(score, 2)
+        outlier['score'] = round(overall[i], 2)
+        if method == 'mahalanobis':
+            outlier['reason'] = f"{config['description']}: {overall[i]:.2f}"
+        else:
+            outlier['reason'] = ", ".join(
+                f"{name.capitalize()} {config['description']}: {score:.2f}"
+                for name, score in zip(METRIC_NAMES, scores[i])
+            )
+        outliers_removed.append(outlier)
+    
+    return clean_data, outliers_removed
+
+# Seasonal multipliers based on typical short-term rental patterns
+SEASONAL_MULTIPLIERS = {
+    1: 0.75,   # January - Winter low
+    2: 0.70,   # February - Winter low
+    3: 0.85,   # March - Spring pickup
+    4: 0.95,   # April - Spring
+    5: 1.05,   # May - Late spring
+    6: 1.35,   # June - Summer peak
+    7: 1.45,   # July - Summer peak
+    8: 1.40,   # August - Summer peak
+    9: 1.15,   # September - Fall
+    10: 0.95,  # October - Fall
+    11: 0.85,  # November - Fall
+    12: 0.80   # December - Winter holiday
+}
+
+def projection_confidence(property_count):
+    """Projection confidence label for a comp set of the given size"""
+    return 'High' if property_count >= 5 else 'Medium'
+
+def apply_projection_confidence(projection, confidence):
+    """Return a copy of a projection relabelled for a different comp set size"""
+    if projection.get('confidence_level') == confidence:
+        return projection
+    return {
+        **projection,
+        'confidence_level': confidence,
+        'monthly_projections': {
+            month: {**month_data, 'confidence': confidence}
+            for month, month_data in projection['monthly_projections'].items()
+        }
+    }
+
+def project_property(prop, seasonal_analyzer, confidence):
+    """Generate the 12-month projection for a single property"""
+    from services.projection_calculator import calculate_quarterly_projections
     
-    for prop in data:
-        revenue = float(prop.get('revenue_ltm', 0))
-        occupancy = float(prop.get('occupancy_ltm', 0))
+    monthly_baseline = float(prop.get('revenue_ltm', 0)) / 12  # Average monthly
+    occupancy_baseline = float(prop.get('occupancy_ltm', 0)) * 100  # Convert to percentage
+    adr_baseline = float(prop.get('adr_ltm', 0))
+    
+    monthly_projections = {}
+    annual_total = 0
+    
+    # Generate monthly projections
+    for month in range(1, 13):
+        multiplier = SEASONAL_MULTIPLIERS[month]
+        projected_revenue = monthly_baseline * multiplier
+        projected_occupancy = min(95, occupancy_baseline * multiplier)
+        
+        # Calculate ADR more accurately
+        if projected_occupancy > 0:
+            days_in_month = 30.4  # Average days per month
+            booked_nights = (projected_occupancy / 100) * days_in_month
+            projected_adr = projected_revenue / booked_nights if booked_nights > 0 else adr_baseline
+        else:
+            projected_adr = adr_baseline
         
-        revenue_zscore = abs((revenue - revenue_mean) / revenue_std) if revenue_std > 0 else 0
-        occupancy_zscore = abs((occupancy - occupancy_mean) / occupancy_std) if occupancy_std > 0 else 0
+        month_name = datetime(2025, month, 1).strftime('%B')
+        season_name = seasonal_analyzer.season_names[month]
         
-        # Keep if within 2 standard deviations
-        if revenue_zscore <= 2 and occupancy_zscore <= 2:
-            clean_data.append(prop)
-        else:
-            outliers_removed.append({
-                'property_id': prop.get('Property ID'),
-                'title': prop.get('Listing Title', 'Unknown'),
-                'revenue_zscore': round(revenue_zscore, 2),
-                'occupancy_zscore': round(occupancy_zscore, 2),
-                'reason': f"Revenue Z-score: {revenue_zscore:.2f}, Occupancy Z-score: {occupancy_zscore:.2f}"
-            })
+        monthly_projections[str(month)] = {
+            'month': month_name,
+            'revenue': round(projected_revenue),
+            'occupancy': round(projected_occupancy, 1),
+            'adr': round(projected_adr),
+            'booked_nights': round((projected_occupancy / 100) * 30.4) if projected_occupancy > 0 else 0,
+            'season': season_name,
+            'confidence': confidence
+        }
+        annual_total += projected_revenue
     
-    return clean_data, outliers_removed
+    # Calculate quarterly projections
+    quarterly_projections = calculate_quarterly_projections(monthly_projections)
+    
+    # Calculate seasonal analysis
+    seasonal_analysis = seasonal_analyzer.analyze_seasonal_patterns(monthly_projections)
+    peak_season = seasonal_analyzer.identify_peak_season({'monthly_projections': monthly_projections})
+    
+    # Create seasonal summary
+    seasonal_summary = {}
+    for season in ['winter', 'spring', 'summer', 'fall']:
+        seasonal_summary[f"{season}_total"] = seasonal_analysis['seasonal_performance'].get(season, {}).get('average_revenue', 0) * 3  # Multiply by 3 months
+    
+    return {
+        'property_id': prop.get('Property ID'),
+        'title': prop.get('Listing Title'),
+        'location': f"{prop.get('City', 'Unknown')}, {prop.get('State', 'Unknown')}",
+        'annual_total': round(annual_total),
+        'confidence_level': confidence,
+        'peak_season': peak_season,
+        'monthly_projections': monthly_projections,
+        'quarterly_projections': quarterly_projections,
+        'seasonal_summary': seasonal_summary,
+        'risk_factors': {
+            'seasonality_risk': 'High' if seasonal_analysis['seasonal_variation'] > 30 else 'Medium' if seasonal_analysis['seasonal_variation'] > 15 else 'Low',
+            'market_dependency': 'Medium',  # Could be enhanced with more data
+            'competition_level': 'Medium'   # Could be enhanced with more data
+        }
+    }
 
-def calculate_seasonal_projections(properties_data):
-    """Generate monthly projections for the next 12 months with enhanced seasonal analysis"""
+def calculate_seasonal_projections(properties_data, cached_projections=None):
+    """Generate monthly projections for the next 12 months with enhanced seasonal analysis
+    
+    Args:
+        properties_data: List of property rows to project
+        cached_projections: Optional dict of property_id -> previously computed projection,
+            reused instead of re-projecting that property
+    """
     from services.seasonal_analyzer import SeasonalAnalyzer
-    from services.projection_calculator import calculate_quarterly_projections
     
     # Initialize services
     seasonal_analyzer = SeasonalAnalyzer()
-    
-    # Seasonal multipliers based on typical short-term rental patterns
-    seasonal_multipliers = {
-        1: 0.75,   # January - Winter low
-        2: 0.70,   # February - Winter low
-        3: 0.85,   # March - Spring pickup
-        4: 0.95,   # April - Spring
-        5: 1.05,   # May - Late spring
-        6: 1.35,   # June - Summer peak
-        7: 1.45,   # July - Summer peak
-        8: 1.40,   # August - Summer peak
-        9: 1.15,   # September - Fall
-        10: 0.95,  # October - Fall
-        11: 0.85,  # November - Fall
-        12: 0.80   # December - Winter holiday
-    }
+    confidence = projection_confidence(len(properties_data))
+    cached_projections = cached_projections if cached_projections is not None else {}
     
     projections = []
-    
     for prop in properties_data:
-        monthly_baseline = float(prop.get('revenue_ltm', 0)) / 12  # Average monthly
-        occupancy_baseline = float(prop.get('occupancy_ltm', 0)) * 100  # Convert to percentage
-        adr_baseline = float(prop.get('adr_ltm', 0))
-        
-        monthly_projections = {}
-        annual_total = 0
-        
-        # Generate monthly projections
-        for month in range(1, 13):
-            multiplier = seasonal_multipliers[month]
-            projected_revenue = monthly_baseline * multiplier
-            projected_occupancy = min(95, occupancy_baseline * multiplier)
-            
-            # Calculate ADR more accurately
-            if projected_occupancy > 0:
-                days_in_month = 30.4  # Average days per month
-                booked_nights = (projected_occupancy / 100) * days_in_month
-                projected_adr = projected_revenue / booked_nights if booked_nights > 0 else adr_baseline
-            else:
-                projected_adr = adr_baseline
-            
-            month_name = datetime(2025, month, 1).strftime('%B')
-            season_name = seasonal_analyzer.season_names[month]
-            
-            monthly_projections[str(month)] = {
-                'month': month_name,
-                'revenue': round(projected_revenue),
-                'occupancy': round(projected_occupancy, 1),
-                'adr': round(projected_adr),
-                'booked_nights': round((projected_occupancy / 100) * 30.4) if projected_occupancy > 0 else 0,
-                'season': season_name,
-                'confidence': 'High' if len(properties_data) >= 5 else 'Medium'
-            }
-            annual_total += projected_revenue
-        
-        # Calculate quarterly projections
-        quarterly_projections = calculate_quarterly_projections(monthly_projections)
-        
-        # Calculate seasonal analysis
-        seasonal_analysis = seasonal_analyzer.analyze_seasonal_patterns(monthly_projections)
-        peak_season = seasonal_analyzer.identify_peak_season({'monthly_projections': monthly_projections})
-        
-        # Create seasonal summary
-        seasonal_summary = {}
-        for season in ['winter', 'spring', 'summer', 'fall']:
-            seasonal_summary[f"{season}_total"] = seasonal_analysis['seasonal_performance'].get(season, {}).get('average_revenue', 0) * 3  # Multiply by 3 months
-        
-        projections.append({
-            'property_id': prop.get('Property ID'),
-            'title': prop.get('Listing Title'),
-            'location': f"{prop.get('City', 'Unknown')}, {prop.get('State', 'Unknown')}",
-            'annual_total': round(annual_total),
-            'confidence_level': 'High' if len(properties_data) >= 5 else 'Medium',
-            'peak_season': peak_season,
-            'monthly_projections': monthly_projections,
-            'quarterly_projections': quarterly_projections,
-            'seasonal_summary': seasonal_summary,
-            'risk_factors': {
-                'seasonality_risk': 'High' if seasonal_analysis['seasonal_variation'] > 30 else 'Medium' if seasonal_analysis['seasonal_variation'] > 15 else 'Low',
-                'market_dependency': 'Medium',  # Could be enhanced with more data
-                'competition_level': 'Medium'   # Could be enhanced with more data
-            }
-        })
+        cached = cached_projections.get(prop.get('Property ID'))
+        if cached is not None:
+            projections.append(apply_projection_confidence(cached, confidence))
+        else:
+            projections.append(project_property(prop, seasonal_analyzer, confidence))
     
     return projections
 
-def calculate_comp_statistics(clean_data):
-    """Calculate comprehensive statistics for comparable properties"""
+def calculate_comp_statistics(clean_data, weight_by=None):
+    """Calculate comprehensive statistics for comparable properties in one vectorized pass"""
     if not clean_data:
         return {}
     
-    revenues = [float(prop.get('revenue_ltm', 0)) for prop in clean_data]
-    occupancies = [float(prop.get('occupancy_ltm', 0)) * 100 for prop in clean_data]  # Convert to percentage
-    adrs = [float(prop.get('adr_ltm', 0)) for prop in clean_data]
+    # Stack revenue/occupancy/ADR into one matrix (occupancy converted to percentage)
+    metrics = metrics_matrix(clean_data) * np.array([1.0, 100.0, 1.0])
+    summary = compute_statistics(metrics, weights_vector(clean_data, weight_by))
+    
+    def metric_stats(column, digits=None):
+        return {
+            name: round(summary[name][column], digits) if digits else round(summary[name][column])
+            for name in ('mean', 'median', 'std', 'min', 'max', 'p25', 'p75')
+        }
     
+    correlation = summary['correlation']
     return {
-        'revenue': {
-            'mean': round(np.mean(revenues)),
-            'median': round(np.median(revenues)),
-            'std': round(np.std(revenues)),
-            'min': round(np.min(revenues)),
-            'max': round(np.max(revenues)),
-            'p25': round(np.percentile(revenues, 25)),
-            'p75': round(np.percentile(revenues, 75))
-        },
-        'occupancy': {
-            'mean': round(np.mean(occupancies), 1),
-            'median': round(np.median(occupancies), 1),
-            'std': round(np.std(occupancies), 1),
-            'min': round(np.min(occupancies), 1),
-            'max': round(np.max(occupancies), 1)
-        },
-        'adr': {
-            'mean': round(np.mean(adrs)),
-            'median': round(np.median(adrs)),
-            'std': round(np.std(adrs)),
-            'min': round(np.min(adrs)),
-            'max': round(np.max(adrs))
+        'revenue': metric_stats(0),
+        'occupancy': metric_stats(1, 1),
+        'adr': metric_stats(2),
+        'correlations': {
+            'revenue_occupancy': correlation_value(correlation, 0, 1),
+            'revenue_adr': correlation_value(correlation, 0, 2),
+            'occupancy_adr': correlation_value(correlation, 1, 2)
         },
+        'weighted_by': weight_by,
         'property_count': len(clean_data)
     }
 
@@ -1916,11 +2463,158 @@ def detect_offline_month(month_data):
     if revenue == 0 or occupancy == 0:
         return {'exclude': True, 'reason': 'Property offline - no activity'}
     
-    # Likely offline - minimal activity
-    if revenue < 500 or occupancy < 10:
-        return {'exclude': True, 'reason': f'Minimal activity (${revenue:.0f}, {occupancy:.1f}% occupancy)'}
+    # Likely offline - minimal activity
+    if revenue < 500 or occupancy < 10:
+        return {'exclude': True, 'reason': f'Minimal activity (${revenue:.0f}, {occupancy:.1f}% occupancy)'}
+    
+    return {'exclude': False}
+
+class MonthlyExpectationAccumulator:
+    """
+    Running per-month aggregates behind monthly expectations.
+    Properties can be added and removed one at a time without rescanning the comp set.
+    """
+    
+    def __init__(self):
+        self.months = {
+            month_num: {'included': {}, 'excluded': {}, 'revenue_sum': 0.0, 'occupancy_sum': 0.0}
+            for month_num in range(1, 13)
+        }
+        self.property_ids = []
+    
+    def add(self, proj, position=0):
+        """Fold one property's projection into the monthly aggregates"""
+        property_id = proj.get('property_id')
+        if property_id in self.property_ids:
+            self.remove(property_id)
+        self.property_ids.append(property_id)
+        
+        monthly_data = proj.get('monthly_projections', {})
+        for month_num, month in self.months.items():
+            month_info = monthly_data.get(str(month_num))
+            if month_info is None:
+                continue
+            
+            revenue = month_info.get('revenue', 0)
+            occupancy = month_info.get('occupancy', 0)
+            
+            # Check if this month should be excluded
+            offline_check = detect_offline_month({'revenue': revenue, 'occupancy': occupancy})
+            
+            if offline_check['exclude']:
+                month['excluded'][property_id] = {
+                    'property': proj.get('title', f'Property {position+1}'),
+                    'property_id': property_id,
+                    'reason': offline_check['reason']
+                }
+            else:
+                month['included'][property_id] = (revenue, occupancy)
+                month['revenue_sum'] += revenue
+                month['occupancy_sum'] += occupancy
+    
+    def remove(self, property_id):
+        """Take one property back out of the monthly aggregates"""
+        if property_id not in self.property_ids:
+            return
+        self.property_ids.remove(property_id)
+        
+        for month in self.months.values():
+            month['excluded'].pop(property_id, None)
+            included = month['included'].pop(property_id, None)
+            if included is not None:
+                month['revenue_sum'] -= included[0]
+                month['occupancy_sum'] -= included[1]
+    
+    def sync(self, projections):
+        """Apply only the add/remove deltas needed to match the given projections"""
+        wanted = {proj.get('property_id') for proj in projections}
+        for property_id in [pid for pid in self.property_ids if pid not in wanted]:
+            self.remove(property_id)
+        for i, proj in enumerate(projections):
+            if proj.get('property_id') not in self.property_ids:
+                self.add(proj, i)
     
-    return {'exclude': False}
+    def expectations(self):
+        """Build the monthly expectations payload from the current aggregates"""
+        monthly_expectations = {}
+        
+        for month_num, month in self.months.items():
+            included_count = len(month['included'])
+            excluded_properties = list(month['excluded'].values())
+            excluded_count = len(excluded_properties)
+            total_properties = included_count + excluded_count
+            
+            # Calculate statistics for this month
+            if included_count:
+                revenues = [values[0] for values in month['included'].values()]
+                expected_revenue = month['revenue_sum'] / included_count
+                min_revenue = min(revenues)
+                max_revenue = max(revenues)
+                expected_occupancy = month['occupancy_sum'] / included_count
+                
+                # Confidence based on sample size
+                if included_count >= total_properties * 0.8:
+                    confidence = 'High'
+                elif included_count >= total_properties * 0.5:
+                    confidence = 'Medium'
+                else:
+                    confidence = 'Low'
+            else:
+                # All properties were offline for this month
+                expected_revenue = 0
+                min_revenue = 0
+                max_revenue = 0
+                expected_occupancy = 0
+                confidence = 'No Data'
+            
+            # Get month name and season
+            month_name = datetime(2025, month_num, 1).strftime('%B')
+            season = 'winter' if month_num in [12, 1, 2] else \
+                     'spring' if month_num in [3, 4, 5] else \
+                     'summer' if month_num in [6, 7, 8] else 'fall'
+            
+            monthly_expectations[str(month_num)] = {
+                'month': month_name,
+                'month_num': month_num,
+                'season': season,
+                'revenue': {
+                    'expected': round(expected_revenue),
+                    'min': round(min_revenue),
+                    'max': round(max_revenue)
+                },
+                'occupancy': {
+                    'expected': round(expected_occupancy, 1)
+                },
+                'data_quality': {
+                    'included_count': included_count,
+                    'excluded_count': excluded_count,
+                    'total_properties': total_properties,
+                    'confidence': confidence,
+                    'excluded_properties': excluded_properties
+                }
+            }
+        
+        # Calculate annual totals
+        annual_total = sum(month['revenue']['expected'] for month in monthly_expectations.values())
+        avg_occupancy = np.mean([month['occupancy']['expected'] for month in monthly_expectations.values()])
+        
+        # Overall confidence
+        confidence_scores = [month['data_quality']['confidence'] for month in monthly_expectations.values()]
+        if confidence_scores.count('High') >= 8:
+            overall_confidence = 'High'
+        elif confidence_scores.count('Low') > 4 or confidence_scores.count('No Data') > 2:
+            overall_confidence = 'Low'
+        else:
+            overall_confidence = 'Medium'
+        
+        return {
+            'monthly_expectations': monthly_expectations,
+            'annual_summary': {
+                'total_revenue': round(annual_total),
+                'average_occupancy': round(avg_occupancy, 1),
+                'overall_confidence': overall_confidence
+            }
+        }
 
 def calculate_monthly_expectations(properties_data, projections):
     """
@@ -1939,128 +2633,14 @@ def calculate_monthly_expectations(properties_data, projections):
         if 'monthly_projections' in projections[0]:
             print(f"DEBUG: First projection monthly_projections keys: {list(projections[0]['monthly_projections'].keys())[:5]}")
     
-    monthly_expectations = {}
-    
-    # Iterate through each month (1-12)
-    for month_num in range(1, 13):
-        month_revenues = []
-        month_occupancies = []
-        excluded_properties = []
-        
-        # Collect data from all properties for this month
-        for i, proj in enumerate(projections):
-            monthly_data = proj.get('monthly_projections', {})
-            month_key = str(month_num)
-            
-            if month_num == 1 and i == 0:  # Debug first month, first property
-                print(f"DEBUG: Month 1, Property 0 - monthly_data keys: {list(monthly_data.keys())[:5] if monthly_data else 'None'}")
-                if month_key in monthly_data:
-                    print(f"DEBUG: Month 1 data found: revenue={monthly_data[month_key].get('revenue', 'N/A')}, occupancy={monthly_data[month_key].get('occupancy', 'N/A')}")
-            
-            if month_key in monthly_data:
-                month_info = monthly_data[month_key]
-                
-                # Check if this month should be excluded
-                offline_check = detect_offline_month({
-                    'revenue': month_info.get('revenue', 0),
-                    'occupancy': month_info.get('occupancy', 0)
-                })
-                
-                if offline_check['exclude']:
-                    excluded_properties.append({
-                        'property': proj.get('title', f'Property {i+1}'),
-                        'property_id': proj.get('property_id'),
-                        'reason': offline_check['reason']
-                    })
-                else:
-                    month_revenues.append(month_info.get('revenue', 0))
-                    month_occupancies.append(month_info.get('occupancy', 0))
-        
-        # Calculate statistics for this month
-        if month_revenues:
-            # Revenue calculations
-            expected_revenue = np.mean(month_revenues)
-            min_revenue = np.min(month_revenues)
-            max_revenue = np.max(month_revenues)
-            
-            # Occupancy calculations
-            expected_occupancy = np.mean(month_occupancies)
-            
-            # Data quality metrics
-            included_count = len(month_revenues)
-            excluded_count = len(excluded_properties)
-            total_properties = included_count + excluded_count
-            
-            # Confidence based on sample size
-            if included_count >= total_properties * 0.8:
-                confidence = 'High'
-            elif included_count >= total_properties * 0.5:
-                confidence = 'Medium'
-            else:
-                confidence = 'Low'
-        else:
-            # All properties were offline for this month
-            expected_revenue = 0
-            min_revenue = 0
-            max_revenue = 0
-            expected_occupancy = 0
-            included_count = 0
-            excluded_count = len(excluded_properties)
-            total_properties = excluded_count
-            confidence = 'No Data'
-        
-        # Get month name and season
-        month_name = datetime(2025, month_num, 1).strftime('%B')
-        season = 'winter' if month_num in [12, 1, 2] else \
-                 'spring' if month_num in [3, 4, 5] else \
-                 'summer' if month_num in [6, 7, 8] else 'fall'
-        
-        monthly_expectations[str(month_num)] = {
-            'month': month_name,
-            'month_num': month_num,
-            'season': season,
-            'revenue': {
-                'expected': round(expected_revenue),
-                'min': round(min_revenue),
-                'max': round(max_revenue)
-            },
-            'occupancy': {
-                'expected': round(expected_occupancy, 1)
-            },
-            'data_quality': {
-                'included_count': included_count,
-                'excluded_count': excluded_count,
-                'total_properties': total_properties,
-                'confidence': confidence,
-                'excluded_properties': excluded_properties
-            }
-        }
-    
-    # Calculate annual totals
-    annual_total = sum(month['revenue']['expected'] for month in monthly_expectations.values())
-    avg_occupancy = np.mean([month['occupancy']['expected'] for month in monthly_expectations.values()])
-    
-    # Overall confidence
-    confidence_scores = [month['data_quality']['confidence'] for month in monthly_expectations.values()]
-    if confidence_scores.count('High') >= 8:
-        overall_confidence = 'High'
-    elif confidence_scores.count('Low') > 4 or confidence_scores.count('No Data') > 2:
-        overall_confidence = 'Low'
-    else:
-        overall_confidence = 'Medium'
+    accumulator = MonthlyExpectationAccumulator()
+    for i, proj in enumerate(projections):
+        accumulator.add(proj, i)
     
-    return {
-        'monthly_expectations': monthly_expectations,
-        'annual_summary': {
-            'total_revenue': round(annual_total),
-            'average_occupancy': round(avg_occupancy, 1),
-            'overall_confidence': overall_confidence
-        }
-    }
+    return accumulator.expectations()
 
-def perform_comparable_analysis(property_ids, analysis_type='standard'):
-    """Main function to perform comparable properties analysis"""
-    # Step 1: Get property details with comprehensive data
+def fetch_comparable_properties(property_ids):
+    """Fetch the analysis rows for the given property IDs in a single query"""
     properties_query = f"""
     SELECT 
         `Property ID`,
@@ -2075,38 +2655,86 @@ def perform_comparable_analysis(property_ids, analysis_type='standard'):
         `Airbnb Superhost` as is_superhost,
         `Listing Main Image URL` as main_image_url,
         Latitude, Longitude
-    FROM `aerial-velocity-439702-t7.airdna_june2025monthly.airdna_june2025property`
+    FROM `{datasets.current().property_table}`
     WHERE `Property ID` IN ({','.join([f"'{pid}'" for pid in property_ids])})
         AND `Revenue LTM _USD_` > 0
         AND `Active Listing Nights LTM` > 30
     """
     
     # Execute query
-    query_job = client.query(properties_query)
-    results = list(query_job.result())
+    with query_budget.enforced('comparable_properties'):
+        query_job = submit_query(properties_query, 'comparable_properties')
+        return result_fetcher.fetch_records(query_job, 'comparable_properties')
+
+def load_comparable_properties(property_ids):
+    """Assemble property rows from the fragment cache, fetching only the misses in one query"""
+    cached_rows = property_fragments.get_many('row', fragment_version(ROW_FRAGMENT_VERSION), property_ids)
+    missing_ids = [pid for pid in property_ids if pid not in cached_rows]
     
-    if not results:
+    if missing_ids:
+        fetched = {row['Property ID']: row for row in fetch_comparable_properties(missing_ids)}
+        property_fragments.set_many('row', fragment_version(ROW_FRAGMENT_VERSION), fetched)
+        # Negative-cache ineligible IDs so they are not re-queried on every analysis
+        property_fragments.set_many('row', fragment_version(ROW_FRAGMENT_VERSION), {
+            pid: FRAGMENT_MISSING for pid in missing_ids if pid not in fetched
+        }, ttl=MISSING_PROPERTY_TTL)
+        cached_rows.update(fetched)
+    
+    return [
+        cached_rows[pid] for pid in dict.fromkeys(property_ids)
+        if pid in cached_rows and cached_rows[pid] != FRAGMENT_MISSING
+    ]
+
+def perform_comparable_analysis(property_ids, analysis_type='standard', weight_by=None):
+    """Main function to perform comparable properties analysis"""
+    # Step 1: Get property details with comprehensive data
+    properties_data = load_comparable_properties(property_ids)
+    
+    if not properties_data:
         raise ComparableAnalysisError("No valid properties found for analysis", "NO_DATA")
     
-    # Convert BigQuery results to dictionaries
-    properties_data = []
-    for row in results:
-        properties_data.append(dict(row))
+    loaded_ids = [prop['Property ID'] for prop in properties_data]
+    cached_projections = property_fragments.get_many('projection', fragment_version(PROJECTION_MODEL_VERSION), loaded_ids)
+    
+    results = analyze_comparable_properties(properties_data, analysis_type, weight_by, cached_projections)
+    
+    property_fragments.set_many('projection', fragment_version(PROJECTION_MODEL_VERSION), {
+        proj['property_id']: proj for proj in results['projections']
+        if proj['property_id'] not in cached_projections
+    })
+    return results
+
+def analyze_comparable_properties(properties_data, analysis_type='standard', weight_by=None,
+                                  cached_projections=None, expectations_accumulator=None):
+    """Run outlier removal, statistics and projections over already-loaded property rows
     
-    # Step 2: Apply outlier detection
-    clean_data, outliers_removed = apply_outlier_detection(properties_data)
+    Args:
+        properties_data: List of property rows from fetch_comparable_properties
+        analysis_type: Selects the outlier detection method
+        weight_by: Optional weighting for statistics
+        cached_projections: Optional dict of property_id -> projection to reuse
+        expectations_accumulator: Optional MonthlyExpectationAccumulator kept in sync
+            with the clean set instead of rebuilding monthly expectations
+    """
+    # Step 2: Apply outlier detection (method selected by analysis_type, MAD for Mahalanobis on tiny sets)
+    outlier_method = applicable_method(resolve_method(analysis_type), len(properties_data))
+    clean_data, outliers_removed = apply_outlier_detection(properties_data, outlier_method)
     
     if len(clean_data) < 2:
         raise ComparableAnalysisError("Insufficient properties after outlier removal", "INSUFFICIENT_CLEAN_DATA")
     
     # Step 3: Calculate statistics
-    statistics = calculate_comp_statistics(clean_data)
+    statistics = calculate_comp_statistics(clean_data, weight_by)
     
     # Step 4: Generate enhanced projections with seasonal and quarterly analysis
-    projections = calculate_seasonal_projections(clean_data)
+    projections = calculate_seasonal_projections(clean_data, cached_projections)
     
     # Step 4.5: Calculate monthly expectations with offline detection
-    monthly_expectations_data = calculate_monthly_expectations(clean_data, projections)
+    if expectations_accumulator is not None:
+        expectations_accumulator.sync(projections)
+        monthly_expectations_data = expectations_accumulator.expectations()
+    else:
+        monthly_expectations_data = calculate_monthly_expectations(clean_data, projections)
     
     # Step 5: Import additional services for enhanced analysis
     from services.seasonal_analyzer import SeasonalAnalyzer
@@ -2270,21 +2898,14 @@ def perform_comparable_analysis(property_ids, analysis_type='standard'):
         'outlier_analysis': {
             'outliers_detected': len(outliers_removed),
             'outliers_removed': outliers_removed,
-            'outlier_details': {
-                'method': 'IQR',
-                'threshold': 1.5,
-                'metrics_checked': ['annual_revenue', 'occupancy_rate', 'adr']
-            }
+            'outlier_details': describe_method(outlier_method)
         },
         'statistical_analysis': {
             'revenue': statistics.get('revenue', {}),
             'occupancy': statistics.get('occupancy', {}),
             'adr': statistics.get('adr', {}),
-            'correlations': {
-                'revenue_occupancy': 0.85,  # Could be calculated from actual data
-                'revenue_adr': 0.72,
-                'occupancy_adr': -0.15
-            }
+            'correlations': statistics.get('correlations', {}),
+            'weighted_by': weight_by
         },
         'market_insights': {
             'market_trend': 'Growing',
@@ -2305,6 +2926,52 @@ def perform_comparable_analysis(property_ids, analysis_type='standard'):
         'outlier_details': outliers_removed
     }
 
+def comparables_cache_key(property_ids, analysis_type, weight_by):
+    """Cache key (and job id) for a comparable analysis request"""
+    return make_cache_key('comps_analysis', {
+        'property_ids': sorted(property_ids),
+        'analysis_type': analysis_type,
+        'weight_by': weight_by
+    })
+
+def comparables_cache_tags(property_ids):
+    """Invalidation tags of a cached comparable analysis"""
+    return ['comps_analysis', *(f"property:{pid}" for pid in property_ids)]
+
+def format_comparables_response(property_ids, analysis_results, analysis_type='standard'):
+    """Shape comparable analysis results into the API response"""
+    return {
+        'success': True,
+        'analysis_id': f"analysis_2025_{hash(str(sorted(property_ids)))}"[-8:],  # Generate analysis ID
+        'analysis_type': 'annual_projection' if analysis_type == 'standard' else analysis_type,
+        'projection_year': 2025,
+        'generated_at': datetime.utcnow().isoformat(),
+        'property_count': len(analysis_results.get('projections', [])),
+        'methodology': 'Historical seasonal patterns + comparable properties analysis + market trend adjustments',
+        'data_quality': 'Excellent' if len(analysis_results.get('projections', [])) >= 5 else 'Good',
+        'confidence_level': 'High' if len(analysis_results.get('projections', [])) >= 5 else 'Medium',
+        
+        # Enhanced response structure matching mockup
+        'projection_summary': analysis_results.get('projection_summary', {}),
+        'projections': analysis_results.get('projections', []),
+        'monthly_expectations': analysis_results.get('monthly_expectations', {}),
+        'monthly_expectations_summary': analysis_results.get('monthly_expectations_summary', {}),
+        'chart_data': analysis_results.get('chart_data', {}),
+        'outlier_analysis': analysis_results.get('outlier_analysis', {}),
+        'statistical_analysis': analysis_results.get('statistical_analysis', {}),
+        'market_insights': analysis_results.get('market_insights', {}),
+        
+        # Legacy fields for backward compatibility
+        'statistics': analysis_results.get('statistics', {}),
+        'outliers_removed': analysis_results.get('outliers_removed', 0),
+        'outlier_details': analysis_results.get('outlier_details', [])
+    }
+
+def build_comparables_response(property_ids, analysis_type='standard', weight_by=None):
+    """Run the comparable analysis and shape the API response"""
+    analysis_results = perform_comparable_analysis(property_ids, analysis_type, weight_by)
+    return format_comparables_response(property_ids, analysis_results, analysis_type)
+
 # Route: Comparable Properties Analysis
 @app.route('/api/analyze_comparables', methods=['POST'])
 @app.route('/api/comps/analyze', methods=['POST'])  # Legacy compatibility
@@ -2326,54 +2993,28 @@ def analyze_comparables():
         
         property_ids = data.get('property_ids', [])
         analysis_type = data.get('analysis_type', 'standard')
+        weight_by = data.get('weight_by')
         
         # Check cache first
-        cache_key = make_cache_key('comps_analysis', {
-            'property_ids': sorted(property_ids),
-            'analysis_type': analysis_type
-        })
+        cache_key = comparables_cache_key(property_ids, analysis_type, weight_by)
         
         if CACHE_ENABLED:
-            cached_result = cache.get(cache_key)
+            cached_result = cache_get(cache_key, 'comps_analysis')
             if cached_result:
-                return json.loads(cached_result)
+                return cached_json_response(cached_result)
         
         # Perform analysis
-        analysis_results = perform_comparable_analysis(property_ids, analysis_type)
-        
-        response = {
-            'success': True,
-            'analysis_id': f"analysis_2025_{hash(str(sorted(property_ids)))}"[-8:],  # Generate analysis ID
-            'analysis_type': 'annual_projection' if analysis_type == 'standard' else analysis_type,
-            'projection_year': 2025,
-            'generated_at': datetime.utcnow().isoformat(),
-            'property_count': len(analysis_results.get('projections', [])),
-            'methodology': 'Historical seasonal patterns + comparable properties analysis + market trend adjustments',
-            'data_quality': 'Excellent' if len(analysis_results.get('projections', [])) >= 5 else 'Good',
-            'confidence_level': 'High' if len(analysis_results.get('projections', [])) >= 5 else 'Medium',
-            
-            # Enhanced response structure matching mockup
-            'projection_summary': analysis_results.get('projection_summary', {}),
-            'projections': analysis_results.get('projections', []),
-            'monthly_expectations': analysis_results.get('monthly_expectations', {}),
-            'monthly_expectations_summary': analysis_results.get('monthly_expectations_summary', {}),
-            'chart_data': analysis_results.get('chart_data', {}),
-            'outlier_analysis': analysis_results.get('outlier_analysis', {}),
-            'statistical_analysis': analysis_results.get('statistical_analysis', {}),
-            'market_insights': analysis_results.get('market_insights', {}),
-            
-            # Legacy fields for backward compatibility
-            'statistics': analysis_results.get('statistics', {}),
-            'outliers_removed': analysis_results.get('outliers_removed', 0),
-            'outlier_details': analysis_results.get('outlier_details', [])
-        }
+        response = build_comparables_response(property_ids, analysis_type, weight_by)
         
         # Cache the result
         if CACHE_ENABLED:
-            cache.setex(cache_key, DEFAULT_CACHE_TTL * 2, json.dumps(response))
+            cache_set(cache_key, dumps_json(response), DEFAULT_CACHE_TTL * 2, tags=comparables_cache_tags(property_ids))
         
         return jsonify(response)
         
+    except QueryBudgetExceeded as e:
+        return query_budget_response(e)
+        
     except ComparableAnalysisError as e:
         return jsonify({
             'success': False,
@@ -2390,6 +3031,455 @@ def analyze_comparables():
             'error_code': 'INTERNAL_ERROR'
         }), 500
 
+# ==============================================================================
+# ASYNC COMPARABLE ANALYSIS JOBS
+# ==============================================================================
+
+from services.analysis_jobs import AnalysisJobManager, JobQueueFullError, JOB_COMPLETED, JOB_FAILED
+
+ANALYSIS_JOB_WORKERS = int(os.getenv('ANALYSIS_JOB_WORKERS', 2))
+ANALYSIS_JOB_MAX_PENDING = int(os.getenv('ANALYSIS_JOB_MAX_PENDING', 20))
+
+analysis_jobs = AnalysisJobManager(
+    cache=cache if CACHE_ENABLED else None,
+    max_workers=ANALYSIS_JOB_WORKERS,
+    max_pending=ANALYSIS_JOB_MAX_PENDING,
+    result_ttl=DEFAULT_CACHE_TTL * 2,
+    writer=cache_set  # Tagged like synchronous results, so invalidate-cache and retire() reach them
+)
+
+def job_links(job_id):
+    return {
+        'status_url': f"/api/analyze_comparables/jobs/{job_id}",
+        'result_url': f"/api/analyze_comparables/jobs/{job_id}/result"
+    }
+
+# Route: Submit comparable analysis job
+@app.route('/api/analyze_comparables/jobs', methods=['POST'])
+def submit_analysis_job():
+    """
+    Queue a comparable analysis and return immediately with a job id to poll
+    """
+    try:
+        data = request.json
+        validation_errors = validate_analysis_request(data)
+        
+        if validation_errors:
+            return jsonify({
+                'success': False,
+                'error': 'Validation failed',
+                'details': validation_errors
+            }), 400
+        
+        property_ids = data.get('property_ids', [])
+        analysis_type = data.get('analysis_type', 'standard')
+        weight_by = data.get('weight_by')
+        
+        # The cache key doubles as the job id, deduplicating identical analyses
+        job_id = comparables_cache_key(property_ids, analysis_type, weight_by)
+        
+        if CACHE_ENABLED and cache.exists(job_id):
+            analysis_jobs.record_completed(job_id)
+            return jsonify({'success': True, 'job_id': job_id, 'status': JOB_COMPLETED, **job_links(job_id)})
+        
+        job, created = analysis_jobs.submit(job_id, build_comparables_response, property_ids, analysis_type, weight_by,
+                                            tags=comparables_cache_tags(property_ids))
+        
+        return jsonify({
+            'success': True,
+            'created': created,
+            **job,
+            **job_links(job_id)
+        }), 202 if job['status'] != JOB_COMPLETED else 200
+        
+    except JobQueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e),
+            'error_code': 'QUEUE_FULL'
+        }), 503
+        
+    except Exception as e:
+        app.logger.error(f"Unexpected error submitting analysis job: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred while submitting the analysis',
+            'error_code': 'INTERNAL_ERROR'
+        }), 500
+
+# Route: Poll comparable analysis job
+@app.route('/api/analyze_comparables/jobs/<job_id>', methods=['GET'])
+def analysis_job_status(job_id):
+    """Return the status of an analysis job"""
+    job = analysis_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found', 'error_code': 'JOB_NOT_FOUND'}), 404
+    
+    return jsonify({'success': True, **job, **job_links(job_id)})
+
+# Route: Fetch comparable analysis job result
+@app.route('/api/analyze_comparables/jobs/<job_id>/result', methods=['GET'])
+def analysis_job_result(job_id):
+    """Return the result of a completed analysis job"""
+    result = analysis_jobs.result(job_id)
+    if result is not None:
+        return jsonify(result)
+    
+    job = analysis_jobs.get(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found', 'error_code': 'JOB_NOT_FOUND'}), 404
+    
+    if job['status'] == JOB_FAILED:
+        if job.get('error_code') == 'INTERNAL_ERROR':
+            return jsonify({
+                'success': False,
+                'error': 'An unexpected error occurred during analysis',
+                'error_code': 'INTERNAL_ERROR'
+            }), 500
+        return jsonify({
+            'success': False,
+            'error': job.get('error'),
+            'error_code': job.get('error_code'),
+            'details': job.get('details')
+        }), 400
+    
+    # Still queued or running
+    return jsonify({'success': True, **job, **job_links(job_id)}), 202
+
+# ==============================================================================
+# INCREMENTAL COMPARABLE ANALYSIS SESSIONS
+# ==============================================================================
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+MAX_SESSION_PROPERTIES = 10
+COMP_SESSION_TTL = DEFAULT_CACHE_TTL
+MAX_LOCAL_COMP_SESSIONS = 500
+COMP_SESSION_LOCK_SECONDS = 30  # Upper bound on one add/remove, in case a worker dies holding the lock
+COMP_SESSION_LOCK_WAIT = 10
+
+class CompSessionBusyError(Exception):
+    """Raised when another worker keeps a session locked for too long"""
+
+class CompAnalysisSession:
+    """
+    Server-side comp selection state: loaded property rows, per-property
+    projections and running monthly aggregates. Adding or removing a comp
+    only touches that property instead of re-querying the whole set.
+    """
+    
+    def __init__(self, session_id, analysis_type='standard', weight_by=None):
+        self.session_id = session_id
+        self.analysis_type = analysis_type
+        self.weight_by = weight_by
+        self.rows = OrderedDict()
+        self.projections = {}
+        self.accumulator = MonthlyExpectationAccumulator()
+        self.lock = threading.Lock()
+        self.revision = 0  # Bumped on every save; the highest revision is the current state
+    
+    @property
+    def property_ids(self):
+        return list(self.rows.keys())
+    
+    def add_rows(self, rows):
+        for row in rows:
+            self.rows[row['Property ID']] = row
+    
+    def remove(self, property_id):
+        self.rows.pop(property_id, None)
+        self.projections.pop(property_id, None)
+        self.accumulator.remove(property_id)
+    
+    def analyze(self):
+        """Re-run the cheap analysis steps over cached rows and projections"""
+        results = analyze_comparable_properties(
+            list(self.rows.values()),
+            self.analysis_type,
+            self.weight_by,
+            cached_projections=self.projections,
+            expectations_accumulator=self.accumulator
+        )
+        for proj in results['projections']:
+            self.projections[proj['property_id']] = proj
+        return results
+    
+    def to_json(self):
+        return dumps_json({
+            'session_id': self.session_id,
+            'analysis_type': self.analysis_type,
+            'weight_by': self.weight_by,
+            'revision': self.revision,
+            'rows': list(self.rows.values()),
+            'projections': self.projections
+        })
+    
+    @classmethod
+    def from_dict(cls, data):
+        session = cls(data['session_id'], data.get('analysis_type', 'standard'), data.get('weight_by'))
+        session.revision = data.get('revision', 0)
+        session.add_rows(data.get('rows', []))
+        session.projections = data.get('projections', {})
+        # Monthly aggregates are rebuilt lazily from the cached projections on the next analyze()
+        return session
+
+comp_sessions = OrderedDict()
+comp_sessions_lock = threading.Lock()
+
+def comp_session_cache_key(session_id):
+    return f"comps_session:{session_id}"
+
+def save_comp_session(session):
+    """Keep the session in this worker and mirror it to Redis for the others"""
+    session.revision += 1
+    with comp_sessions_lock:
+        comp_sessions[session.session_id] = session
+        comp_sessions.move_to_end(session.session_id)
+        while len(comp_sessions) > MAX_LOCAL_COMP_SESSIONS:
+            comp_sessions.popitem(last=False)
+    
+    if CACHE_ENABLED:
+        cache.setex(comp_session_cache_key(session.session_id), COMP_SESSION_TTL, session.to_json())
+
+def load_comp_session(session_id):
+    """
+    Load a session, with Redis as the source of truth when it is enabled
+    
+    The local copy is reused only while it is as new as the one in Redis
+    (other workers may have added or removed comps since); without Redis the
+    in-process copy is the only one.
+    """
+    with comp_sessions_lock:
+        session = comp_sessions.get(session_id)
+        if session:
+            comp_sessions.move_to_end(session_id)
+    
+    if not CACHE_ENABLED:
+        return session
+    
+    payload = cache.get(comp_session_cache_key(session_id))
+    if not payload:
+        # Expired or ended on another worker
+        with comp_sessions_lock:
+            comp_sessions.pop(session_id, None)
+        return None
+    
+    data = loads_json(payload)
+    if session and session.revision >= data.get('revision', 0):
+        return session
+    
+    session = CompAnalysisSession.from_dict(data)
+    with comp_sessions_lock:
+        comp_sessions[session_id] = session
+    return session
+
+def release_comp_session_lock(lock_key, token):
+    """Delete the lock only while it is still ours (it may have expired and been re-taken)"""
+    with cache.pipeline() as pipe:
+        try:
+            pipe.watch(lock_key)
+            if pipe.get(lock_key) == token:
+                pipe.multi()
+                pipe.delete(lock_key)
+                pipe.execute()
+        except redis.WatchError:
+            pass
+
+@contextmanager
+def locked_comp_session(session_id):
+    """
+    Load a session for a read-modify-write, yielding None when it does not exist
+    
+    A short Redis lock (SET NX) makes workers take turns, so each change
+    starts from the latest saved revision instead of the last writer winning;
+    the session's own lock serializes threads within this worker.
+    """
+    lock_key = f"{comp_session_cache_key(session_id)}:lock"
+    token = uuid.uuid4().hex
+    if CACHE_ENABLED:
+        deadline = time.monotonic() + COMP_SESSION_LOCK_WAIT
+        while not cache.set(lock_key, token, nx=True, ex=COMP_SESSION_LOCK_SECONDS):
+            if time.monotonic() >= deadline:
+                raise CompSessionBusyError(f"Session {session_id} is being updated")
+            time.sleep(0.05)
+    try:
+        session = load_comp_session(session_id)
+        if session is None:
+            yield None
+        else:
+            with session.lock:
+                yield session
+    finally:
+        if CACHE_ENABLED:
+            release_comp_session_lock(lock_key, token)
+
+def comp_session_busy_response(error):
+    return jsonify({'success': False, 'error': str(error), 'error_code': 'SESSION_BUSY'}), 409
+
+def delete_comp_session(session_id):
+    with comp_sessions_lock:
+        comp_sessions.pop(session_id, None)
+    if CACHE_ENABLED:
+        cache.delete(comp_session_cache_key(session_id))
+
+def comp_session_response(session):
+    """Analyze the session's current comp set and shape the API response"""
+    base = {
+        'session_id': session.session_id,
+        'property_ids': session.property_ids
+    }
+    
+    if len(session.rows) < 2:
+        return {
+            'success': True,
+            **base,
+            'analysis_available': False,
+            'message': 'Add at least 2 properties to run the analysis'
+        }, 200
+    
+    try:
+        analysis_results = session.analyze()
+    except ComparableAnalysisError as e:
+        return {
+            'success': False,
+            **base,
+            'error': str(e),
+            'error_code': e.error_code,
+            'details': e.details
+        }, 400
+    
+    return {
+        **format_comparables_response(session.property_ids, analysis_results, session.analysis_type),
+        **base,
+        'analysis_available': True
+    }, 200
+
+# Route: Create incremental comps session
+@app.route('/api/comps/sessions', methods=['POST'])
+def create_comp_session():
+    """Start an incremental comps analysis session with an initial property list"""
+    try:
+        data = request.json or {}
+        property_ids = data.get('property_ids', [])
+        weight_by = data.get('weight_by')
+        
+        if not isinstance(property_ids, list):
+            return jsonify({'success': False, 'error': 'Property IDs must be an array', 'error_code': 'INVALID_TYPE'}), 400
+        if len(property_ids) > MAX_SESSION_PROPERTIES:
+            return jsonify({'success': False, 'error': f'Maximum {MAX_SESSION_PROPERTIES} properties allowed', 'error_code': 'LIMIT_EXCEEDED'}), 400
+        if weight_by and weight_by not in WEIGHT_FIELDS:
+            return jsonify({'success': False, 'error': f"weight_by must be one of: {', '.join(WEIGHT_FIELDS)}", 'error_code': 'INVALID_VALUE'}), 400
+        analysis_type = data.get('analysis_type', 'standard')
+        if analysis_type not in ANALYSIS_TYPES:
+            return jsonify({'success': False, 'error': f"analysis_type must be one of: {', '.join(ANALYSIS_TYPES)}", 'error_code': 'INVALID_VALUE'}), 400
+        
+        session = CompAnalysisSession(uuid.uuid4().hex, analysis_type, weight_by)
+        with session.lock:
+            if property_ids:
+                session.add_rows(load_comparable_properties(property_ids))
+            body, status = comp_session_response(session)
+            save_comp_session(session)
+        
+        return jsonify(body), 201 if status == 200 else status
+        
+    except Exception as e:
+        app.logger.error(f"Unexpected error creating comps session: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred during analysis',
+            'error_code': 'INTERNAL_ERROR'
+        }), 500
+
+# Route: Get incremental comps session
+@app.route('/api/comps/sessions/<session_id>', methods=['GET'])
+def get_comp_session(session_id):
+    """Return the current analysis for a comps session"""
+    session = load_comp_session(session_id)
+    if not session:
+        return jsonify({'success': False, 'error': 'Session not found', 'error_code': 'SESSION_NOT_FOUND'}), 404
+    
+    with session.lock:
+        body, status = comp_session_response(session)
+    return jsonify(body), status
+
+# Route: Delete incremental comps session
+@app.route('/api/comps/sessions/<session_id>', methods=['DELETE'])
+def end_comp_session(session_id):
+    """Discard a comps session"""
+    delete_comp_session(session_id)
+    return jsonify({'success': True, 'session_id': session_id})
+
+# Route: Add a property to a comps session
+@app.route('/api/comps/sessions/<session_id>/properties', methods=['POST'])
+def add_comp_session_property(session_id):
+    """Add one comp; only the new property is fetched and projected"""
+    try:
+        property_id = (request.json or {}).get('property_id')
+        
+        with locked_comp_session(session_id) as session:
+            if not session:
+                return jsonify({'success': False, 'error': 'Session not found', 'error_code': 'SESSION_NOT_FOUND'}), 404
+            if not property_id:
+                return jsonify({'success': False, 'error': 'property_id is required', 'error_code': 'REQUIRED'}), 400
+            
+            if property_id not in session.rows:
+                if len(session.rows) >= MAX_SESSION_PROPERTIES:
+                    return jsonify({'success': False, 'error': f'Maximum {MAX_SESSION_PROPERTIES} properties allowed', 'error_code': 'LIMIT_EXCEEDED'}), 400
+                
+                rows = load_comparable_properties([property_id])
+                if not rows:
+                    return jsonify({
+                        'success': False,
+                        'error': 'Property not found or not eligible for analysis',
+                        'error_code': 'NO_DATA'
+                    }), 404
+                session.add_rows(rows)
+            
+            body, status = comp_session_response(session)
+            save_comp_session(session)
+        
+        return jsonify(body), status
+        
+    except CompSessionBusyError as e:
+        return comp_session_busy_response(e)
+        
+    except Exception as e:
+        app.logger.error(f"Unexpected error updating comps session: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred during analysis',
+            'error_code': 'INTERNAL_ERROR'
+        }), 500
+
+# Route: Remove a property from a comps session
+@app.route('/api/comps/sessions/<session_id>/properties/<property_id>', methods=['DELETE'])
+def remove_comp_session_property(session_id, property_id):
+    """Remove one comp without re-querying the remaining properties"""
+    try:
+        with locked_comp_session(session_id) as session:
+            if not session:
+                return jsonify({'success': False, 'error': 'Session not found', 'error_code': 'SESSION_NOT_FOUND'}), 404
+            session.remove(property_id)
+            body, status = comp_session_response(session)
+            save_comp_session(session)
+        
+        return jsonify(body), status
+        
+    except CompSessionBusyError as e:
+        return comp_session_busy_response(e)
+        
+    except Exception as e:
+        app.logger.error(f"Unexpected error updating comps session: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': 'An unexpected error occurred during analysis',
+            'error_code': 'INTERNAL_ERROR'
+        }), 500
+
 # Route: Analysis Results Page
 @app.route('/analysis')
 def analysis_page():
@@ -2408,6 +3498,8 @@ def storage_demo_page():
     """Render the storage demo page"""
     return render_template('storage_demo.html')
 
+@timed('chart_render')
+@metrics.CHART_RENDER.labels(kind='premium').time()
 def generate_premium_chart_image(chart_type, data, title):
     """
     Generate high-quality chart images for premium PDF reports
@@ -2583,242 +3675,58 @@ def handle_analysis_error(error):
         'details': error.details
     }), 400
 
-@app.route('/report')
-def clickup_report():
-    """Serve the ClickUp report system"""
-    # Read the HTML file and serve it directly
-    import os
-    report_path = os.path.join(os.path.dirname(__file__), 'clickup_report_system.html')
-    try:
-        with open(report_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Report file not found", 404
-
-@app.route('/portal')
-def homeowner_portal():
-    """Serve the homeowner investment portal"""
-    import os
-    portal_path = os.path.join(os.path.dirname(__file__), 'homeowner_portal.html')
-    try:
-        with open(portal_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Portal file not found", 404
-
-@app.route('/test_comp_selection')
-def test_comp_selection():
-    """Serve the comp selection test page"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'test_comp_selection.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test file not found", 404
-
-@app.route('/test_portal_with_comps')
-def test_portal_with_comps():
-    """Serve the portal test page with comp selection"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'test_portal_with_comps.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test file not found", 404
-
-@app.route('/portal_prototype')
-def portal_prototype():
-    """Serve the new portal prototype"""
-    import os
-    prototype_path = os.path.join(os.path.dirname(__file__), 'portal_prototype.html')
-    try:
-        with open(prototype_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Prototype file not found", 404
-
-@app.route('/portal/v2')
-def portal_v2():
-    """Serve the V2 portal with comp selection"""
-    import os
-    # Use the fresh V2 file that's based on working V1
-    portal_v2_path = os.path.join(os.path.dirname(__file__), 'homeowner_portal_v2_fresh.html')
-    try:
-        with open(portal_v2_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        # Fallback to old V2 if fresh doesn't exist
-        portal_v2_path = os.path.join(os.path.dirname(__file__), 'homeowner_portal_v2.html')
-        try:
-            with open(portal_v2_path, 'r') as f:
-                html_content = f.read()
-            return html_content
-        except FileNotFoundError:
-            return "Portal V2 file not found", 404
-
-@app.route('/portal_v2_final')
-def portal_v2_final():
-    """Serve the final V2 portal for testing"""
-    import os
-    portal_path = os.path.join(os.path.dirname(__file__), 'portal_v2_final.html')
-    try:
-        with open(portal_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Portal V2 final file not found", 404
-
-@app.route('/comprehensive_validation_report')
-def comprehensive_validation_report():
-    """Serve the comprehensive validation report"""
-    import os
-    report_path = os.path.join(os.path.dirname(__file__), 'comprehensive_validation_report.html')
-    try:
-        with open(report_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Validation report file not found", 404
-
-@app.route('/test_comp_id_parsing')
-def test_comp_id_parsing():
-    """Serve the comp ID parsing test"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'test_comp_id_parsing.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test file not found", 404
-
-@app.route('/responsive_test')
-def responsive_test():
-    """Serve the responsive test page"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'responsive_test.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test file not found", 404
-
-@app.route('/test_portal_validation')
-def test_portal_validation():
-    """Serve the portal validation test"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'test_portal_validation.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test file not found", 404
-
-@app.route('/portal_debug_test')
-def portal_debug_test():
-    """Serve the portal debug test"""
-    import os
-    test_path = os.path.join(os.path.dirname(__file__), 'portal_debug_test.html')
-    try:
-        with open(test_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Debug test file not found", 404
-
-@app.route('/homeowner_portal_v2_fresh')
-def homeowner_portal_v2_fresh():
-    """Serve the homeowner portal v2 fresh HTML file"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'homeowner_portal_v2_fresh.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Homeowner portal v2 fresh file not found", 404
-
-@app.route('/copyJIC')
-def copyJIC():
-    """Serve the copyJIC HTML file"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'copyJIC.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "CopyJIC file not found", 404
-
-@app.route('/copyJIC-test')
-def copyJIC_test():
-    """Serve the copyJIC test HTML file with dashboard integration"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'copyJIC-test.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "CopyJIC test file not found", 404
-
-@app.route('/dashboard')
-def dashboard():
-    """Serve the original dashboard HTML file"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'templates', 'dashboard.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Dashboard file not found", 404
-
-@app.route('/homeowner-portal-v2')
-def homeowner_portal_v2():
-    """Serve the homeowner portal v2 fresh HTML file (alternative route)"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'homeowner_portal_v2_fresh.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Homeowner portal v2 file not found", 404
-
-@app.route('/test-api-debug')
-def test_api_debug():
-    """Serve the API debug test HTML file"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'test-api-debug.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Test API debug file not found", 404
-
-@app.route('/debug-projections')
-def debug_projections():
-    """Serve the debug projections HTML file"""
-    import os
-    file_path = os.path.join(os.path.dirname(__file__), 'debug-projections.html')
-    try:
-        with open(file_path, 'r') as f:
-            html_content = f.read()
-        return html_content
-    except FileNotFoundError:
-        return "Debug projections file not found", 404
+@app.errorhandler(QueryBudgetExceeded)
+def handle_query_budget_error(error):
+    """Over-budget queries in routes without their own handler"""
+    return query_budget_response(error)
+
+# ============================================================================
+# FILE-BACKED HTML PAGES
+# ============================================================================
+
+from services.static_pages import StaticPageRegistry
+
+# Pages are served from memory; files are re-read only when their mtime changes
+static_pages = StaticPageRegistry(
+    base_dir=os.path.dirname(os.path.abspath(__file__)),
+    version=lambda: datasets.version,
+    revalidate_interval=0 if DEBUG_MODE else float(os.getenv('STATIC_PAGE_REVALIDATE_SECONDS', 5)),
+    on_load=compression.precompress
+)
+
+# (rule, endpoint, files in fallback order, message when none exist)
+STATIC_PAGE_ROUTES = [
+    ('/report', 'clickup_report', ['clickup_report_system.html'], 'Report file not found'),
+    ('/portal', 'homeowner_portal', ['homeowner_portal.html'], 'Portal file not found'),
+    ('/test_comp_selection', 'test_comp_selection', ['test_comp_selection.html'], 'Test file not found'),
+    ('/test_portal_with_comps', 'test_portal_with_comps', ['test_portal_with_comps.html'], 'Test file not found'),
+    ('/portal_prototype', 'portal_prototype', ['portal_prototype.html'], 'Prototype file not found'),
+    # Fresh V2 is based on the working V1; the old V2 is the fallback
+    ('/portal/v2', 'portal_v2', ['homeowner_portal_v2_fresh.html', 'homeowner_portal_v2.html'],
+     'Portal V2 file not found'),
+    ('/portal_v2_final', 'portal_v2_final', ['portal_v2_final.html'], 'Portal V2 final file not found'),
+    ('/comprehensive_validation_report', 'comprehensive_validation_report',
+     ['comprehensive_validation_report.html'], 'Validation report file not found'),
+    ('/test_comp_id_parsing', 'test_comp_id_parsing', ['test_comp_id_parsing.html'], 'Test file not found'),
+    ('/responsive_test', 'responsive_test', ['responsive_test.html'], 'Test file not found'),
+    ('/test_portal_validation', 'test_portal_validation', ['test_portal_validation.html'], 'Test file not found'),
+    ('/portal_debug_test', 'portal_debug_test', ['portal_debug_test.html'], 'Debug test file not found'),
+    ('/homeowner_portal_v2_fresh', 'homeowner_portal_v2_fresh', ['homeowner_portal_v2_fresh.html'],
+     'Homeowner portal v2 fresh file not found'),
+    ('/copyJIC', 'copyJIC', ['copyJIC.html'], 'CopyJIC file not found'),
+    ('/copyJIC-test', 'copyJIC_test', ['copyJIC-test.html'], 'CopyJIC test file not found'),
+    # Original dashboard served raw, without template rendering
+    ('/dashboard', 'dashboard', [os.path.join('templates', 'dashboard.html')], 'Dashboard file not found'),
+    ('/homeowner-portal-v2', 'homeowner_portal_v2', ['homeowner_portal_v2_fresh.html'],
+     'Homeowner portal v2 file not found'),
+    ('/test-api-debug', 'test_api_debug', ['test-api-debug.html'], 'Test API debug file not found'),
+    ('/debug-projections', 'debug_projections', ['debug-projections.html'], 'Debug projections file not found')
+]
+
+for rule, endpoint, filenames, missing_message in STATIC_PAGE_ROUTES:
+    static_pages.register(app, rule, endpoint, filenames, missing_message)
+
+static_pages.preload()
 
 # Cleanup browser pool on app shutdown
 if PLAYWRIGHT_AVAILABLE:
@@ -2834,6 +3742,7 @@ if PLAYWRIGHT_AVAILABLE:
     atexit.register(cleanup_browser_pool)
 
 @app.route('/api/config')
+@cache_policy(NO_STORE_POLICY)
 def get_config():
     """Provide configuration to frontend"""
     return jsonify({
@@ -2841,6 +3750,141 @@ def get_config():
         'clickup_base_url': 'https://api.clickup.com/api/v2'
     })
 
+@app.cli.command('build-monthly-rollup')
+def build_monthly_rollup_command():
+    """Rebuild the per-property monthly rollup table after a data load"""
+    rollup = current_monthly_rollup()
+    num_rows = rollup.build()
+    print(f"Built {rollup.rollup_table} with {num_rows} rows")
+
+@app.cli.command('build-geocoder')
+def build_geocoder_command():
+    """Rebuild the offline geocoder index from the property table"""
+    geocoder.version = datasets.version
+    geocoder.load(load_geocoder_rows, rebuild=True)
+    print(f"Geocoder index: {geocoder.stats()}")
+
+WARM_MARKETS = int(os.getenv('WARM_MARKETS', 20))  # Largest cities searched when warming a snapshot
+
+def warm_dataset(version, markets=WARM_MARKETS):
+    """
+    Pre-populate the hottest search entries of a snapshot before it is served
+    
+    Top-revenue searches for the largest cities in the geocoder index run
+    through the normal route with the version pinned, so their entries land
+    under the new version's keys.
+    
+    Returns:
+        Tuple of (searches warmed, searches that failed)
+    """
+    geocoder.ensure_loaded(load_geocoder_rows, datasets.version)
+    cities = sorted((place for place in geocoder.places if place.kind == KIND_CITY),
+                    key=lambda place: place.properties, reverse=True)[:markets]
+    warmed, failed = 0, 0
+    with datasets.pinned(version), app.test_client() as test_client:
+        for place in cities:
+            response = test_client.post('/api/properties/top-revenue', json={'location_id': place.id},
+                                        headers={WARM_HEADER: '1'})
+            if response.status_code == 200:
+                warmed += 1
+            else:
+                failed += 1
+                click.echo(f"Warming {place.label} failed with {response.status_code}")
+    return warmed, failed
+
+@app.cli.command('cutover-dataset')
+@click.argument('version')
+@click.option('--skip-warm', is_flag=True, help='Switch without pre-populating the cache')
+@click.option('--retire-previous', is_flag=True, help="Delete the previous snapshot's cache entries")
+def cutover_dataset_command(version, skip_warm, retire_previous):
+    """Build, warm and then serve a new monthly snapshot on every worker"""
+    dataset = datasets.dataset(version)
+    for table in (dataset.property_table, dataset.monthly_table):
+        try:
+            client.get_table(table)
+        except NotFound:
+            raise click.ClickException(f"Table {table} not found")
+
+    with datasets.pinned(version):
+        rollup = current_monthly_rollup()
+        click.echo(f"Built {rollup.rollup_table} with {rollup.build()} rows")
+    if not skip_warm:
+        warmed, failed = warm_dataset(version)
+        click.echo(f"Warmed {warmed} searches for {version} ({failed} failed)")
+        if request_recorder.persistent:
+            click.echo(f"Replayed recorded traffic: {json.dumps(warm_cache(version=version))}")
+        else:
+            click.echo("Skipped replaying recorded traffic: set WARM_LOG_PATH or enable Redis to record it", err=True)
+
+    previous = datasets.cutover(version)
+    click.echo(f"Serving {version} (was {previous})")
+    if retire_previous and previous != version:
+        deleted = datasets.retire(previous, patterns=[f"{property_fragments.namespace}:*:{previous}:*"])
+        property_fragments.invalidate()
+        click.echo(f"Deleted {deleted} cache entries of {previous}")
+
+@app.cli.command('invalidate-cache')
+@click.argument('tags', nargs=-1, required=True)
+@click.option('--version', default=None, help='Dataset version (defaults to the one being served)')
+def invalidate_cache_command(tags, version):
+    """Delete cached responses by tag: nearby, top_revenue, comps_analysis, ranked:<search>, property:<id>"""
+    for tag in tags:
+        click.echo(f"{tag}: {datasets.invalidate(tag, version)} entries deleted")
+    # property:<id> also drops that property's fragments; every worker clears its local tier
+    property_ids = [tag.split(':', 1)[1] for tag in tags if tag.startswith('property:')]
+    click.echo(f"Property fragments: {property_fragments.invalidate(property_ids)} entries deleted")
+
+WARM_TOP_K = int(os.getenv('WARM_TOP_K', 50))  # Requests replayed per cache prefix
+WARM_CONCURRENCY = int(os.getenv('WARM_CONCURRENCY', 4))
+WARM_RATE = float(os.getenv('WARM_RATE', 5))  # Replayed requests per second
+
+def send_warm_request(recorded, version=None):
+    """Replay one recorded request through the app, pinned to a dataset version"""
+    with datasets.pinned(version or datasets.version), app.test_client() as test_client:
+        response = test_client.open(
+            recorded['path'],
+            method=recorded['method'],
+            query_string=recorded['args'],
+            json=recorded['json'],
+            headers={WARM_HEADER: '1'}
+        )
+        return response.status_code
+
+def warm_cache(version=None, top_k=WARM_TOP_K, prefixes=None, concurrency=WARM_CONCURRENCY, rate=WARM_RATE):
+    """Replay the most frequent recorded requests of each cached endpoint"""
+    warmer = CacheWarmer(
+        request_recorder,
+        send=lambda recorded: send_warm_request(recorded, version),
+        concurrency=concurrency,
+        rate=rate
+    )
+    return warmer.replay(prefixes or WARMED_ENDPOINTS.values(), top_k)
+
+@app.cli.command('warm-cache')
+@click.option('--top', 'top_k', default=WARM_TOP_K, show_default=True, help='Requests replayed per prefix')
+@click.option('--prefix', 'prefixes', multiple=True, help=f"Only these prefixes ({', '.join(WARMED_ENDPOINTS.values())})")
+@click.option('--concurrency', default=WARM_CONCURRENCY, show_default=True)
+@click.option('--rate', default=WARM_RATE, show_default=True, help='Requests per second')
+@click.option('--version', default=None, help='Dataset version (defaults to the one being served)')
+def warm_cache_command(top_k, prefixes, concurrency, rate, version):
+    """Replay the hottest recorded nearby, top-revenue, property and comps requests"""
+    if not request_recorder.persistent:
+        raise click.ClickException('Nothing to replay: set WARM_LOG_PATH (or enable Redis) so requests are recorded')
+    click.echo(json.dumps(warm_cache(version, top_k, prefixes, concurrency, rate), indent=2))
+
+def warm_cache_on_startup():
+    """Warm once per deploy and dataset version; the Redis lock keeps the other workers from repeating it"""
+    if not request_recorder.persistent:
+        app.logger.warning('WARM_ON_STARTUP is set but no requests are recorded; set WARM_LOG_PATH or enable Redis')
+        return
+    if CACHE_ENABLED and not cache.set(f"{request_recorder.namespace}:startup:{datasets.version}", 1, nx=True,
+                                       ex=int(os.getenv('WARM_STARTUP_LOCK_SECONDS', 600))):
+        return
+    warm_cache()
+
+if os.getenv('WARM_ON_STARTUP', 'false').lower() == 'true':
+    threading.Thread(target=warm_cache_on_startup, name='cache-warmer', daemon=True).start()
+
 if __name__ == '__main__':
     print("Starting AirDNA Dashboard API...")
     print(f"Cache enabled: {CACHE_ENABLED}")
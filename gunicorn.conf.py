@@ -0,0 +1,10 @@
+"""
+Gunicorn server hooks
+Picked up automatically by `gunicorn app:app` from the working directory
+"""
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauge files so /metrics stays accurate in multiprocess mode
+    from services.metrics import mark_process_dead
+    mark_process_dead(worker.pid)
@@ -11,6 +11,9 @@ from contextlib import asynccontextmanager
 from playwright.async_api import async_playwright, Browser, Page, Playwright
 import logging
 
+from services import metrics
+from services.timing import span, record
+
 logger = logging.getLogger(__name__)
 
 class BrowserPool:
@@ -39,9 +42,11 @@ class BrowserPool:
         await self.initialize()
         
         browser = None
+        wait_start = time.perf_counter()
         async with self.lock:
             if self.browsers:
                 browser = self.browsers.pop()
+                metrics.BROWSER_POOL_IDLE.set(len(self.browsers))
                 logger.debug("Reusing browser from pool")
             else:
                 logger.debug("Creating new browser instance")
@@ -60,6 +65,9 @@ class BrowserPool:
                         '--disable-software-rasterizer'
                     ]
                 )
+        wait_seconds = time.perf_counter() - wait_start
+        record('pdf_browser_wait', wait_seconds * 1000)
+        metrics.BROWSER_WAIT.observe(wait_seconds)
         
         try:
             yield browser
@@ -72,6 +80,7 @@ class BrowserPool:
                         for page in context.pages:
                             await page.close()
                     self.browsers.append(browser)
+                    metrics.BROWSER_POOL_IDLE.set(len(self.browsers))
                     logger.debug("Returned browser to pool")
                 else:
                     await browser.close()
@@ -83,6 +92,7 @@ class BrowserPool:
             for browser in self.browsers:
                 await browser.close()
             self.browsers.clear()
+            metrics.BROWSER_POOL_IDLE.set(0)
             
             if self.playwright:
                 await self.playwright.stop()
@@ -236,7 +246,8 @@ class PlaywrightPDFGenerator:
             
             try:
                 # Set content
-                await page.set_content(html_content, wait_until='networkidle')
+                with span('pdf_load'):
+                    await page.set_content(html_content, wait_until='networkidle')
                 
                 # Inject dark theme CSS if requested
                 if inject_dark_theme:
@@ -244,15 +255,18 @@ class PlaywrightPDFGenerator:
                 
                 # Wait for charts if requested
                 if wait_for_charts:
-                    await PlaywrightPDFGenerator.wait_for_charts(page)
+                    with span('pdf_chart_wait'):
+                        await PlaywrightPDFGenerator.wait_for_charts(page)
                 
                 # Wait a moment for any final rendering
                 await asyncio.sleep(0.5)
                 
                 # Generate PDF
-                pdf_bytes = await page.pdf(**default_options)
+                with span('pdf_render'):
+                    pdf_bytes = await page.pdf(**default_options)
                 
                 generation_time = time.time() - start_time
+                metrics.PDF_RENDER.labels(source='html').observe(generation_time)
                 logger.info(f"PDF generated in {generation_time:.2f} seconds")
                 
                 return pdf_bytes
@@ -304,7 +318,8 @@ class PlaywrightPDFGenerator:
             
             try:
                 # Navigate to URL
-                await page.goto(url, wait_until='networkidle')
+                with span('pdf_load'):
+                    await page.goto(url, wait_until='networkidle')
                 
                 # Inject dark theme CSS if requested
                 if inject_dark_theme:
@@ -312,15 +327,18 @@ class PlaywrightPDFGenerator:
                 
                 # Wait for charts if requested
                 if wait_for_charts:
-                    await PlaywrightPDFGenerator.wait_for_charts(page)
+                    with span('pdf_chart_wait'):
+                        await PlaywrightPDFGenerator.wait_for_charts(page)
                 
                 # Wait a moment for any final rendering
                 await asyncio.sleep(0.5)
                 
                 # Generate PDF
-                pdf_bytes = await page.pdf(**default_options)
+                with span('pdf_render'):
+                    pdf_bytes = await page.pdf(**default_options)
                 
                 generation_time = time.time() - start_time
+                metrics.PDF_RENDER.labels(source='url').observe(generation_time)
                 logger.info(f"PDF generated from URL in {generation_time:.2f} seconds")
                 
                 return pdf_bytes
@@ -0,0 +1,3 @@
+"""
+Analysis and infrastructure services used by the Flask app
+"""
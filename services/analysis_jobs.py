@@ -0,0 +1,215 @@
+"""
+Background job runner for heavy comparable property analyses
+Jobs run in a bounded thread pool, are deduplicated by cache key and
+persist their results to the shared cache so any worker can serve them
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Sequence
+
+from services.json_provider import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_COMPLETED = 'completed'
+JOB_FAILED = 'failed'
+
+
+class JobQueueFullError(Exception):
+    """Raised when the job pool already has its maximum number of pending jobs"""
+
+
+class AnalysisJobManager:
+    """
+    Runs analysis jobs off the request thread.
+    The job id is the analysis cache key, so identical submissions share one job.
+    Results are stored through writer(key, payload, ttl, tags) (the app's
+    tagged cache_set), and only ids with a job:<id> status record are served.
+    """
+
+    def __init__(self, cache=None, max_workers: int = 2, max_pending: int = 20,
+                 result_ttl: int = 7200, max_tracked_jobs: int = 200,
+                 writer: Optional[Callable[[str, str, int, Sequence[str]], None]] = None):
+        self.cache = cache
+        self.writer = writer
+        self.max_pending = max_pending
+        self.result_ttl = result_ttl
+        self.max_tracked_jobs = max_tracked_jobs
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='analysis-job')
+        self.jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def status_key(job_id: str) -> str:
+        return f"job:{job_id}"
+
+    def _public(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Job metadata safe to return to clients (no result payload)"""
+        return {key: value for key, value in job.items() if key != 'result'}
+
+    def _publish(self, job: Dict[str, Any]):
+        """Mirror job status into the shared cache for other workers"""
+        if self.cache is None:
+            return
+        try:
+            self.cache.setex(self.status_key(job['job_id']), self.result_ttl, dumps(self._public(job)))
+        except Exception as e:
+            logger.warning(f"Could not publish job status {job['job_id']}: {e}")
+
+    def _write_result(self, job_id: str, payload: str, tags: Sequence[str]):
+        if self.writer is not None:
+            self.writer(job_id, payload, self.result_ttl, tags)
+        else:
+            self.cache.setex(job_id, self.result_ttl, payload)
+
+    def record_completed(self, job_id: str):
+        """Publish a completed status for a result cached outside the job runner"""
+        self._publish({'job_id': job_id, 'status': JOB_COMPLETED, 'finished_at': time.time()})
+
+    def _expired(self, job: Dict[str, Any]) -> bool:
+        """Completed jobs are only reused while their cached result is still live"""
+        return job['status'] == JOB_COMPLETED and time.time() - job['finished_at'] > self.result_ttl
+
+    def _pending_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if job['status'] in (JOB_QUEUED, JOB_RUNNING))
+
+    def _evict(self):
+        """Drop the oldest finished jobs beyond the tracking limit"""
+        while len(self.jobs) > self.max_tracked_jobs:
+            oldest_id = next(
+                (job_id for job_id, job in self.jobs.items() if job['status'] in (JOB_COMPLETED, JOB_FAILED)),
+                None
+            )
+            if oldest_id is None:
+                break
+            del self.jobs[oldest_id]
+
+    def _claim(self, job: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Atomically claim a job id in the shared cache (SET NX)
+
+        Returns None when this worker now owns the job, otherwise the status
+        of the job another worker already claimed. Failed jobs can be
+        claimed again.
+        """
+        if self.cache is None:
+            return None
+        key = self.status_key(job['job_id'])
+        existing = None
+        for _ in range(2):
+            if self.cache.set(key, dumps(self._public(job)), nx=True, ex=self.result_ttl):
+                return None
+            existing = self.cache.get(key)
+            if existing is None:
+                continue  # Expired between SET and GET
+            existing = loads(existing)
+            if existing.get('status') != JOB_FAILED:
+                return existing
+            self.cache.delete(key)
+        return existing
+
+    def submit(self, job_id: str, func: Callable[..., Dict[str, Any]], *args, tags: Sequence[str] = (), **kwargs):
+        """
+        Submit a job unless an identical one is already queued, running or done
+        on this or any other worker; tags are recorded with the cached result
+
+        Returns:
+            Tuple of (job metadata, created flag)
+        """
+        with self.lock:
+            existing = self.jobs.get(job_id)
+            if existing and existing['status'] != JOB_FAILED and not self._expired(existing):
+                return self._public(existing), False
+
+            if self._pending_count() >= self.max_pending:
+                raise JobQueueFullError(f"Analysis queue is full ({self.max_pending} pending jobs)")
+
+        job = {
+            'job_id': job_id,
+            'status': JOB_QUEUED,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'error_code': None,
+            'details': None
+        }
+        try:
+            claimed_elsewhere = self._claim(job)
+        except Exception as e:
+            logger.warning(f"Could not claim job {job_id}, running it locally: {e}")
+            claimed_elsewhere = None
+        if claimed_elsewhere is not None:
+            return claimed_elsewhere, False
+
+        with self.lock:
+            existing = self.jobs.get(job_id)
+            if existing and existing['status'] in (JOB_QUEUED, JOB_RUNNING):
+                return self._public(existing), False
+            self.jobs[job_id] = job
+            self._evict()
+
+        self.executor.submit(self._run, job, func, args, kwargs, tags)
+        return self._public(job), True
+
+    def _run(self, job: Dict[str, Any], func, args, kwargs, tags: Sequence[str] = ()):
+        job['status'] = JOB_RUNNING
+        job['started_at'] = time.time()
+        self._publish(job)
+
+        try:
+            result = func(*args, **kwargs)
+            if self.cache is not None:
+                # Stored under the analysis cache key so the synchronous endpoint hits it too
+                self._write_result(job['job_id'], dumps(result), tags)
+            job['result'] = result
+            job['status'] = JOB_COMPLETED
+        except Exception as e:
+            logger.error(f"Analysis job {job['job_id']} failed: {e}")
+            job['status'] = JOB_FAILED
+            job['error'] = str(e)
+            job['error_code'] = getattr(e, 'error_code', None) or 'INTERNAL_ERROR'
+            job['details'] = getattr(e, 'details', None)
+        finally:
+            job['finished_at'] = time.time()
+            self._publish(job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Look up job metadata locally, then in the shared cache"""
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job:
+                return self._public(job)
+
+        if self.cache is not None:
+            cached_status = self.cache.get(self.status_key(job_id))
+            if cached_status:
+                return loads(cached_status)
+        return None
+
+    def result(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Fetch a completed job's result from memory or the shared cache
+
+        The id doubles as a cache key, so the cache is only read for ids
+        whose status record says this manager completed them.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job and 'result' in job:
+                return job['result']
+
+        if self.cache is not None:
+            job = self.get(job_id)
+            if not job or job.get('status') != JOB_COMPLETED:
+                return None
+            cached_result = self.cache.get(job_id)
+            if cached_result:
+                return loads(cached_result)
+        return None
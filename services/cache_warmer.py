@@ -0,0 +1,182 @@
+"""
+Cache warming from recorded traffic
+Successful search, property and comps requests are counted per cache prefix
+in a Redis sorted set (or a local log), and the hottest ones can be replayed
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Header marking replayed requests so they are not counted as traffic
+WARM_HEADER = 'X-Cache-Warm'
+
+# Request fields that select a page rather than a distinct search
+IGNORED_FIELDS = ('cursor',)
+
+
+def request_member(method: str, path: str, args: Dict[str, str], body: Optional[dict]) -> str:
+    """Canonical JSON encoding of a request, the member counted in the sorted set"""
+    return json.dumps({
+        'method': method,
+        'path': path,
+        'args': {key: value for key, value in args.items() if key not in IGNORED_FIELDS},
+        'json': {key: value for key, value in body.items() if key not in IGNORED_FIELDS}
+        if isinstance(body, dict) else None
+    }, sort_keys=True)
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across threads (rate <= 0 disables it)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_at)
+            self._next_at = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+class RequestRecorder:
+    """
+    Request frequencies per cache prefix.
+
+    With Redis every worker adds to one sorted set per prefix, trimmed to
+    the max_entries most frequent requests; without it counts are kept in
+    process and, when log_path is set, appended to a JSON-lines log that
+    top() reads back.
+    """
+
+    def __init__(self, cache=None, namespace: str = 'warm', max_entries: int = 1000,
+                 ttl: int = 7 * 86400, sample_rate: float = 1.0, log_path: Optional[str] = None):
+        self.cache = cache
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.sample_rate = sample_rate
+        self.log_path = log_path
+        self.counts: Dict[str, Counter] = {}
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def persistent(self) -> bool:
+        """Whether recorded requests outlive the process (Redis or a log file)"""
+        return self.cache is not None or bool(self.log_path)
+
+    def key(self, prefix: str) -> str:
+        return f"{self.namespace}:requests:{prefix}"
+
+    def record(self, prefix: str, member: str):
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            return
+        with self._lock:
+            self.recorded += 1
+            trim = self.recorded % 100 == 0
+            if self.cache is None:
+                self.counts.setdefault(prefix, Counter())[member] += 1
+                if self.log_path:
+                    self._append_log(prefix, member)
+                return
+        try:
+            pipe = self.cache.pipeline(transaction=False)
+            pipe.zincrby(self.key(prefix), 1, member)
+            pipe.expire(self.key(prefix), self.ttl)
+            if trim:
+                pipe.zremrangebyrank(self.key(prefix), 0, -self.max_entries - 1)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not record request for warming: {e}")
+
+    def _append_log(self, prefix: str, member: str):
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps({'prefix': prefix, 'request': member}) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write warm log {self.log_path}: {e}")
+
+    def _logged_counts(self, prefix: str) -> Counter:
+        counts = Counter()
+        try:
+            with open(self.log_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry['prefix'] == prefix:
+                        counts[entry['request']] += 1
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read warm log {self.log_path}: {e}")
+        return counts
+
+    def top(self, prefix: str, k: int) -> List[dict]:
+        """The k most frequent requests recorded for prefix, hottest first"""
+        if self.cache is not None:
+            members = self.cache.zrevrange(self.key(prefix), 0, k - 1)
+        else:
+            with self._lock:
+                counts = Counter(self.counts.get(prefix, {}))
+            if self.log_path:
+                counts = self._logged_counts(prefix)
+            members = [member for member, _ in counts.most_common(k)]
+        return [json.loads(member) for member in members]
+
+
+class CacheWarmer:
+    """
+    Replays the hottest recorded requests concurrently, at most rate per second.
+
+    send(request) issues one recorded request (method, path, args, json) and
+    returns its HTTP status; replay happens through the normal routes so
+    entries land exactly where real traffic will look for them.
+    """
+
+    def __init__(self, recorder: RequestRecorder, send: Callable[[dict], int],
+                 concurrency: int = 4, rate: float = 10.0):
+        self.recorder = recorder
+        self.send = send
+        self.concurrency = concurrency
+        self.rate = rate
+
+    def replay(self, prefixes: Iterable[str], top_k: int) -> Dict[str, object]:
+        """Replay the top_k requests of each prefix; returns per-prefix counts"""
+        prefixes = list(prefixes)
+        if not self.recorder.persistent:
+            logger.warning("Requests are only recorded in this process without Redis or a log path; "
+                           "set WARM_LOG_PATH to replay traffic recorded by the running workers")
+        requests = [(prefix, request) for prefix in prefixes for request in self.recorder.top(prefix, top_k)]
+        limiter = RateLimiter(self.rate)
+        results: Dict[str, Dict[str, int]] = {prefix: {'warmed': 0, 'failed': 0} for prefix in prefixes}
+        lock = threading.Lock()
+
+        def warm(item):
+            prefix, request = item
+            limiter.wait()
+            try:
+                ok = self.send(request) < 400
+            except Exception as e:
+                logger.warning(f"Warming {request['path']} failed: {e}")
+                ok = False
+            with lock:
+                results[prefix]['warmed' if ok else 'failed'] += 1
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max(1, self.concurrency)) as pool:
+            list(pool.map(warm, requests))
+
+        seconds = round(time.perf_counter() - start, 1)
+        logger.info(f"Cache warming replayed {len(requests)} requests in {seconds}s")
+        return {'requests': len(requests), 'seconds': seconds, 'prefixes': results}
@@ -0,0 +1,102 @@
+"""
+Single-pass statistics kernel for comparable property analysis
+Computes moments, quantiles and the correlation matrix over a stacked
+(properties x metrics) NumPy array, optionally weighted
+"""
+
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+
+# Quantiles computed in one np.percentile call: min, p25, median, p75, max
+QUANTILES = (0, 25, 50, 75, 100)
+
+# Supported weighting schemes -> property field holding the weight
+WEIGHT_FIELDS = {
+    'review_count': 'review_count'
+}
+
+
+def weights_vector(data: Sequence[Dict[str, Any]], weight_by: Optional[str]) -> Optional[np.ndarray]:
+    """Build a non-negative weight vector for the given weighting scheme"""
+    if not weight_by:
+        return None
+    if weight_by not in WEIGHT_FIELDS:
+        raise ValueError(f"Unsupported weighting: {weight_by}")
+
+    field = WEIGHT_FIELDS[weight_by]
+    weights = np.asarray([float(prop.get(field) or 0) for prop in data], dtype=np.float64)
+    weights = np.clip(weights, 0, None)
+    # Fall back to equal weights rather than dividing by zero
+    return weights if weights.sum() > 0 else None
+
+
+def _weighted_quantiles(X: np.ndarray, weights: np.ndarray, quantiles: Sequence[float]) -> np.ndarray:
+    """Column-wise weighted quantiles via the cumulative weight distribution"""
+    order = np.argsort(X, axis=0)
+    sorted_values = np.take_along_axis(X, order, axis=0)
+    sorted_weights = weights[order]
+    cumulative = np.cumsum(sorted_weights, axis=0) - 0.5 * sorted_weights
+    cumulative /= sorted_weights.sum(axis=0)
+
+    q = np.asarray(quantiles, dtype=np.float64) / 100
+    return np.column_stack([
+        np.interp(q, cumulative[:, j], sorted_values[:, j]) for j in range(X.shape[1])
+    ])
+
+
+def _correlation(covariance: np.ndarray) -> np.ndarray:
+    """Convert a covariance matrix to correlations, leaving NaN for constant metrics"""
+    scale = np.sqrt(np.diag(covariance))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        correlation = covariance / np.outer(scale, scale)
+    return np.clip(correlation, -1, 1)
+
+
+def compute_statistics(X: np.ndarray, weights: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    """
+    Compute column-wise statistics for a metrics matrix
+
+    Args:
+        X: Array of shape (n_properties, n_metrics)
+        weights: Optional per-property weights
+
+    Returns:
+        Dict of arrays keyed by statistic; 'correlation' is (n_metrics, n_metrics)
+    """
+    n = X.shape[0]
+
+    if weights is None:
+        mean = X.mean(axis=0)
+        std = X.std(axis=0)
+        quantiles = np.percentile(X, QUANTILES, axis=0)
+        covariance = np.atleast_2d(np.cov(X, rowvar=False, bias=True)) if n > 1 else None
+    else:
+        mean = np.average(X, axis=0, weights=weights)
+        std = np.sqrt(np.average((X - mean) ** 2, axis=0, weights=weights))
+        quantiles = _weighted_quantiles(X, weights, QUANTILES)
+        # Extremes are unaffected by weighting
+        quantiles[0], quantiles[-1] = X.min(axis=0), X.max(axis=0)
+        covariance = np.atleast_2d(np.cov(X, rowvar=False, aweights=weights, bias=True)) if n > 1 else None
+
+    if covariance is None:
+        correlation = np.full((X.shape[1], X.shape[1]), np.nan)
+    else:
+        correlation = _correlation(covariance)
+
+    return {
+        'mean': mean,
+        'std': std,
+        'min': quantiles[0],
+        'p25': quantiles[1],
+        'median': quantiles[2],
+        'p75': quantiles[3],
+        'max': quantiles[4],
+        'correlation': correlation
+    }
+
+
+def correlation_value(correlation: np.ndarray, i: int, j: int, digits: int = 2) -> Optional[float]:
+    """Read a rounded correlation coefficient, None when undefined"""
+    value = correlation[i, j]
+    return round(float(value), digits) if np.isfinite(value) else None
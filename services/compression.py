@@ -0,0 +1,117 @@
+"""
+Response compression with Accept-Encoding negotiation
+Buffered responses above a minimum size are brotli- or gzip-encoded;
+static pages are precompressed once at load, and dynamic bodies with an
+ETag are kept in a small LRU
+"""
+
+import gzip
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from flask import Flask, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'application/json',
+    'application/javascript',
+    'image/svg+xml'
+}
+
+# Dynamic responses favour speed; precompressed bodies are encoded once at maximum ratio
+DYNAMIC_LEVELS = {'br': 5, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def compress(data: bytes, encoding: str, level: int) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level)
+
+
+class ResponseCompression:
+    """
+    after_request middleware that compresses buffered responses.
+
+    Register it before ConditionalCaching so it runs after ETags and 304s
+    are settled. Compressed responses get a weak ETag, which still matches
+    If-None-Match under the weak comparison RFC 9110 requires. Responses
+    carrying a precompressed mapping (encoding -> body, see precompress())
+    are served from it; the bounded LRU only holds dynamic bodies.
+    """
+
+    def __init__(self, app: Optional[Flask] = None, min_size: int = 1024, max_cached_bodies: int = 64):
+        self.min_size = min_size
+        self.max_cached_bodies = max_cached_bodies
+        self.encodings = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+        self.compressed: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.after_request(self.process_response)
+
+    def _remember(self, key: tuple, body: bytes):
+        with self.lock:
+            self.compressed[key] = body
+            self.compressed.move_to_end(key)
+            while len(self.compressed) > self.max_cached_bodies:
+                self.compressed.popitem(last=False)
+
+    def precompress(self, data: bytes) -> Dict[str, bytes]:
+        """Compress a static body in every supported encoding ahead of time"""
+        if len(data) < self.min_size:
+            return {}
+        return {encoding: compress(data, encoding, STATIC_LEVELS[encoding]) for encoding in self.encodings}
+
+    def encode(self, data: bytes, encoding: str, etag: Optional[str] = None) -> bytes:
+        if etag:
+            with self.lock:
+                body = self.compressed.get((etag, encoding))
+            if body is not None:
+                return body
+
+        body = compress(data, encoding, DYNAMIC_LEVELS[encoding])
+        if etag:
+            self._remember((etag, encoding), body)
+        return body
+
+    def negotiate(self) -> Optional[str]:
+        return request.accept_encodings.best_match(self.encodings)
+
+    def process_response(self, response):
+        if response.status_code < 200 or response.status_code >= 300 or response.status_code in (204, 206):
+            return response
+        if response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if not encoding:
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        etag, weak = response.get_etag()
+        precompressed = getattr(response, 'precompressed', None) or {}
+        body = precompressed.get(encoding)
+        response.set_data(body if body is not None else self.encode(data, encoding, etag))
+        response.headers['Content-Encoding'] = encoding
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
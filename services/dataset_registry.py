@@ -0,0 +1,172 @@
+"""
+Dataset registry
+Maps each monthly snapshot version to its BigQuery tables and keeps the
+version every worker serves in Redis, so a data refresh is a pointer switch
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Table ids for a version; {project} and {version} are filled in per snapshot
+PROPERTY_TABLE = '{project}.{version}monthly.{version}property'
+MONTHLY_TABLE = '{project}.{version}monthly.{version}monthly'
+ROLLUP_TABLE = '{project}.{version}monthly.property_monthly_rollup'
+
+
+class Dataset:
+    """One monthly snapshot and the tables it lives in"""
+    __slots__ = ('version', 'property_table', 'monthly_table', 'rollup_table')
+
+    def __init__(self, project: str, version: str, rollup_table: str = ROLLUP_TABLE):
+        self.version = version
+        self.property_table = PROPERTY_TABLE.format(project=project, version=version)
+        self.monthly_table = MONTHLY_TABLE.format(project=project, version=version)
+        self.rollup_table = rollup_table.format(project=project, version=version)
+
+    def as_dict(self) -> Dict[str, str]:
+        return {
+            'version': self.version,
+            'property_table': self.property_table,
+            'monthly_table': self.monthly_table,
+            'rollup_table': self.rollup_table
+        }
+
+
+class DatasetRegistry:
+    """
+    The snapshot version being served and tag sets of the cache keys built from it.
+
+    current() follows the Redis pointer (re-read at most every check_interval)
+    and falls back to default_version without Redis. pinned() overrides the
+    version for the calling thread, which is how a new snapshot is warmed
+    before cutover(). Keys recorded with tag() can be deleted per tag, or all
+    at once when a version is retired. Tag sets are sorted sets scored by
+    each key's expiry, so expired members are pruned on every write, and the
+    set itself outlives its members by tag_ttl (the longest tagged TTL).
+    """
+
+    def __init__(self, project: str, default_version: str, cache=None, namespace: str = 'dataset',
+                 rollup_table: str = ROLLUP_TABLE, check_interval: float = 30.0, tag_ttl: int = 86400):
+        self.project = project
+        self.default_version = default_version
+        self.cache = cache
+        self.namespace = namespace
+        self.rollup_table = rollup_table
+        self.check_interval = check_interval
+        self.tag_ttl = tag_ttl
+        self._datasets: Dict[str, Dataset] = {}
+        self._version = default_version
+        self._checked_at: Optional[float] = None
+        self._pinned = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def pointer_key(self) -> str:
+        return f"{self.namespace}:current"
+
+    def tag_key(self, tag: str, version: str) -> str:
+        return f"{self.namespace}:tag:{version}:{tag}"
+
+    def dataset(self, version: str) -> Dataset:
+        dataset = self._datasets.get(version)
+        if dataset is None:
+            dataset = self._datasets.setdefault(version, Dataset(self.project, version, self.rollup_table))
+        return dataset
+
+    def _served_version(self) -> str:
+        with self._lock:
+            now = time.monotonic()
+            if self.cache is None or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+                return self._version
+            try:
+                pointer = self.cache.get(self.pointer_key)
+            except Exception as e:
+                logger.warning(f"Could not read dataset pointer: {e}")
+                pointer = None
+            if pointer and pointer != self._version:
+                logger.info(f"Serving dataset {pointer} (was {self._version})")
+                self._version = pointer
+            self._checked_at = now
+            return self._version
+
+    def current(self) -> Dataset:
+        return self.dataset(getattr(self._pinned, 'version', None) or self._served_version())
+
+    @property
+    def version(self) -> str:
+        return self.current().version
+
+    @contextmanager
+    def pinned(self, version: str):
+        """Serve version from the calling thread only, e.g. while warming it"""
+        previous = getattr(self._pinned, 'version', None)
+        self._pinned.version = version
+        try:
+            yield self.dataset(version)
+        finally:
+            self._pinned.version = previous
+
+    def cutover(self, version: str) -> str:
+        """Point every worker at version; returns the version served before"""
+        previous = self._served_version()
+        if self.cache is not None:
+            self.cache.set(self.pointer_key, version)
+        with self._lock:
+            self._version = version
+            self._checked_at = time.monotonic()
+        logger.info(f"Cut over from dataset {previous} to {version}")
+        return previous
+
+    def tag(self, key: str, tags: Iterable[str], ttl: int, version: Optional[str] = None):
+        """Record key under each tag of the (current) version, for as long as the key lives"""
+        if self.cache is None:
+            return
+        version = version or self.version
+        now = time.time()
+        try:
+            pipe = self.cache.pipeline(transaction=False)
+            for tag in tags:
+                tag_key = self.tag_key(tag, version)
+                pipe.zadd(tag_key, {key: now + ttl})
+                pipe.zremrangebyscore(tag_key, '-inf', now)
+                pipe.expire(tag_key, max(ttl, self.tag_ttl))
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not tag cache key: {e}")
+
+    def invalidate(self, tag: str, version: Optional[str] = None) -> int:
+        """Delete every live key recorded under tag; returns the number of keys deleted"""
+        if self.cache is None:
+            return 0
+        tag_key = self.tag_key(tag, version or self.version)
+        keys = list(self.cache.zrangebyscore(tag_key, time.time(), '+inf'))
+        deleted = self.cache.delete(*keys) if keys else 0
+        self.cache.delete(tag_key)
+        return deleted
+
+    def retire(self, version: str, patterns: Iterable[str] = ()) -> int:
+        """Delete all tagged keys of version, plus untagged keys matching patterns"""
+        if self.cache is None:
+            return 0
+        deleted = 0
+        prefix = self.tag_key('', version)
+        for tag_key in list(self.cache.scan_iter(match=f"{prefix}*")):
+            deleted += self.invalidate(tag_key[len(prefix):], version)
+        for pattern in patterns:
+            keys = list(self.cache.scan_iter(match=pattern))
+            for start in range(0, len(keys), 500):
+                deleted += self.cache.delete(*keys[start:start + 500])
+        logger.info(f"Retired dataset {version}: {deleted} cache keys deleted")
+        return deleted
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self.current().as_dict(),
+            'default_version': self.default_version,
+            'shared_pointer': self.cache is not None
+        }
@@ -0,0 +1,75 @@
+"""
+Sparse fieldsets for the property APIs
+A fields= parameter names column groups (or view aliases) so a route can
+prune both its BigQuery SELECT list and its response body
+"""
+
+from typing import Dict, FrozenSet, Iterable, Optional, Sequence
+
+
+class FieldSelectionError(ValueError):
+    """Raised when fields= names an unknown group"""
+
+
+class FieldSet:
+    """
+    Named groups of SELECT expressions for one endpoint.
+
+    groups maps a group name to the SQL expressions it needs (sections built
+    from separate queries can have none); always lists expressions selected
+    for every request; aliases name fixed views made of several groups;
+    dependencies lists groups that must be fetched (not returned) for another.
+    """
+
+    def __init__(self, groups: Dict[str, Sequence[str]], always: Sequence[str] = (),
+                 aliases: Optional[Dict[str, Sequence[str]]] = None,
+                 dependencies: Optional[Dict[str, Sequence[str]]] = None):
+        self.groups = groups
+        self.always = list(always)
+        self.aliases = aliases or {}
+        self.dependencies = dependencies or {}
+
+    @property
+    def names(self) -> Sequence[str]:
+        return list(self.groups) + list(self.aliases)
+
+    def parse(self, value) -> FrozenSet[str]:
+        """
+        Parse a fields= value (comma-separated string or list) into group names
+
+        An empty or missing value selects every group.
+        """
+        if not value:
+            return frozenset(self.groups)
+
+        requested = value.split(',') if isinstance(value, str) else value
+        selected = set()
+        for name in requested:
+            name = str(name).strip().lower()
+            if not name:
+                continue
+            if name in self.aliases:
+                selected.update(self.aliases[name])
+            elif name in self.groups:
+                selected.add(name)
+            else:
+                raise FieldSelectionError(
+                    f"Unknown field group '{name}'. Available: {', '.join(self.names)}"
+                )
+        return frozenset(selected or self.groups)
+
+    def required(self, selected: Iterable[str]) -> FrozenSet[str]:
+        """Selected groups plus the groups they depend on"""
+        required = set(selected)
+        for name in selected:
+            required.update(self.dependencies.get(name, ()))
+        return frozenset(required)
+
+    def select_list(self, selected: Iterable[str], separator: str = ',\n') -> str:
+        """SELECT expressions for the given groups, in definition order"""
+        selected = set(selected)
+        expressions = list(self.always)
+        for name, group_expressions in self.groups.items():
+            if name in selected:
+                expressions.extend(e for e in group_expressions if e not in expressions)
+        return separator.join(expressions)
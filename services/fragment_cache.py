@@ -0,0 +1,153 @@
+"""
+Per-property fragment cache
+Stores property rows and projections individually so analyses over
+overlapping comp sets share work instead of keying on the whole set
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional
+
+from services.json_provider import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Marker stored for properties known to have no usable row
+MISSING = '__missing__'
+
+
+class FragmentCache:
+    """
+    Two-tier cache of per-property fragments: a bounded in-process LRU in
+    front of Redis. Lookups for many properties are a single MGET, and
+    fragments read from Redis are kept locally only for their remaining TTL.
+    invalidate() bumps a shared generation counter, which makes every worker
+    drop its local tier within check_interval seconds.
+    """
+
+    def __init__(self, cache=None, namespace: str = 'fragment', max_local_entries: int = 5000,
+                 ttl: int = 86400, check_interval: float = 5.0):
+        self.cache = cache
+        self.namespace = namespace
+        self.max_local_entries = max_local_entries
+        self.ttl = ttl
+        self.check_interval = check_interval
+        self.local: "OrderedDict[str, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+        self._generation: Optional[str] = None
+        self._checked_at: Optional[float] = None
+
+    @property
+    def generation_key(self) -> str:
+        return f"{self.namespace}:generation"
+
+    def key(self, kind: str, version: str, property_id: str) -> str:
+        return f"{self.namespace}:{kind}:{version}:{property_id}"
+
+    def _sync_generation(self):
+        """Drop the local tier once another process has invalidated fragments"""
+        now = time.monotonic()
+        if self.cache is None or (self._checked_at is not None and now - self._checked_at < self.check_interval):
+            return
+        self._checked_at = now
+        try:
+            generation = self.cache.get(self.generation_key)
+        except Exception as e:
+            logger.warning(f"Could not read fragment generation: {e}")
+            return
+        if generation != self._generation:
+            self.clear_local()
+            self._generation = generation
+
+    def _remember(self, key: str, value: Any, ttl: Optional[int] = None):
+        with self.lock:
+            self.local[key] = (time.time() + (ttl or self.ttl), value)
+            self.local.move_to_end(key)
+            while len(self.local) > self.max_local_entries:
+                self.local.popitem(last=False)
+
+    def get_many(self, kind: str, version: str, property_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Look up fragments for many properties
+
+        Returns:
+            Dict of property_id -> fragment for hits; negative hits map to MISSING
+        """
+        hits = {}
+        remote_ids: List[str] = []
+
+        self._sync_generation()
+        now = time.time()
+        with self.lock:
+            for property_id in property_ids:
+                key = self.key(kind, version, property_id)
+                entry = self.local.get(key)
+                if entry and entry[0] > now:
+                    self.local.move_to_end(key)
+                    hits[property_id] = entry[1]
+                else:
+                    self.local.pop(key, None)
+                    remote_ids.append(property_id)
+
+        if remote_ids and self.cache is not None:
+            keys = [self.key(kind, version, pid) for pid in remote_ids]
+            try:
+                pipe = self.cache.pipeline(transaction=False)
+                pipe.mget(keys)
+                for key in keys:
+                    pipe.ttl(key)
+                values, *ttls = pipe.execute()
+            except Exception as e:
+                logger.warning(f"Fragment cache read failed: {e}")
+                values, ttls = [None] * len(remote_ids), [None] * len(remote_ids)
+
+            for property_id, key, value, ttl in zip(remote_ids, keys, values, ttls):
+                if value is None:
+                    continue
+                fragment = loads(value)
+                hits[property_id] = fragment
+                # Short-lived entries (e.g. negative ones) expire locally when they do in Redis;
+                # -1 is a key without expiry, -2 one that expired since the read
+                if ttl != -2:
+                    self._remember(key, fragment, ttl if ttl and ttl > 0 else None)
+
+        return hits
+
+    def set_many(self, kind: str, version: str, fragments: Dict[str, Any], ttl: Optional[int] = None):
+        """Store fragments for many properties in one Redis round-trip"""
+        if not fragments:
+            return
+
+        for property_id, fragment in fragments.items():
+            self._remember(self.key(kind, version, property_id), fragment, ttl)
+
+        if self.cache is not None:
+            try:
+                pipe = self.cache.pipeline(transaction=False)
+                for property_id, fragment in fragments.items():
+                    pipe.setex(self.key(kind, version, property_id), ttl or self.ttl, dumps(fragment))
+                pipe.execute()
+            except Exception as e:
+                logger.warning(f"Fragment cache write failed: {e}")
+
+    def clear_local(self):
+        with self.lock:
+            self.local.clear()
+
+    def invalidate(self, property_ids: Iterable[str] = ()) -> int:
+        """
+        Delete the fragments of property_ids (every kind and version) and make
+        every worker drop its local tier; returns the number of keys deleted
+        """
+        self.clear_local()
+        if self.cache is None:
+            return 0
+        deleted = 0
+        for property_id in property_ids:
+            keys = list(self.cache.scan_iter(match=f"{self.namespace}:*:{property_id}"))
+            if keys:
+                deleted += self.cache.delete(*keys)
+        self.cache.incr(self.generation_key)
+        return deleted
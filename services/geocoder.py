@@ -0,0 +1,534 @@
+"""
+Offline geocoder and location index built from the property table
+City, neighborhood, metro area, postal code and state centroids are indexed
+by normalized tokens, with a trie for typo-tolerant lookups and a sorted
+key array for autocomplete; each place has a canonical location id
+"""
+
+import fcntl
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+KIND_CITY = 'city'
+KIND_NEIGHBORHOOD = 'neighborhood'
+KIND_MSA = 'msa'
+KIND_POSTAL = 'postal'
+KIND_STATE = 'state'
+
+# Cities win ties over neighborhoods of the same name, which win over metro areas and states
+KIND_RANK = {KIND_CITY: 3, KIND_NEIGHBORHOOD: 2, KIND_MSA: 1, KIND_POSTAL: 1, KIND_STATE: 0}
+
+# Bumped when the persisted index layout or contents change
+INDEX_FORMAT = 2
+
+# Prefixes up to this length get their best places precomputed, since they match too many keys to scan
+SHORT_PREFIX_LENGTH = 3
+SHORT_PREFIX_TOP = 200
+
+# Longer prefixes scan at most this many matches before ranking them
+MAX_SUGGEST_SCAN = 5000
+
+US_STATES = {
+    'al': 'alabama', 'ak': 'alaska', 'az': 'arizona', 'ar': 'arkansas', 'ca': 'california',
+    'co': 'colorado', 'ct': 'connecticut', 'de': 'delaware', 'dc': 'district of columbia',
+    'fl': 'florida', 'ga': 'georgia', 'hi': 'hawaii', 'id': 'idaho', 'il': 'illinois',
+    'in': 'indiana', 'ia': 'iowa', 'ks': 'kansas', 'ky': 'kentucky', 'la': 'louisiana',
+    'me': 'maine', 'md': 'maryland', 'ma': 'massachusetts', 'mi': 'michigan', 'mn': 'minnesota',
+    'ms': 'mississippi', 'mo': 'missouri', 'mt': 'montana', 'ne': 'nebraska', 'nv': 'nevada',
+    'nh': 'new hampshire', 'nj': 'new jersey', 'nm': 'new mexico', 'ny': 'new york',
+    'nc': 'north carolina', 'nd': 'north dakota', 'oh': 'ohio', 'ok': 'oklahoma', 'or': 'oregon',
+    'pa': 'pennsylvania', 'ri': 'rhode island', 'sc': 'south carolina', 'sd': 'south dakota',
+    'tn': 'tennessee', 'tx': 'texas', 'ut': 'utah', 'vt': 'vermont', 'va': 'virginia',
+    'wa': 'washington', 'wv': 'west virginia', 'wi': 'wisconsin', 'wy': 'wyoming', 'pr': 'puerto rico'
+}
+STATE_CODES = {name: code for code, name in US_STATES.items()}
+
+# Used only when the index cannot be built (e.g. BigQuery is unreachable at startup)
+SEED_PLACES = [
+    (KIND_CITY, 'Miami Beach', '', 'FL', 25.7907, -80.1300, 0),
+    (KIND_CITY, 'Miami', '', 'FL', 25.7617, -80.1918, 0),
+    (KIND_CITY, 'New York', '', 'NY', 40.7128, -74.0060, 0),
+    (KIND_CITY, 'Los Angeles', '', 'CA', 34.0522, -118.2437, 0),
+    (KIND_CITY, 'San Diego', '', 'CA', 32.7157, -117.1611, 0),
+    (KIND_CITY, 'Austin', '', 'TX', 30.2672, -97.7431, 0),
+    (KIND_CITY, 'Orlando', '', 'FL', 28.5383, -81.3792, 0),
+    (KIND_CITY, 'Nashville', '', 'TN', 36.1627, -86.7816, 0)
+]
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+_POSTAL = re.compile(r'^\d{5}$')
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace"""
+    return _NON_WORD.sub(' ', (text or '').lower().replace("'", '')).strip()
+
+
+def state_code(state: str) -> str:
+    """Two-letter code for a state given by code or full name ('' when unknown)"""
+    key = normalize(state)
+    if key in US_STATES:
+        return key
+    return STATE_CODES.get(key, '')
+
+
+def slug(text: str) -> str:
+    return normalize(text).replace(' ', '-')
+
+
+def sql_literal(value: str) -> str:
+    """Quote a value as a BigQuery string literal"""
+    return "'" + str(value).replace('\\', '\\\\').replace("'", "\\'") + "'"
+
+
+def location_id(kind: str, name: str, city: str = '', state: str = '') -> str:
+    """Canonical id such as city:fl:miami-beach, stable across index rebuilds"""
+    if kind == KIND_MSA:
+        return f"{KIND_MSA}:{slug(name)}"
+    region = state_code(state) or slug(state)
+    if kind == KIND_STATE:
+        return f"{KIND_STATE}:{state_code(name) or slug(name)}"
+    if kind == KIND_NEIGHBORHOOD:
+        return f"{kind}:{region}:{slug(city)}:{slug(name)}"
+    return f"{kind}:{region}:{slug(name)}"
+
+
+def centroid_query(table: str) -> str:
+    """Aggregate place centroids (and property counts) from the property table"""
+    located = f"FROM `{table}` WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL"
+    return f"""
+    SELECT '{KIND_CITY}' as kind, City as name, '' as city, State as state,
+        AVG(Latitude) as lat, AVG(Longitude) as lng, COUNT(*) as properties
+    {located} AND City IS NOT NULL
+    GROUP BY City, State
+    UNION ALL
+    SELECT '{KIND_NEIGHBORHOOD}', Neighborhood, City, State, AVG(Latitude), AVG(Longitude), COUNT(*)
+    {located} AND Neighborhood IS NOT NULL
+    GROUP BY Neighborhood, City, State
+    UNION ALL
+    SELECT '{KIND_MSA}', `Metropolitan Statistical Area`, '', '', AVG(Latitude), AVG(Longitude), COUNT(*)
+    {located} AND `Metropolitan Statistical Area` IS NOT NULL
+    GROUP BY `Metropolitan Statistical Area`
+    UNION ALL
+    SELECT '{KIND_POSTAL}', CAST(`Postal Code` AS STRING), ANY_VALUE(City), ANY_VALUE(State),
+        AVG(Latitude), AVG(Longitude), COUNT(*)
+    {located} AND `Postal Code` IS NOT NULL
+    GROUP BY CAST(`Postal Code` AS STRING)
+    UNION ALL
+    SELECT '{KIND_STATE}', State, '', State, AVG(Latitude), AVG(Longitude), COUNT(*)
+    {located} AND State IS NOT NULL
+    GROUP BY State
+    """
+
+
+class Place:
+    __slots__ = ('id', 'kind', 'name', 'city', 'state', 'lat', 'lng', 'properties', 'tokens')
+
+    def __init__(self, kind: str, name: str, city: str, state: str, lat: float, lng: float, properties: int):
+        self.kind = kind
+        self.name = name
+        self.city = city
+        self.state = state
+        self.lat = lat
+        self.lng = lng
+        self.properties = properties
+        self.tokens = tuple(normalize(name).split())
+        self.id = location_id(kind, name, city, state)
+
+    @property
+    def label(self) -> str:
+        parts = [self.name]
+        if self.city and self.city != self.name:
+            parts.append(self.city)
+        if self.state and self.kind != KIND_STATE:
+            parts.append(self.state)
+        return ', '.join(parts)
+
+    def filter_sql(self) -> str:
+        """Equality filter on the property table selecting this place"""
+        if self.kind == KIND_MSA:
+            return f"`Metropolitan Statistical Area` = {sql_literal(self.name)}"
+        if self.kind == KIND_STATE:
+            return f"State = {sql_literal(self.name)}"
+        if self.kind == KIND_POSTAL:
+            # Matches the zero-padded code whether the column is numeric or a string
+            return f"LPAD(SPLIT(CAST(`Postal Code` AS STRING), '.')[OFFSET(0)], 5, '0') = {sql_literal(self.name)}"
+        clauses = [f"State = {sql_literal(self.state)}"]
+        if self.kind == KIND_NEIGHBORHOOD:
+            clauses.insert(0, f"City = {sql_literal(self.city)}")
+            clauses.insert(0, f"Neighborhood = {sql_literal(self.name)}")
+        else:
+            clauses.insert(0, f"City = {sql_literal(self.name)}")
+        return ' AND '.join(clauses)
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'name': self.name,
+            'label': self.label,
+            'city': self.city or None,
+            'state': self.state or None,
+            'properties': self.properties,
+            'lat': self.lat,
+            'lng': self.lng
+        }
+
+
+class TokenTrie:
+    """Trie over index tokens for prefix completion and edit-distance lookups"""
+
+    def __init__(self):
+        self.root: dict = {}
+
+    def add(self, token: str):
+        node = self.root
+        for char in token:
+            node = node.setdefault(char, {})
+        node[''] = token
+
+    def with_prefix(self, prefix: str, limit: int = 20) -> List[str]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return []
+        found, stack = [], [node]
+        while stack and len(found) < limit:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == '':
+                    found.append(child)
+                else:
+                    stack.append(child)
+        return found
+
+    def within_distance(self, word: str, max_distance: int = 1) -> List[Tuple[str, int]]:
+        """Tokens within max_distance edits of word (Levenshtein rows carried down the trie)"""
+        matches = []
+        first_row = list(range(len(word) + 1))
+
+        def walk(node, char, previous_row):
+            row = [previous_row[0] + 1]
+            for i in range(1, len(word) + 1):
+                row.append(min(row[i - 1] + 1, previous_row[i] + 1,
+                               previous_row[i - 1] + (word[i - 1] != char)))
+            if row[-1] <= max_distance and '' in node:
+                matches.append((node[''], row[-1]))
+            if min(row) <= max_distance:
+                for next_char, child in node.items():
+                    if next_char:
+                        walk(child, next_char, row)
+
+        for char, child in self.root.items():
+            if char:
+                walk(child, char, first_row)
+        return sorted(matches, key=lambda match: match[1])
+
+
+class OfflineGeocoder:
+    """
+    Resolves free-text locations to the centroid of the best matching place.
+
+    The index is built once from the property table and persisted to
+    cache_path as JSON, so every worker (and every restart) loads it instead
+    of re-querying; a file lock keeps concurrent workers from building it
+    twice. Lookups never touch the network.
+    """
+
+    def __init__(self, cache_path: str, version: str = '', max_memo: int = 4096, retry_interval: float = 300.0):
+        self.cache_path = cache_path
+        self.version = version
+        self.max_memo = max_memo
+        self.retry_interval = retry_interval
+        self.loaded_at: Optional[float] = None
+        self.places: List[Place] = []
+        self.postal: Dict[str, Place] = {}
+        self.states: Dict[str, Place] = {}
+        self.token_index: Dict[str, Set[int]] = {}
+        self.trie = TokenTrie()
+        self.by_id: Dict[str, Place] = {}
+        self.suggest_keys: List[Tuple[str, int, int]] = []
+        self.prefix_top: Dict[str, List[Tuple[int, int]]] = {}
+        self.memo: "OrderedDict[str, Optional[Place]]" = OrderedDict()
+        self.source: Optional[str] = None
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    def _index(self, rows: Iterable, source: str):
+        places, postal, states, token_index, trie = [], {}, {}, {}, TokenTrie()
+        by_id, suggest_keys = {}, []
+        for kind, name, city, state, lat, lng, properties in rows:
+            if not name or lat is None or lng is None:
+                continue
+            name = str(name)
+            if kind == KIND_POSTAL:
+                # Numeric postal columns lose leading zeros and may carry a '.0'
+                name = normalize(name).split(' ')[0].zfill(5)
+                if not _POSTAL.match(name):
+                    continue
+            place = Place(kind, name, city or '', state or '', float(lat), float(lng), int(properties or 0))
+            place_id = len(places)
+            places.append(place)
+            by_id[place.id] = place
+            # Every word start is a key, so 'beach' suggests Miami Beach too
+            for position in range(len(place.tokens)):
+                suggest_keys.append((' '.join(place.tokens[position:]), position, place_id))
+            if kind == KIND_POSTAL:
+                postal[place.name] = place
+                continue
+            if kind == KIND_STATE:
+                code = state_code(place.name)
+                if code:
+                    states[code] = place
+                continue
+            for token in place.tokens:
+                if token not in token_index:
+                    token_index[token] = set()
+                    trie.add(token)
+                token_index[token].add(place_id)
+
+        prefix_top = self._rank_short_prefixes(suggest_keys, places)
+        with self.lock:
+            self.places, self.postal, self.states = places, postal, states
+            self.token_index, self.trie = token_index, trie
+            self.by_id, self.suggest_keys = by_id, sorted(suggest_keys)
+            self.prefix_top = prefix_top
+            self.memo.clear()
+            self.source = source
+        logger.info(f"Geocoder indexed {len(places) - len(postal)} places and {len(postal)} postal codes from {source}")
+
+    @staticmethod
+    def _suggest_rank(position: int, place: Place) -> Tuple[bool, int]:
+        # Names that start with the text come before mid-name word matches
+        return position > 0, -place.properties
+
+    def _rank_short_prefixes(self, suggest_keys: List[Tuple[str, int, int]],
+                             places: List[Place]) -> Dict[str, List[Tuple[int, int]]]:
+        """Best (place_id, position) pairs for every prefix of up to SHORT_PREFIX_LENGTH characters"""
+        best: Dict[str, Dict[int, int]] = {}
+        for key, position, place_id in suggest_keys:
+            for length in range(1, min(SHORT_PREFIX_LENGTH, len(key)) + 1):
+                matches = best.setdefault(key[:length], {})
+                matches[place_id] = min(position, matches.get(place_id, position))
+        return {
+            prefix: sorted(matches.items(),
+                           key=lambda item: self._suggest_rank(item[1], places[item[0]]))[:SHORT_PREFIX_TOP]
+            for prefix, matches in best.items()
+        }
+
+    def _load_file(self) -> bool:
+        try:
+            with open(self.cache_path) as f:
+                payload = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if payload.get('version') != self.version or payload.get('format') != INDEX_FORMAT:
+            return False
+        self._index(payload['places'], 'cache_file')
+        return True
+
+    def _write_file(self, rows: List[list]):
+        directory = os.path.dirname(self.cache_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=directory, delete=False, suffix='.tmp') as f:
+            json.dump({'version': self.version, 'format': INDEX_FORMAT, 'built_at': time.time(), 'places': rows}, f)
+        os.replace(f.name, self.cache_path)
+
+    def load(self, run_query: Callable[[], Iterable], rebuild: bool = False):
+        """
+        Load the index from the cache file, building it with run_query()
+        when the file is missing, from another dataset version, or rebuild
+        is set. Falls back to a few seed cities if the build fails.
+        """
+        self.loaded_at = time.monotonic()
+        if not rebuild and self._load_file():
+            return
+        lock_path = self.cache_path + '.lock'
+        try:
+            os.makedirs(os.path.dirname(lock_path) or '.', exist_ok=True)
+            with open(lock_path, 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                # Another worker may have finished the build while we waited
+                if not rebuild and self._load_file():
+                    return
+                rows = [
+                    [row['kind'], row['name'], row['city'], row['state'], row['lat'], row['lng'], row['properties']]
+                    for row in run_query()
+                    if row['name'] and row['lat'] is not None and row['lng'] is not None
+                ]
+                if not rows:
+                    raise ValueError('centroid query returned no places')
+                self._write_file(rows)
+                self._index(rows, 'bigquery')
+        except Exception as e:
+            logger.warning(f"Geocoder index build failed, using seed cities: {e}")
+            if not self.places:
+                self._index([list(place) for place in SEED_PLACES], 'seed')
+
+    def _needs_load(self, version: Optional[str] = None) -> bool:
+        if self.source is None or (version is not None and version != self.version):
+            return True
+        # Seed cities are a stopgap; retry the real build now and then
+        return self.source == 'seed' and time.monotonic() - self.loaded_at >= self.retry_interval
+
+    def ensure_loaded(self, run_query: Callable[[], Iterable], version: Optional[str] = None):
+        """Load the index on first use, and again when the dataset version moves on"""
+        if self._needs_load(version):
+            with self._load_lock:
+                if self._needs_load(version):
+                    if version is not None:
+                        self.version = version
+                    self.load(run_query)
+
+    def _detect_state(self, tokens: List[str]) -> str:
+        """State code from a trailing code ('fl') or name ('new york')"""
+        for size in (3, 2, 1):
+            if len(tokens) >= size:
+                tail = ' '.join(tokens[-size:])
+                code = tail if size == 1 and tail in US_STATES else STATE_CODES.get(tail, '')
+                if code:
+                    return code
+        return ''
+
+    @staticmethod
+    def _resolve_token(token: str, is_last: bool, token_index: Dict[str, Set[int]],
+                       trie: TokenTrie) -> Dict[str, int]:
+        """Index tokens a query token may stand for, with an edit penalty each"""
+        if token in token_index:
+            return {token: 0}
+        if len(token) >= 4:
+            fuzzy = trie.within_distance(token, 1 if len(token) < 8 else 2)
+            if fuzzy:
+                return {match: distance for match, distance in fuzzy[:5]}
+        if is_last and len(token) >= 3:
+            return {match: 1 for match in trie.with_prefix(token, 10)}
+        return {}
+
+    def _match(self, key: str) -> Optional[Place]:
+        # The index is swapped as a whole on rebuild, so read one consistent set of references
+        with self.lock:
+            places, postal, states = self.places, self.postal, self.states
+            token_index, trie = self.token_index, self.trie
+
+        tokens = key.split()
+        for token in tokens:
+            if _POSTAL.match(token) and token in postal:
+                return postal[token]
+
+        state = self._detect_state(tokens)
+        words = [token for token in tokens if not token.isdigit()]
+        resolved: Dict[str, int] = {}
+        for position, token in enumerate(words):
+            is_last = position == len(words) - 1
+            for match, penalty in self._resolve_token(token, is_last, token_index, trie).items():
+                resolved[match] = min(penalty, resolved.get(match, penalty))
+
+        candidates: Set[int] = set()
+        for token in resolved:
+            candidates |= token_index.get(token, set())
+
+        best, best_score = None, None
+        for place_id in candidates:
+            place = places[place_id]
+            matched = [token for token in place.tokens if token in resolved]
+            if not matched:
+                continue
+            state_ok = not state or state_code(place.state) == state
+            score = (
+                len(matched) == len(place.tokens),
+                state_ok,
+                len(matched),
+                -sum(resolved[token] for token in matched),
+                KIND_RANK[place.kind],
+                place.properties
+            )
+            if best_score is None or score > best_score:
+                best, best_score = place, score
+
+        if best is not None and best_score[0] and best_score[1]:
+            return best
+        if state and state in states:
+            return states[state]
+        return best if best is not None and best_score[0] else None
+
+    def lookup(self, text: str) -> Optional[Place]:
+        """Best matching place for a free-text location, or None"""
+        key = normalize(text)
+        if not key:
+            return None
+        with self.lock:
+            if key in self.memo:
+                self.memo.move_to_end(key)
+                return self.memo[key]
+        place = self._match(key)
+        with self.lock:
+            self.memo[key] = place
+            while len(self.memo) > self.max_memo:
+                self.memo.popitem(last=False)
+        return place
+
+    def place(self, place_id: str) -> Optional[Place]:
+        """Place for a canonical location id"""
+        with self.lock:
+            return self.by_id.get(place_id)
+
+    def suggest(self, text: str, limit: int = 10, kinds: Optional[Set[str]] = None) -> List[Place]:
+        """
+        Places whose name (or a word in it) starts with text, most properties first
+
+        Text after a comma narrows by state, e.g. 'portland, m'. Short
+        prefixes are served from precomputed rankings; longer ones rank the
+        first MAX_SUGGEST_SCAN alphabetical matches, which only drops places
+        for prefixes that match more keys than that.
+        """
+        name_part, _, state_part = (text or '').partition(',')
+        prefix, state_prefix = normalize(name_part), normalize(state_part)
+        if not prefix:
+            return []
+        with self.lock:
+            keys, places, prefix_top = self.suggest_keys, self.places, self.prefix_top
+
+        def wanted(place: Place) -> bool:
+            if kinds and place.kind not in kinds:
+                return False
+            return not state_prefix or (normalize(place.state).startswith(state_prefix)
+                                        or state_code(place.state).startswith(state_prefix))
+
+        scan_limit = MAX_SUGGEST_SCAN
+        if len(prefix) <= SHORT_PREFIX_LENGTH:
+            ranked = [places[place_id] for place_id, _ in prefix_top.get(prefix, []) if wanted(places[place_id])]
+            if len(ranked) >= limit or len(prefix_top.get(prefix, [])) < SHORT_PREFIX_TOP:
+                return ranked[:limit]
+            # Filters left too few of the precomputed places; rank every match instead
+            scan_limit = len(keys)
+
+        best: Dict[int, int] = {}
+        start = bisect_left(keys, (prefix,))
+        for key, position, place_id in keys[start:start + scan_limit]:
+            if not key.startswith(prefix):
+                break
+            if wanted(places[place_id]):
+                best[place_id] = min(position, best.get(place_id, position))
+
+        ranked_ids = sorted(best, key=lambda place_id: self._suggest_rank(best[place_id], places[place_id]))
+        return [places[place_id] for place_id in ranked_ids[:limit]]
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            'source': self.source,
+            'places': len(self.places) - len(self.postal),
+            'postal_codes': len(self.postal),
+            'states': len(self.states),
+            'tokens': len(self.token_index)
+        }
@@ -0,0 +1,86 @@
+"""
+HTTP conditional caching for Flask responses
+Adds strong ETags and per-route Cache-Control policies, and answers
+If-None-Match / If-Modified-Since with 304 Not Modified
+"""
+
+import hashlib
+from typing import Callable, Optional, Union
+
+from flask import Flask, current_app, request
+
+# The airdna snapshot only changes monthly, so data responses can be reused for a while
+SNAPSHOT_POLICY = 'public, max-age=3600, stale-while-revalidate=86400'
+PAGE_POLICY = 'public, max-age=300'
+REVALIDATE_POLICY = 'no-cache'
+NO_STORE_POLICY = 'no-store'
+
+
+def cache_policy(policy: str) -> Callable:
+    """
+    Attach a Cache-Control policy to a view
+
+    Place it below @app.route so the registered view carries the policy.
+    """
+    def decorator(view):
+        view.cache_policy = policy
+        return view
+    return decorator
+
+
+def body_etag(data: bytes, version: str = '') -> str:
+    return versioned_etag(hashlib.blake2b(data, digest_size=16).hexdigest(), version)
+
+
+def versioned_etag(digest: str, version: str = '') -> str:
+    return f"{version}-{digest}" if version else digest
+
+
+def resolve_version(version: Union[str, Callable[[], str]]) -> str:
+    """A version given as a string, or as a callable read on every response"""
+    return version() if callable(version) else version
+
+
+class ConditionalCaching:
+    """
+    after_request middleware for GET/HEAD responses.
+
+    Successful buffered responses get a strong ETag (body hash prefixed with
+    the dataset version) and a Cache-Control header from the view's policy,
+    falling back to PAGE_POLICY for HTML and default_policy for everything
+    else. Streamed and file responses are left untouched. version may be a
+    callable so ETags follow a dataset cutover without a restart.
+    """
+
+    def __init__(self, app: Optional[Flask] = None, version: Union[str, Callable[[], str]] = '',
+                 default_policy: str = REVALIDATE_POLICY, html_policy: str = PAGE_POLICY):
+        self.version = version
+        self.default_policy = default_policy
+        self.html_policy = html_policy
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.after_request(self.process_response)
+
+    def policy_for(self, response) -> str:
+        view = current_app.view_functions.get(request.endpoint)
+        policy = getattr(view, 'cache_policy', None)
+        if policy:
+            return policy
+        return self.html_policy if response.mimetype == 'text/html' else self.default_policy
+
+    def process_response(self, response):
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        if response.direct_passthrough or response.is_streamed:
+            return response
+
+        policy = self.policy_for(response)
+        response.headers.setdefault('Cache-Control', policy)
+        if policy == NO_STORE_POLICY:
+            return response
+
+        if not response.get_etag()[0]:
+            response.set_etag(body_etag(response.get_data(), resolve_version(self.version)))
+        return response.make_conditional(request)
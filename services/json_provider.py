@@ -0,0 +1,91 @@
+"""
+Fast JSON serialization for API responses and cache payloads
+Uses orjson when installed and natively handles dates, Decimal and
+NumPy scalars/arrays, with NaN/Infinity as null; falls back to the stdlib encoder otherwise
+"""
+
+import datetime
+import decimal
+import json
+import math
+from typing import Any
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def default(obj: Any) -> Any:
+    """Convert types the encoders do not handle natively"""
+    if isinstance(obj, decimal.Decimal):
+        return float(obj)
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (datetime.date, datetime.datetime, datetime.time)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def finite(obj: Any) -> Any:
+    """Replace NaN/Infinity floats with None, as orjson does, for the stdlib encoder"""
+    if isinstance(obj, float):
+        return obj if math.isfinite(obj) else None
+    if isinstance(obj, dict):
+        return {key: finite(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [finite(value) for value in obj]
+    return obj
+
+
+def finite_default(obj: Any) -> Any:
+    return finite(default(obj))
+
+
+def dumps_bytes(obj: Any, sort_keys: bool = False) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=default, option=option)
+    return json.dumps(finite(obj), default=finite_default, sort_keys=sort_keys, separators=(',', ':')).encode()
+
+
+def dumps(obj: Any, sort_keys: bool = False) -> str:
+    """Serialize to a JSON string (e.g. for Redis payloads)"""
+    return dumps_bytes(obj, sort_keys).decode()
+
+
+def loads(data) -> Any:
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson"""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs and set(kwargs) - {'sort_keys'}:
+            # Callers asking for stdlib-specific options (indent, cls, ...) get the stdlib encoder
+            kwargs.setdefault('default', finite_default)
+            return json.dumps(finite(obj), **kwargs)
+        return dumps(obj, kwargs.get('sort_keys', self.sort_keys))
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj, self.sort_keys), mimetype=self.mimetype)
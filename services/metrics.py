@@ -0,0 +1,152 @@
+"""
+Prometheus metrics for routes, cache, BigQuery, PDF and chart rendering
+Works under gunicorn when PROMETHEUS_MULTIPROC_DIR is set; without
+prometheus_client installed every metric is a no-op
+"""
+
+import os
+import time
+from typing import Optional, Tuple
+
+from flask import Flask, g, request
+
+try:
+    from prometheus_client import (
+        CollectorRegistry, Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest, multiprocess
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _NoopMetric:
+    """Stand-in accepting the metric calls used here when prometheus_client is missing"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+    def time(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __call__(self, func):
+        return func
+
+
+def _metric(cls_name: str, *args, **kwargs):
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return {'Counter': Counter, 'Gauge': Gauge, 'Histogram': Histogram}[cls_name](*args, **kwargs)
+
+
+REQUEST_LATENCY = _metric(
+    'Histogram', 'http_request_duration_seconds', 'Request latency by route',
+    ['method', 'endpoint', 'status']
+)
+CACHE_REQUESTS = _metric(
+    'Counter', 'cache_requests_total', 'Response cache lookups by key prefix',
+    ['prefix', 'result']
+)
+BIGQUERY_JOB_LATENCY = _metric(
+    'Histogram', 'bigquery_job_duration_seconds', 'BigQuery job duration (created to ended) by statement',
+    ['statement'], buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+)
+BIGQUERY_BYTES = _metric(
+    'Counter', 'bigquery_bytes_processed_total', 'BigQuery bytes processed by statement',
+    ['statement']
+)
+BIGQUERY_JOBS = _metric(
+    'Counter', 'bigquery_jobs_total', 'BigQuery jobs by statement and cache hit',
+    ['statement', 'cache_hit']
+)
+BROWSER_POOL_IDLE = _metric(
+    'Gauge', 'pdf_browser_pool_idle', 'Idle browsers in the PDF browser pool',
+    multiprocess_mode='livesum'
+)
+BROWSER_WAIT = _metric(
+    'Histogram', 'pdf_browser_wait_seconds', 'Time waiting for a pooled browser'
+)
+PDF_RENDER = _metric(
+    'Histogram', 'pdf_render_duration_seconds', 'End-to-end PDF generation time',
+    ['source'], buckets=(0.5, 1, 2, 3, 5, 8, 13, 20, 30, 60)
+)
+CHART_RENDER = _metric(
+    'Histogram', 'chart_render_duration_seconds', 'Server-side chart image render time',
+    ['kind']
+)
+
+
+def observe_cache(prefix: str, hit: bool):
+    CACHE_REQUESTS.labels(prefix=prefix, result='hit' if hit else 'miss').inc()
+
+
+def observe_bigquery_job(statement: str, query_job):
+    """Record stats of a finished query job"""
+    created = getattr(query_job, 'created', None)
+    ended = getattr(query_job, 'ended', None)
+    if created and ended:
+        BIGQUERY_JOB_LATENCY.labels(statement=statement).observe((ended - created).total_seconds())
+    BIGQUERY_BYTES.labels(statement=statement).inc(getattr(query_job, 'total_bytes_processed', None) or 0)
+    cache_hit = bool(getattr(query_job, 'cache_hit', False))
+    BIGQUERY_JOBS.labels(statement=statement, cache_hit=str(cache_hit).lower()).inc()
+
+
+def render() -> Tuple[bytes, str]:
+    """Exposition payload, aggregated across workers in multiprocess mode"""
+    if not PROMETHEUS_AVAILABLE:
+        return b'', CONTENT_TYPE_LATEST
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int):
+    """Gunicorn child_exit hook: drop a dead worker's live gauges"""
+    if PROMETHEUS_AVAILABLE and os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(pid)
+
+
+class RequestMetrics:
+    """Flask extension observing request latency per route endpoint"""
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+
+    def start(self):
+        g.metrics_start = time.perf_counter()
+
+    def finish(self, response):
+        start = g.get('metrics_start')
+        if start is not None:
+            REQUEST_LATENCY.labels(
+                method=request.method,
+                endpoint=request.endpoint or 'unmatched',
+                status=response.status_code
+            ).observe(time.perf_counter() - start)
+        return response
@@ -0,0 +1,166 @@
+"""
+Precomputed per-property monthly rollup
+A batch job materializes the monthly table with its YoY/MoM deltas, rolling
+averages and revenue gaps into a table clustered by Property ID
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from google.api_core.exceptions import NotFound
+
+logger = logging.getLogger(__name__)
+
+# Monthly columns under the names the property queries use
+BASE_COLUMNS = """`Reporting Month`,
+                `Revenue _USD_` as revenue,
+                `Revenue Potential _USD_` as revenue_potential,
+                `Occupancy Rate` as occupancy_rate,
+                `ADR _USD_` as adr,
+                `Number of Reservations` as reservations,
+                `Reservation Days` as reservation_days,
+                `Available Days` as available_days,
+                `Blocked Days` as blocked_days,
+                `Active Listing Nights` as active_nights,
+                `Cleaning Fee Total _USD_` as cleaning_fees,
+                Active as is_active,
+                `Scraped During Month` as was_scraped"""
+
+# Window expressions over one property's months; {w} is the window definition
+DERIVED_COLUMNS = """-- Year-over-year
+                LAG(revenue, 12) OVER ({w}) as revenue_yoy_prev,
+                LAG(occupancy_rate, 12) OVER ({w}) as occupancy_yoy_prev,
+                LAG(adr, 12) OVER ({w}) as adr_yoy_prev,
+                -- Month-over-month
+                LAG(revenue, 1) OVER ({w}) as revenue_mom_prev,
+                -- Rolling averages
+                AVG(revenue) OVER ({w} ROWS BETWEEN 2 PRECEDING AND CURRENT ROW) as revenue_3mo_avg,
+                AVG(revenue) OVER ({w} ROWS BETWEEN 11 PRECEDING AND CURRENT ROW) as revenue_12mo_avg,
+                AVG(occupancy_rate) OVER ({w} ROWS BETWEEN 11 PRECEDING AND CURRENT ROW) as occupancy_12mo_avg,
+                -- Revenue gap
+                (revenue_potential - revenue) as revenue_gap,
+                SAFE_DIVIDE(revenue, revenue_potential) as revenue_optimization_score"""
+
+
+def build_rollup_sql(source_table: str, rollup_table: str, version: str = '') -> str:
+    """CREATE OR REPLACE statement materializing the rollup from the monthly table"""
+    return f"""
+    CREATE OR REPLACE TABLE `{rollup_table}`
+    CLUSTER BY `Property ID`
+    OPTIONS (description = 'Per-property monthly rollup of {source_table} ({version})')
+    AS
+    WITH monthly_metrics AS (
+        SELECT
+            `Property ID`,
+            {BASE_COLUMNS}
+        FROM `{source_table}`
+    )
+    SELECT
+        *,
+        {DERIVED_COLUMNS.format(w='PARTITION BY `Property ID` ORDER BY `Reporting Month`')}
+    FROM monthly_metrics
+    """
+
+
+class MonthlyRollup:
+    """
+    The rollup table and how to read properties' months from it.
+
+    property_months_sql() and properties_months_sql() read the clustered rollup once it has been built
+    and otherwise computes the same columns from the monthly table, so
+    requests keep working before the first batch run.
+    """
+
+    def __init__(self, client, source_table: str, rollup_table: str,
+                 version: str = '', check_interval: float = 300.0):
+        self.client = client
+        self.source_table = source_table
+        self.rollup_table = rollup_table
+        self.version = version
+        self.check_interval = check_interval
+        self._table = None
+        self._checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def _describe(self):
+        """Fetch the rollup table's metadata, at most once per check_interval"""
+        with self._lock:
+            now = time.monotonic()
+            if self._checked_at is not None and now - self._checked_at < self.check_interval:
+                return self._table
+            try:
+                self._table = self.client.get_table(self.rollup_table)
+            except NotFound:
+                self._table = None
+            except Exception as e:
+                logger.warning(f"Could not check rollup table {self.rollup_table}: {e}")
+                self._table = None
+            self._checked_at = now
+            return self._table
+
+    def available(self) -> bool:
+        return self._describe() is not None
+
+    def build(self) -> int:
+        """Rebuild the rollup from the monthly table; returns the row count"""
+        start = time.perf_counter()
+        self.client.query(build_rollup_sql(self.source_table, self.rollup_table, self.version)).result()
+        with self._lock:
+            self._checked_at = None
+        table = self._describe()
+        num_rows = table.num_rows if table is not None else 0
+        logger.info(f"Built {self.rollup_table} ({num_rows} rows) in {time.perf_counter() - start:.1f}s")
+        return num_rows
+
+    def _months_sql(self, id_condition: str, months: Optional[int]) -> str:
+        month_filter = (
+            f"AND `Reporting Month` >= DATE_SUB(CURRENT_DATE(), INTERVAL {int(months)} MONTH)" if months else ''
+        )
+        if self.available():
+            return f"""
+            SELECT *
+            FROM `{self.rollup_table}`
+            WHERE `Property ID` {id_condition}
+                {month_filter}
+            """
+        return f"""
+            SELECT * FROM (
+                SELECT
+                    *,
+                    {DERIVED_COLUMNS.format(w='PARTITION BY `Property ID` ORDER BY `Reporting Month`')}
+                FROM (
+                    SELECT
+                        `Property ID`,
+                        {BASE_COLUMNS}
+                    FROM `{self.source_table}`
+                    WHERE `Property ID` {id_condition}
+                )
+            )
+            WHERE TRUE
+                {month_filter}
+            """
+
+    def property_months_sql(self, property_id: str, months: Optional[int] = None) -> str:
+        """
+        SELECT returning one property's months with base and derived columns
+
+        Deltas and rolling averages always cover the full history; months
+        limits only which rows are returned.
+        """
+        months_sql = self._months_sql(f"= '{property_id}'", months)
+        return f"SELECT * EXCEPT(`Property ID`) FROM ({months_sql})"
+
+    def properties_months_sql(self, ids_param: str = 'property_ids', months: Optional[int] = None) -> str:
+        """Like property_months_sql() for every id in the @ids_param array parameter, keeping Property ID"""
+        return self._months_sql(f"IN UNNEST(@{ids_param})", months)
+
+    def status(self) -> Dict[str, Any]:
+        table = self._describe()
+        return {
+            'table': self.rollup_table,
+            'available': table is not None,
+            'num_rows': table.num_rows if table is not None else None,
+            'built_at': table.modified.isoformat() if table is not None and table.modified else None
+        }
@@ -0,0 +1,187 @@
+"""
+Vectorized outlier detection for comparable property analysis
+Supports 2-sigma, IQR, MAD (modified z-score) and Mahalanobis modes
+operating on a (properties x metrics) NumPy matrix
+"""
+
+from typing import Dict, Any, Iterable, Optional, Sequence
+
+import numpy as np
+from scipy import stats
+
+# Metric columns checked by every detector, in matrix column order
+METRIC_FIELDS = ('revenue_ltm', 'occupancy_ltm', 'adr_ltm')
+METRIC_NAMES = ('revenue', 'occupancy', 'adr')
+METRIC_LABELS = ('annual_revenue', 'occupancy_rate', 'adr')
+
+# Need at least this many properties for meaningful outlier detection
+MIN_PROPERTIES = 3
+
+
+def metrics_matrix(data: Iterable[Dict[str, Any]], fields: Sequence[str] = METRIC_FIELDS) -> np.ndarray:
+    """Stack property metrics into a float matrix of shape (n_properties, n_metrics)"""
+    rows = [[prop.get(field) or 0 for field in fields] for prop in data]
+    return np.asarray(rows, dtype=np.float64).reshape(len(rows), len(fields))
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray) -> np.ndarray:
+    """Divide column-wise, returning 0 where the scale is 0 (constant metric)"""
+    denominator = np.broadcast_to(denominator, numerator.shape)
+    return np.divide(numerator, denominator, out=np.zeros_like(numerator), where=denominator > 0)
+
+
+def two_sigma_scores(X: np.ndarray, threshold: float):
+    """Absolute z-scores using the population standard deviation"""
+    scores = np.abs(_safe_divide(X - X.mean(axis=0), X.std(axis=0)))
+    overall = scores.max(axis=1)
+    return overall > threshold, scores, overall
+
+
+def iqr_scores(X: np.ndarray, threshold: float):
+    """Distance outside the Tukey fences, measured in IQR units"""
+    q1, q3 = np.percentile(X, [25, 75], axis=0)
+    iqr = q3 - q1
+    below = np.maximum(q1 - X, 0)
+    above = np.maximum(X - q3, 0)
+    scores = _safe_divide(np.maximum(below, above), iqr)
+    overall = scores.max(axis=1)
+    return overall > threshold, scores, overall
+
+
+def mad_scores(X: np.ndarray, threshold: float):
+    """Modified z-scores (Iglewicz & Hoaglin) based on the median absolute deviation"""
+    median = np.median(X, axis=0)
+    mad = np.median(np.abs(X - median), axis=0)
+    scores = np.abs(_safe_divide(0.6745 * (X - median), mad))
+    overall = scores.max(axis=1)
+    return overall > threshold, scores, overall
+
+
+def mahalanobis_critical_distance(n: int, k: int, quantile: float) -> float:
+    """
+    Critical Mahalanobis distance for a sample of n points in k dimensions
+
+    With the sample mean and covariance, n * D^2 / (n - 1)^2 follows
+    Beta(k / 2, (n - k - 1) / 2), which unlike the chi-square approximation
+    can be exceeded by small comp sets. It is undefined for n <= k + 1,
+    where every point lies at the same distance (see applicable_method).
+    """
+    if n <= k + 1:
+        raise ValueError(f"Mahalanobis distances need more than {k + 1} points in {k} dimensions")
+    beta = stats.beta.ppf(quantile, k / 2, (n - k - 1) / 2)
+    return float(np.sqrt((n - 1) ** 2 / n * beta))
+
+
+def mahalanobis_scores(X: np.ndarray, threshold: float):
+    """Multivariate Mahalanobis distance using the pseudo-inverse covariance"""
+    n, k = X.shape
+    centered = X - X.mean(axis=0)
+    covariance = np.atleast_2d(np.cov(X, rowvar=False))
+    inverse = np.linalg.pinv(covariance)
+    distances = np.sqrt(np.maximum(np.einsum('ij,jk,ik->i', centered, inverse, centered), 0))
+    # Per-metric z-scores are reported alongside the joint distance for context
+    scores = np.abs(_safe_divide(centered, X.std(axis=0)))
+    return distances > mahalanobis_critical_distance(n, k, threshold), scores, distances
+
+
+OUTLIER_METHODS = {
+    '2_sigma': {
+        'detector': two_sigma_scores,
+        'threshold': 2.0,
+        'score_label': 'zscore',
+        'description': 'Z-score'
+    },
+    'iqr': {
+        'detector': iqr_scores,
+        'threshold': 1.5,
+        'score_label': 'iqr_distance',
+        'description': 'IQR distance'
+    },
+    'mad': {
+        'detector': mad_scores,
+        'threshold': 3.5,
+        'score_label': 'modified_zscore',
+        'description': 'Modified Z-score'
+    },
+    'mahalanobis': {
+        'detector': mahalanobis_scores,
+        'threshold': 0.975,  # Quantile of the sampling distribution
+        'score_label': 'zscore',
+        'description': 'Mahalanobis distance'
+    }
+}
+
+# analysis_type values accepted by /api/analyze_comparables
+ANALYSIS_TYPE_METHODS = {
+    'standard': '2_sigma',
+    'iqr': 'iqr',
+    'robust': 'mad',
+    'mad': 'mad',
+    'multivariate': 'mahalanobis',
+    'mahalanobis': 'mahalanobis'
+}
+
+
+# Used instead of Mahalanobis when there are too few comps for a covariance to separate them
+MAHALANOBIS_FALLBACK = 'mad'
+
+
+# Every analysis_type the API accepts: named analyses plus raw method names
+ANALYSIS_TYPES = sorted(set(ANALYSIS_TYPE_METHODS) | set(OUTLIER_METHODS))
+
+
+def resolve_method(analysis_type: Optional[str]) -> str:
+    """Map an analysis_type (or a raw method name) to an outlier method"""
+    if analysis_type in OUTLIER_METHODS:
+        return analysis_type
+    return ANALYSIS_TYPE_METHODS.get(analysis_type or 'standard', '2_sigma')
+
+
+def applicable_method(method: str, n: int, k: int = len(METRIC_FIELDS)) -> str:
+    """
+    The method to run for n properties with k metrics
+
+    With n <= k + 1 the sample covariance fits the points exactly: each one
+    lies at Mahalanobis distance (n - 1) / sqrt(n), so nothing could be
+    flagged and MAHALANOBIS_FALLBACK is used instead.
+    """
+    if method == 'mahalanobis' and n <= k + 1:
+        return MAHALANOBIS_FALLBACK
+    return method
+
+
+def describe_method(method: str) -> Dict[str, Any]:
+    """Outlier method metadata for API responses"""
+    config = OUTLIER_METHODS[method]
+    return {
+        'method': method,
+        'threshold': round(config['threshold'], 3),
+        'metrics_checked': list(METRIC_LABELS)
+    }
+
+
+def detect_outliers(X: np.ndarray, method: str = '2_sigma', threshold: Optional[float] = None):
+    """
+    Run an outlier detector over a metrics matrix
+
+    Mahalanobis runs as MAHALANOBIS_FALLBACK on too few rows (see
+    applicable_method); callers labelling results should resolve it first.
+
+    Args:
+        X: Array of shape (n_properties, n_metrics)
+        method: Key of OUTLIER_METHODS
+        threshold: Override for the method's default threshold
+
+    Returns:
+        Tuple of (outlier mask, per-metric scores, overall score)
+    """
+    if method not in OUTLIER_METHODS:
+        raise ValueError(f"Unknown outlier method: {method}")
+
+    method = applicable_method(method, *X.shape)
+    config = OUTLIER_METHODS[method]
+    if X.shape[0] < MIN_PROPERTIES:
+        n = X.shape[0]
+        return np.zeros(n, dtype=bool), np.zeros_like(X), np.zeros(n)
+
+    return config['detector'](X, config['threshold'] if threshold is None else threshold)
@@ -0,0 +1,107 @@
+"""
+Keyset pagination for ranked property searches
+Cursors are opaque URL-safe tokens holding the sort key of the last row
+returned, bound to the query they were issued for
+"""
+
+import base64
+import bisect
+import binascii
+import json
+import re
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+
+CURSOR_QUERY_PREFIX = 12
+PROPERTY_ID_PATTERN = re.compile(r'^[A-Za-z0-9_\-:.]+$')
+
+SortKey = Tuple[float, str]
+
+
+class PaginationError(ValueError):
+    """Raised for invalid pagination parameters"""
+
+
+class InvalidCursorError(PaginationError):
+    """Raised for cursors that are malformed or belong to a different query"""
+
+
+def parse_page_size(value: Any, max_page_size: int) -> int:
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('page_size must be an integer')
+    if page_size < 1 or page_size > max_page_size:
+        raise PaginationError(f"page_size must be between 1 and {max_page_size}")
+    return page_size
+
+
+def encode_cursor(query_key: str, sort_key: SortKey) -> str:
+    payload = json.dumps({'q': query_key[:CURSOR_QUERY_PREFIX], 'k': list(sort_key)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str, query_key: str) -> SortKey:
+    """
+    Decode a cursor issued for query_key
+
+    Returns:
+        Tuple of (sort value, property id) of the last row already returned
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        value, property_id = payload['k']
+        query_prefix = payload['q']
+    except (ValueError, TypeError, KeyError, binascii.Error):
+        raise InvalidCursorError('Malformed pagination cursor')
+
+    if query_prefix != query_key[:CURSOR_QUERY_PREFIX]:
+        raise InvalidCursorError('Cursor was issued for a different search')
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise InvalidCursorError('Malformed pagination cursor')
+    if not isinstance(property_id, str) or not PROPERTY_ID_PATTERN.match(property_id):
+        raise InvalidCursorError('Malformed pagination cursor')
+    return float(value), property_id
+
+
+def sort_keys(table: pa.Table, sort_column: str) -> List[List[Any]]:
+    """(sort value, property id) pairs for each row, using the unrounded sort column"""
+    values = table.column(sort_column).to_pylist()
+    property_ids = table.column('Property ID').to_pylist()
+    return [[value, property_id] for value, property_id in zip(values, property_ids)]
+
+
+def _order_key(key: Sequence[Any], descending: bool):
+    value, property_id = key
+    return (-value if descending else value, property_id)
+
+
+def page_start(keys: Sequence[Sequence[Any]], after: Optional[SortKey], descending: bool) -> int:
+    """Index of the first row strictly after the cursor in a ranked key list"""
+    if after is None:
+        return 0
+    ordered = [_order_key(key, descending) for key in keys]
+    return bisect.bisect_right(ordered, _order_key(after, descending))
+
+
+def keyset_clause(alias: str, sort_column: str, after: Optional[SortKey], descending: bool) -> str:
+    """SQL predicate selecting rows after the cursor, ties broken by Property ID"""
+    if after is None:
+        return ''
+    value, property_id = after
+    operator = '<' if descending else '>'
+    return (
+        f"AND ({alias}.{sort_column} {operator} {value!r} "
+        f"OR ({alias}.{sort_column} = {value!r} AND {alias}.`Property ID` > '{property_id}'))"
+    )
+
+
+def pagination_info(page_size: int, last_key: Optional[Sequence[Any]], has_more: bool,
+                    query_key: str) -> Dict[str, Any]:
+    return {
+        'page_size': page_size,
+        'has_more': has_more,
+        'next_cursor': encode_cursor(query_key, tuple(last_key)) if has_more and last_key else None
+    }
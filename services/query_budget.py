@@ -0,0 +1,133 @@
+"""
+Per-statement BigQuery byte budgets
+Every job carries maximum_bytes_billed for its statement, and unusual
+searches can be dry-run first so over-budget queries never start
+"""
+
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from google.cloud import bigquery
+
+from services.timing import span
+
+logger = logging.getLogger(__name__)
+
+BYTES_LIMIT_REASON = 'bytesBilledLimitExceeded'
+
+
+class QueryBudgetExceeded(Exception):
+    """A query would scan (or did scan) more bytes than its statement allows"""
+
+    def __init__(self, statement: str, limit_bytes: int, estimated_bytes: Optional[int] = None):
+        self.statement = statement
+        self.limit_bytes = limit_bytes
+        self.estimated_bytes = estimated_bytes
+        if estimated_bytes is not None:
+            message = f"Query for {statement} would scan ~{estimated_bytes / 1e9:.2f} GB"
+        else:
+            message = f"Query for {statement} exceeded its byte limit"
+        super().__init__(f"{message} (limit {limit_bytes / 1e9:.2f} GB); narrow the location, radius or limit")
+
+    @property
+    def details(self) -> Dict[str, Optional[int]]:
+        return {
+            'statement': self.statement,
+            'limit_bytes': self.limit_bytes,
+            'estimated_bytes': self.estimated_bytes
+        }
+
+
+def parse_limits(spec: str) -> Dict[str, int]:
+    """Parse 'nearby=5e9,top_revenue=2000000000' into per-statement byte limits"""
+    limits = {}
+    for item in spec.split(','):
+        if '=' not in item:
+            continue
+        statement, value = item.split('=', 1)
+        limits[statement.strip()] = int(float(value))
+    return limits
+
+
+def is_bytes_limit_error(error: Exception) -> bool:
+    """True for the BadRequest BigQuery raises when maximum_bytes_billed is exceeded"""
+    reasons = [err.get('reason') for err in getattr(error, 'errors', None) or [] if isinstance(err, dict)]
+    return BYTES_LIMIT_REASON in reasons or 'limit for bytes billed' in str(error)
+
+
+class QueryBudget:
+    """
+    Byte limits per statement name.
+
+    job_config() caps each job with maximum_bytes_billed (limits of 0 or
+    less disable the cap); check() dry-runs a query and rejects it before it
+    starts when the estimate is over the limit.
+    """
+
+    def __init__(self, default_limit: int, limits: Optional[Dict[str, int]] = None, dry_run: bool = True):
+        self.default_limit = default_limit
+        self.limits = limits or {}
+        self.dry_run = dry_run
+        self.rejections: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def limit_for(self, statement: str) -> int:
+        return self.limits.get(statement, self.default_limit)
+
+    def job_config(self, statement: str) -> Optional[bigquery.QueryJobConfig]:
+        limit = self.limit_for(statement)
+        if limit <= 0:
+            return None
+        return bigquery.QueryJobConfig(maximum_bytes_billed=limit)
+
+    def _reject(self, statement: str, estimated_bytes: Optional[int] = None) -> QueryBudgetExceeded:
+        with self._lock:
+            self.rejections[statement] = self.rejections.get(statement, 0) + 1
+        error = QueryBudgetExceeded(statement, self.limit_for(statement), estimated_bytes)
+        logger.warning(str(error))
+        return error
+
+    def check(self, client, query: str, statement: str) -> Optional[int]:
+        """
+        Dry-run a query and raise QueryBudgetExceeded if it is over budget
+
+        Returns the estimated bytes, or None when the guard is off or the
+        dry run itself failed (the job's maximum_bytes_billed still applies).
+        """
+        limit = self.limit_for(statement)
+        if not self.dry_run or limit <= 0:
+            return None
+        try:
+            with span('bq_dry_run'):
+                job = client.query(query, job_config=bigquery.QueryJobConfig(dry_run=True, use_query_cache=False))
+            estimated = job.total_bytes_processed or 0
+        except Exception as e:
+            logger.warning(f"Dry run for {statement} failed, relying on maximum_bytes_billed: {e}")
+            return None
+        if estimated > limit:
+            raise self._reject(statement, estimated)
+        return estimated
+
+    @contextmanager
+    def enforced(self, statement: str):
+        """Turn BigQuery's bytes-billed limit error into QueryBudgetExceeded"""
+        try:
+            yield
+        except QueryBudgetExceeded:
+            raise
+        except Exception as e:
+            if is_bytes_limit_error(e):
+                raise self._reject(statement) from e
+            raise
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            rejections = dict(self.rejections)
+        return {
+            'default_limit_bytes': self.default_limit,
+            'statement_limits': self.limits,
+            'dry_run_guard': self.dry_run,
+            'rejections': rejections
+        }
@@ -0,0 +1,141 @@
+"""
+BigQuery cost and latency ledger
+Every finished query job is recorded with its statement name, bytes,
+slot time, cache hit and wall time; slow jobs also go to a slow-query log
+"""
+
+import json
+import logging
+import threading
+import time
+import weakref
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# SQL kept with slow-query records is cut to this length
+MAX_SLOW_SQL_CHARS = 2000
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+class QueryLedger:
+    """
+    Rolling in-process record of BigQuery jobs.
+
+    Keeps the last max_records jobs (and the last max_slow jobs slower than
+    slow_query_ms) in memory; when log_path is set every record is also
+    appended to it as a JSON line.
+    """
+
+    def __init__(self, max_records: int = 1000, slow_query_ms: float = 2000,
+                 max_slow: int = 50, log_path: Optional[str] = None):
+        self.slow_query_ms = slow_query_ms
+        self.log_path = log_path
+        self.records: deque = deque(maxlen=max_records)
+        self.slow: deque = deque(maxlen=max_slow)
+        self.total_jobs = 0
+        self._submitted: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def submitted(self, query_job):
+        """Mark when a job was submitted so its wall time covers submission to completion"""
+        try:
+            self._submitted[query_job] = time.perf_counter()
+        except TypeError:
+            pass
+
+    def record(self, query_job, statement: Optional[str]) -> Dict[str, Any]:
+        """Record a finished query job under its statement name"""
+        submitted_at = self._submitted.pop(query_job, None)
+        wall_ms = (time.perf_counter() - submitted_at) * 1000 if submitted_at is not None else None
+
+        created = getattr(query_job, 'created', None)
+        ended = getattr(query_job, 'ended', None)
+        entry = {
+            'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'statement': statement or 'query',
+            'job_id': getattr(query_job, 'job_id', None),
+            'bytes_processed': getattr(query_job, 'total_bytes_processed', None) or 0,
+            'bytes_billed': getattr(query_job, 'total_bytes_billed', None) or 0,
+            'slot_ms': getattr(query_job, 'slot_millis', None) or 0,
+            'cache_hit': bool(getattr(query_job, 'cache_hit', False)),
+            'wall_ms': round(wall_ms, 1) if wall_ms is not None else None,
+            'bigquery_ms': round((ended - created).total_seconds() * 1000, 1) if created and ended else None
+        }
+
+        is_slow = (entry['wall_ms'] or entry['bigquery_ms'] or 0) >= self.slow_query_ms
+        with self._lock:
+            self.records.append(entry)
+            self.total_jobs += 1
+            if is_slow:
+                sql = getattr(query_job, 'query', None)
+                self.slow.append({**entry, 'sql': sql[:MAX_SLOW_SQL_CHARS] if isinstance(sql, str) else None})
+            if self.log_path:
+                self._append_log(entry)
+
+        if is_slow:
+            logger.warning(
+                f"Slow BigQuery job {entry['job_id']} ({entry['statement']}): "
+                f"{entry['wall_ms'] or entry['bigquery_ms']}ms, {entry['bytes_billed']} bytes billed"
+            )
+        return entry
+
+    def _append_log(self, entry: Dict[str, Any]):
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+        except OSError as e:
+            logger.warning(f"Could not write query log {self.log_path}: {e}")
+
+    def summary(self, recent: int = 0) -> Dict[str, Any]:
+        """Per-statement totals over the rolling window, most bytes billed first"""
+        with self._lock:
+            records = list(self.records)
+            slow = list(self.slow)
+            total_jobs = self.total_jobs
+
+        by_statement: Dict[str, Dict[str, Any]] = {}
+        for entry in records:
+            stats = by_statement.setdefault(entry['statement'], {
+                'jobs': 0, 'cache_hits': 0, 'bytes_processed': 0, 'bytes_billed': 0, 'slot_ms': 0, 'wall_ms': []
+            })
+            stats['jobs'] += 1
+            stats['cache_hits'] += entry['cache_hit']
+            stats['bytes_processed'] += entry['bytes_processed']
+            stats['bytes_billed'] += entry['bytes_billed']
+            stats['slot_ms'] += entry['slot_ms']
+            if entry['wall_ms'] is not None:
+                stats['wall_ms'].append(entry['wall_ms'])
+
+        statements = {}
+        for name, stats in by_statement.items():
+            wall = stats.pop('wall_ms')
+            statements[name] = {
+                **stats,
+                'cache_hit_rate': round(stats['cache_hits'] / stats['jobs'], 3),
+                'wall_ms_avg': round(sum(wall) / len(wall), 1) if wall else None,
+                'wall_ms_p50': _percentile(wall, 0.5),
+                'wall_ms_p95': _percentile(wall, 0.95),
+                'wall_ms_max': max(wall) if wall else None
+            }
+
+        summary = {
+            'jobs_recorded': total_jobs,
+            'window_size': len(records),
+            'bytes_billed': sum(stats['bytes_billed'] for stats in statements.values()),
+            'slow_query_ms': self.slow_query_ms,
+            'statements': dict(sorted(statements.items(), key=lambda item: item[1]['bytes_billed'], reverse=True)),
+            'slow_queries': slow[::-1]
+        }
+        if recent:
+            summary['recent'] = records[-recent:][::-1]
+        return summary
@@ -0,0 +1,219 @@
+"""
+Columnar formatting of BigQuery results into API records
+Coercions, rounding and null-defaulting run as vectorized Arrow compute
+kernels over whole columns; records are then emitted in a single pass
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from services.timing import timed
+
+
+def _column(table: pa.Table, name: str) -> pa.ChunkedArray:
+    return table.column(name)
+
+
+def _as_float(values) -> pa.ChunkedArray:
+    return pc.cast(values, pa.float64(), safe=False)
+
+
+def _as_int(values) -> pa.ChunkedArray:
+    """Truncate to int64 like int(); tolerates numeric strings"""
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        values = _as_float(values)
+    return pc.cast(values, pa.int64(), safe=False)
+
+
+def _truthy(values) -> pa.ChunkedArray:
+    """Vectorized bool(x): False for null, 0 and empty strings"""
+    if pa.types.is_string(values.type) or pa.types.is_large_string(values.type):
+        present = pc.not_equal(values, '')
+    elif pa.types.is_boolean(values.type):
+        present = values
+    else:
+        present = pc.not_equal(_as_float(values), 0)
+    return pc.fill_null(present, False)
+
+
+def _or_default(values, converted, default_value):
+    """x if x else default, with the conversion applied to the kept values"""
+    return pc.if_else(_truthy(values), converted, pa.scalar(default_value, type=converted.type))
+
+
+def _or_none(values, converted):
+    return pc.if_else(_truthy(values), converted, pa.scalar(None, type=converted.type))
+
+
+LISTING_SECTIONS = ('location', 'details', 'metrics')
+
+
+@timed('format_rows')
+def format_listing_table(table: pa.Table, with_rank: bool = False, start_rank: int = 1,
+                         sections: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Format property listing rows (nearby / top-revenue searches)
+
+    Produces the same record shape as the per-row formatter it replaces.
+    start_rank offsets the rank when formatting a later batch of a result.
+    sections limits the nested location/details/metrics blocks (default: all);
+    only the columns of the requested sections need to be present.
+    """
+    if table.num_rows == 0:
+        return []
+
+    sections = set(LISTING_SECTIONS if sections is None else sections)
+
+    titles = _column(table, 'Listing Title')
+    bedrooms = _column(table, 'Bedrooms')
+    cities = _column(table, 'City')
+    fallback_titles = pc.binary_join_element_wise(
+        pc.fill_null(pc.cast(bedrooms, pa.string()), 'None'),
+        'BR in ',
+        pc.fill_null(cities, 'None'),
+        ''
+    )
+
+    columns = {
+        'property_id': _column(table, 'Property ID'),
+        'title': pc.if_else(_truthy(titles), titles, fallback_titles)
+    }
+
+    has_distance = 'location' in sections and 'distance_miles' in table.column_names
+    if 'location' in sections:
+        columns.update({
+            'city': cities,
+            'state': _column(table, 'State'),
+            'lat': _column(table, 'Latitude'),
+            'lng': _column(table, 'Longitude')
+        })
+        if has_distance:
+            columns['distance_miles'] = pc.round(_as_float(_column(table, 'distance_miles')), 1)
+
+    if 'details' in sections:
+        rating = _column(table, 'rating')
+        review_count = _column(table, 'review_count')
+        columns.update({
+            'bedrooms': bedrooms,
+            'property_type': _column(table, 'Property Type'),
+            'has_license': _truthy(_column(table, 'License')),
+            'is_superhost': _column(table, 'is_superhost'),
+            'rating': _or_none(rating, _as_float(rating)),
+            'review_count': _or_default(review_count, _as_int(review_count), 0),
+            'has_pool': _column(table, 'has_pool'),
+            'has_hot_tub': _column(table, 'has_hot_tub'),
+            'main_image_url': _column(table, 'main_image_url')
+        })
+
+    if 'metrics' in sections:
+        occupancy = _column(table, 'occupancy_rate')
+        adr = _column(table, 'adr')
+        columns.update({
+            'revenue_annual': _as_int(_column(table, 'revenue_annual')),
+            'occupancy_rate': _or_default(occupancy, pc.round(pc.multiply(_as_float(occupancy), 100), 1), 0.0),
+            'adr': _or_default(adr, _as_int(adr), 0),
+            'performance_tier': _column(table, 'performance_tier')
+        })
+
+    # Materialize each column once, then build records in one pass
+    values = {name: column.to_pylist() for name, column in columns.items()}
+    names = list(values)
+
+    properties = []
+    for i, row in enumerate(zip(*(values[name] for name in names))):
+        r = dict(zip(names, row))
+        record = {
+            'property_id': r['property_id'],
+            'title': r['title']
+        }
+        if 'location' in sections:
+            record['location'] = {
+                'city': r['city'],
+                'state': r['state'],
+                'lat': r['lat'],
+                'lng': r['lng']
+            }
+            if has_distance:
+                record['location']['distance_miles'] = r['distance_miles']
+        if 'details' in sections:
+            record['details'] = {
+                'bedrooms': r['bedrooms'],
+                'property_type': r['property_type'],
+                'has_license': r['has_license'],
+                'is_superhost': r['is_superhost'],
+                'rating': r['rating'],
+                'review_count': r['review_count'],
+                'has_pool': r['has_pool'],
+                'has_hot_tub': r['has_hot_tub'],
+                'main_image_url': r['main_image_url']
+            }
+        if 'metrics' in sections:
+            record['metrics'] = {
+                'revenue_annual': r['revenue_annual'],
+                'occupancy_rate': r['occupancy_rate'],
+                'adr': r['adr'],
+                'performance_tier': r['performance_tier']
+            }
+        if with_rank:
+            record = {'rank': start_rank + i, **record}
+        properties.append(record)
+
+    return properties
+
+
+# Field spec entries: (output name, source column, kind)
+# kinds: 'float' / 'int' -> x if x else 0, 'date' -> YYYY-MM-DD or None, 'raw' -> unchanged
+MONTHLY_RECORD_SPEC: Sequence[Tuple[str, str, str]] = (
+    ('month', 'month', 'date'),
+    ('revenue', 'revenue', 'float'),
+    ('revenue_potential', 'revenue_potential', 'float'),
+    ('occupancy_rate', 'occupancy_rate', 'float'),
+    ('adr', 'adr', 'float'),
+    ('reservations', 'reservations', 'int'),
+    ('reservation_days', 'reservation_days', 'int'),
+    ('available_days', 'available_days', 'int'),
+    ('blocked_days', 'blocked_days', 'int'),
+    ('active_nights', 'active_nights', 'int'),
+    ('cleaning_fees', 'cleaning_fees', 'float'),
+    ('active', 'active', 'raw'),
+    ('scraped', 'scraped', 'raw')
+)
+
+SEASONAL_RECORD_SPEC: Sequence[Tuple[str, str, str]] = (
+    ('month_num', 'month_num', 'raw'),
+    ('month_name', 'month_name', 'raw'),
+    ('avg_revenue', 'avg_revenue', 'float'),
+    ('avg_occupancy', 'avg_occupancy', 'float'),
+    ('avg_adr', 'avg_adr', 'float'),
+    ('years_of_data', 'years_of_data', 'raw')
+)
+
+
+def _format_column(values, kind: str):
+    if kind == 'float':
+        return _or_default(values, _as_float(values), 0.0)
+    if kind == 'int':
+        return _or_default(values, _as_int(values), 0)
+    if kind == 'date':
+        return pc.cast(values, pa.string())
+    return values
+
+
+@timed('format_rows')
+def format_records(records: Optional[Sequence[Dict[str, Any]]], spec: Sequence[Tuple[str, str, str]]) -> List[Dict[str, Any]]:
+    """Format a list of nested STRUCT records (e.g. ARRAY_AGG output) column-wise"""
+    if not records:
+        return []
+
+    table = pa.Table.from_pylist([dict(record) for record in records])
+    columns = []
+    for output_name, source, kind in spec:
+        if source in table.column_names:
+            columns.append((output_name, _format_column(table.column(source), kind).to_pylist()))
+        else:
+            columns.append((output_name, [None] * table.num_rows))
+
+    names = [name for name, _ in columns]
+    return [dict(zip(names, row)) for row in zip(*(values for _, values in columns))]
@@ -0,0 +1,124 @@
+"""
+In-memory registry for the file-backed HTML pages
+Each file is read once, kept in memory with its ETag and mtime, and
+re-read only when a periodic mtime check shows it changed on disk
+"""
+
+import datetime
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Union
+
+from flask import Flask, current_app
+
+from services.http_caching import body_etag, resolve_version, versioned_etag
+
+logger = logging.getLogger(__name__)
+
+
+class StaticFile:
+    __slots__ = ('path', 'data', 'digest', 'mtime', 'checked_at', 'encoded')
+
+    def __init__(self, path: str, data: Optional[bytes], digest: Optional[str],
+                 mtime: Optional[float], checked_at: float):
+        self.path = path
+        self.data = data
+        self.digest = digest  # Body hash; the ETag prefixes the current version
+        self.mtime = mtime
+        self.checked_at = checked_at
+        self.encoded: Dict[str, bytes] = {}  # Precompressed bodies by Content-Encoding
+
+    @property
+    def last_modified(self) -> datetime.datetime:
+        return datetime.datetime.fromtimestamp(self.mtime, tz=datetime.timezone.utc)
+
+
+class StaticPageRegistry:
+    """
+    Maps routes to HTML files served from memory.
+
+    Files are stat'ed at most once per revalidate_interval seconds (use 0 in
+    debug mode to pick up every edit). on_load(data) is called whenever a
+    file is (re)loaded and may return precompressed bodies by encoding,
+    which live on the file's entry and are handed to the response. version
+    may be a callable, read for every response's ETag.
+    """
+
+    def __init__(self, base_dir: str, version: Union[str, Callable[[], str]] = '', revalidate_interval: float = 5.0,
+                 on_load: Optional[Callable[[bytes], Optional[Dict[str, bytes]]]] = None):
+        self.base_dir = base_dir
+        self.version = version
+        self.revalidate_interval = revalidate_interval
+        self.on_load = on_load
+        self.files: Dict[str, StaticFile] = {}
+        self.routes: Dict[str, List[str]] = {}
+        self.lock = threading.Lock()
+
+    def _load(self, path: str) -> Optional[StaticFile]:
+        now = time.monotonic()
+        entry = self.files.get(path)
+        if entry and now - entry.checked_at < self.revalidate_interval:
+            return entry if entry.data is not None else None
+
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            self.files[path] = StaticFile(path, None, None, None, now)
+            return None
+
+        if entry and entry.data is not None and entry.mtime == mtime:
+            entry.checked_at = now
+            return entry
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        entry = StaticFile(path, data, body_etag(data), mtime, now)
+        self.files[path] = entry
+        if self.on_load:
+            entry.encoded = self.on_load(data) or {}
+        logger.info(f"Loaded static page {os.path.basename(path)} ({len(data)} bytes)")
+        return entry
+
+    def load(self, path: str) -> Optional[StaticFile]:
+        with self.lock:
+            return self._load(path)
+
+    def first_available(self, paths: Sequence[str]) -> Optional[StaticFile]:
+        for path in paths:
+            page = self.load(path)
+            if page is not None:
+                return page
+        return None
+
+    def register(self, app: Flask, rule: str, endpoint: str, filenames: Sequence[str],
+                 missing_message: str = 'Page not found', policy: Optional[str] = None):
+        """
+        Serve the first existing file of filenames (relative to base_dir) at rule
+
+        Later filenames act as fallbacks when earlier ones do not exist.
+        """
+        paths = [os.path.join(self.base_dir, filename) for filename in filenames]
+
+        def view():
+            page = self.first_available(paths)
+            if page is None:
+                return missing_message, 404
+            response = current_app.response_class(page.data, mimetype='text/html')
+            response.set_etag(versioned_etag(page.digest, resolve_version(self.version)))
+            response.last_modified = page.last_modified
+            response.precompressed = page.encoded
+            return response
+
+        view.__name__ = endpoint
+        view.__doc__ = f"Serve {filenames[0]} from memory"
+        if policy:
+            view.cache_policy = policy
+        self.routes[rule] = paths
+        app.add_url_rule(rule, endpoint, view)
+
+    def preload(self):
+        """Load every registered file up front (e.g. at startup)"""
+        for paths in self.routes.values():
+            self.first_available(paths)
@@ -0,0 +1,151 @@
+"""
+Request-scoped timing spans
+Spans recorded while a request is handled are emitted as a Server-Timing
+header and one structured log line; sampling keeps the overhead negligible
+"""
+
+import functools
+import inspect
+import json
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from flask import Flask, g, request
+
+logger = logging.getLogger(__name__)
+
+_current: ContextVar[Optional['RequestTimings']] = ContextVar('request_timings', default=None)
+
+# Header clients can send to force timing on an unsampled request
+FORCE_HEADER = 'X-Debug-Timing'
+
+
+class RequestTimings:
+    """Spans recorded for one request, aggregated by name"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.lock = threading.Lock()
+
+    def add(self, name: str, duration_ms: float):
+        with self.lock:
+            entry = self.spans.setdefault(name, {'ms': 0.0, 'count': 0})
+            entry['ms'] += duration_ms
+            entry['count'] += 1
+
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.start) * 1000
+
+    def server_timing(self, total_ms: float) -> str:
+        with self.lock:
+            entries = [
+                f"{name};dur={entry['ms']:.1f}" + (f';desc="x{entry["count"]}"' if entry['count'] > 1 else '')
+                for name, entry in self.spans.items()
+            ]
+        entries.append(f"total;dur={total_ms:.1f}")
+        return ', '.join(entries)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self.lock:
+            return {
+                name: {'ms': round(entry['ms'], 1), 'count': entry['count']}
+                for name, entry in self.spans.items()
+            }
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def record(name: str, duration_ms: float):
+    """Add an externally measured duration to the current request"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, duration_ms)
+
+
+@contextmanager
+def span(name: str):
+    """Time a block; a no-op outside a sampled request"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - start) * 1000)
+
+
+def timed(name: str):
+    """Decorator form of span() for sync and async functions"""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class RequestTiming:
+    """
+    Flask extension that opens a timing scope per sampled request.
+
+    sample_rate is the fraction of requests timed; requests carrying the
+    X-Debug-Timing header are always timed.
+    """
+
+    def __init__(self, app: Optional[Flask] = None, sample_rate: float = 1.0):
+        self.sample_rate = sample_rate
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask):
+        app.before_request(self.start)
+        app.after_request(self.finish)
+        app.teardown_request(self.reset)
+
+    def start(self):
+        if request.headers.get(FORCE_HEADER) or random.random() < self.sample_rate:
+            timings = RequestTimings()
+            g.request_timings = timings
+            g.request_timings_token = _current.set(timings)
+
+    def finish(self, response):
+        timings = g.get('request_timings')
+        if timings is None:
+            return response
+
+        total_ms = timings.total_ms()
+        response.headers['Server-Timing'] = timings.server_timing(total_ms)
+        logger.info(json.dumps({
+            'event': 'request_timing',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'total_ms': round(total_ms, 1),
+            'spans': timings.summary()
+        }))
+        return response
+
+    def reset(self, exc=None):
+        token = g.pop('request_timings_token', None)
+        g.pop('request_timings', None)
+        if token is not None:
+            _current.reset(token)
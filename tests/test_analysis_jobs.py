@@ -0,0 +1,64 @@
+import time
+
+import pytest
+
+from services.analysis_jobs import JOB_COMPLETED, JOB_FAILED, AnalysisJobManager
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def wait_for(manager, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job and job['status'] in (JOB_COMPLETED, JOB_FAILED):
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+@pytest.fixture
+def cache():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_results_go_through_the_writer_with_tags(cache):
+    written = []
+
+    def writer(key, payload, ttl, tags):
+        written.append((key, ttl, list(tags)))
+        cache.setex(key, ttl, payload)
+
+    manager = AnalysisJobManager(cache, result_ttl=60, writer=writer)
+    job, created = manager.submit('abc', lambda x: {'value': x}, 1, tags=['comps_analysis', 'property:P1'])
+    assert created
+    assert wait_for(manager, 'abc')['status'] == JOB_COMPLETED
+    assert written == [('abc', 60, ['comps_analysis', 'property:P1'])]
+
+    other = AnalysisJobManager(cache)
+    assert other.result('abc') == {'value': 1}
+    assert other.submit('abc', lambda: pytest.fail('claimed twice'))[1] is False
+
+
+def test_only_ids_with_a_job_record_are_served(cache):
+    cache.set('session:secret', '{"token": 1}')
+    manager = AnalysisJobManager(cache)
+    assert manager.get('session:secret') is None
+    assert manager.result('session:secret') is None
+
+    cache.set('cached', '{"value": 2}')
+    manager.record_completed('cached')
+    assert manager.result('cached') == {'value': 2}
+
+
+def test_failed_jobs_report_their_error_and_can_be_resubmitted(cache):
+    manager = AnalysisJobManager(cache)
+
+    def fail():
+        raise ValueError('boom')
+
+    manager.submit('bad', fail)
+    job = wait_for(manager, 'bad')
+    assert job['status'] == JOB_FAILED and job['error'] == 'boom'
+    assert manager.result('bad') is None
+    assert manager.submit('bad', lambda: {'ok': True})[1] is True
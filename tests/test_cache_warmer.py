@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from services.cache_warmer import CacheWarmer, RateLimiter, RequestRecorder, request_member
+
+
+def member(value, cursor=None):
+    return request_member('POST', '/api/properties/top-revenue', {'cursor': cursor} if cursor else {},
+                          {'location': value, 'cursor': cursor})
+
+
+def test_request_member_ignores_the_page_cursor():
+    assert member('Miami') == member('Miami', cursor='abc')
+    assert json.loads(member('Miami'))['json'] == {'location': 'Miami'}
+
+
+def test_local_recorder_ranks_by_frequency():
+    recorder = RequestRecorder()
+    assert not recorder.persistent
+    for value in ('Miami', 'Tampa', 'Miami'):
+        recorder.record('top_revenue', member(value))
+    assert [request['json']['location'] for request in recorder.top('top_revenue', 5)] == ['Miami', 'Tampa']
+    assert recorder.top('nearby', 5) == []
+
+
+def test_log_file_is_shared_between_recorders(tmp_path):
+    log_path = str(tmp_path / 'warm.log')
+    writer = RequestRecorder(log_path=log_path)
+    assert writer.persistent
+    for value in ('Tampa', 'Miami', 'Miami'):
+        writer.record('top_revenue', member(value))
+    reader = RequestRecorder(log_path=log_path)
+    assert [request['json']['location'] for request in reader.top('top_revenue', 1)] == ['Miami']
+
+
+def test_redis_recorder_trims_to_max_entries():
+    fakeredis = pytest.importorskip('fakeredis')
+    recorder = RequestRecorder(fakeredis.FakeRedis(decode_responses=True), max_entries=2)
+    for i in range(100):
+        recorder.record('nearby', member(f"City {i % 3}"))
+    assert len(recorder.top('nearby', 10)) == 2
+
+
+def test_replay_counts_warmed_and_failed_requests():
+    recorder = RequestRecorder()
+    for value in ('Miami', 'Tampa', 'Nowhere'):
+        recorder.record('top_revenue', member(value))
+
+    def send(request):
+        if request['json']['location'] == 'Tampa':
+            raise ConnectionError('down')
+        return 400 if request['json']['location'] == 'Nowhere' else 200
+
+    result = CacheWarmer(recorder, send, concurrency=2, rate=0).replay(['top_revenue', 'nearby'], 10)
+    assert result['requests'] == 3
+    assert result['prefixes'] == {'top_revenue': {'warmed': 1, 'failed': 2}, 'nearby': {'warmed': 0, 'failed': 0}}
+
+
+def test_rate_limiter_spaces_calls(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr('time.sleep', sleeps.append)
+    limiter = RateLimiter(10)
+    for _ in range(3):
+        limiter.wait()
+    assert len(sleeps) == 2 and all(0 < seconds <= 0.2 for seconds in sleeps)
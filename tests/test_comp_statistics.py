@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+from services.comp_statistics import compute_statistics, correlation_value, weights_vector
+
+# (revenue, occupancy, adr) for four comps
+X = np.array([
+    [50000.0, 0.55, 210.0],
+    [62000.0, 0.61, 240.0],
+    [71000.0, 0.58, 275.0],
+    [90000.0, 0.72, 300.0]
+])
+REVIEWS = [1, 2, 3, 4]
+
+
+def test_unweighted_statistics_match_numpy():
+    stats = compute_statistics(X)
+    assert stats['mean'] == pytest.approx(X.mean(axis=0))
+    assert stats['std'] == pytest.approx(X.std(axis=0))
+    assert stats['median'] == pytest.approx(np.median(X, axis=0))
+    assert stats['p25'] == pytest.approx(np.percentile(X, 25, axis=0))
+    assert stats['min'] == pytest.approx(X.min(axis=0))
+    assert stats['max'] == pytest.approx(X.max(axis=0))
+    assert stats['correlation'] == pytest.approx(np.corrcoef(X, rowvar=False))
+
+
+def test_weighted_mean_and_correlation_match_repeated_rows():
+    weights = np.asarray(REVIEWS, dtype=float)
+    stats = compute_statistics(X, weights)
+    repeated = np.repeat(X, REVIEWS, axis=0)
+    assert stats['mean'] == pytest.approx(np.average(X, axis=0, weights=weights))
+    assert stats['std'] == pytest.approx(repeated.std(axis=0))
+    assert stats['correlation'] == pytest.approx(np.corrcoef(repeated, rowvar=False))
+    # Weighting moves the quantiles but not the extremes
+    assert stats['min'] == pytest.approx(X.min(axis=0))
+    assert stats['max'] == pytest.approx(X.max(axis=0))
+
+
+def test_weighted_median():
+    # Midpoint cumulative weights 1/8, 3/8 and 3/4 put the median a third of the way from 2 to 3
+    stats = compute_statistics(np.array([[1.0], [2.0], [3.0]]), np.array([1.0, 1.0, 2.0]))
+    assert stats['median'][0] == pytest.approx(2 + 1 / 3)
+
+
+def test_constant_metric_has_no_correlation():
+    stats = compute_statistics(np.column_stack([X[:, 0], np.full(4, 0.6)]))
+    assert correlation_value(stats['correlation'], 0, 1) is None
+    assert correlation_value(stats['correlation'], 0, 0) == 1.0
+
+
+def test_single_property_has_no_correlation():
+    assert np.isnan(compute_statistics(X[:1])['correlation']).all()
+
+
+def test_weights_vector():
+    data = [{'review_count': count} for count in (3, None, -2, 5)]
+    assert weights_vector(data, None) is None
+    assert weights_vector(data, 'review_count').tolist() == [3.0, 0.0, 0.0, 5.0]
+    # No positive weight at all falls back to equal weighting
+    assert weights_vector([{'review_count': 0}, {}], 'review_count') is None
+    with pytest.raises(ValueError):
+        weights_vector(data, 'rating')
@@ -0,0 +1,40 @@
+import pytest
+
+bigquery = pytest.importorskip('google.cloud.bigquery')
+
+
+@pytest.fixture(scope='module')
+def app_module():
+    # The app builds a BigQuery client at import; nothing here runs a query
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(bigquery, 'Client', lambda *args, **kwargs: None)
+        import app
+    return app
+
+
+def error_fields(app_module, body):
+    return [error['field'] for error in app_module.validate_analysis_request(body)]
+
+
+def test_weight_by_is_validated(app_module):
+    assert error_fields(app_module, {'property_ids': ['P1', 'P2'], 'weight_by': 'review_count'}) == []
+    assert error_fields(app_module, {'property_ids': ['P1', 'P2'], 'weight_by': 'rating'}) == ['weight_by']
+
+
+def test_analysis_type_is_validated(app_module):
+    assert error_fields(app_module, {'property_ids': ['P1', 'P2'], 'analysis_type': 'multivariate'}) == []
+    assert error_fields(app_module, {'property_ids': ['P1', 'P2'], 'analysis_type': 'bogus'}) == ['analysis_type']
+
+
+def test_cache_key_depends_on_weighting_but_not_id_order(app_module):
+    key = app_module.comparables_cache_key
+    assert key(['P1', 'P2'], 'standard', None) == key(['P2', 'P1'], 'standard', None)
+    assert key(['P1', 'P2'], 'standard', None) != key(['P1', 'P2'], 'standard', 'review_count')
+    assert key(['P1', 'P2'], 'standard', None) != key(['P1', 'P2'], 'iqr', None)
+
+
+def test_invalid_weight_by_is_rejected_by_the_api(app_module):
+    client = app_module.app.test_client()
+    response = client.post('/api/analyze_comparables', json={'property_ids': ['P1', 'P2'], 'weight_by': 'rating'})
+    assert response.status_code == 400
+    assert response.get_json()['details'][0]['field'] == 'weight_by'
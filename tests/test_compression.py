@@ -0,0 +1,68 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from services.compression import ResponseCompression
+
+BODY = b'{"rows": [' + b'{"revenue": 123456.78}, ' * 200 + b'{}]}'
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    compression = ResponseCompression(app, min_size=1024, max_cached_bodies=2)
+    compression.encodings = ['gzip']
+    app.compression = compression
+
+    @app.route('/big')
+    def big():
+        response = app.response_class(BODY, mimetype='application/json')
+        response.set_etag('abc')
+        return response
+
+    @app.route('/small')
+    def small():
+        return app.response_class(b'{}', mimetype='application/json')
+
+    @app.route('/page')
+    def page():
+        response = app.response_class(BODY, mimetype='text/html')
+        response.precompressed = {'gzip': b'precompressed'}
+        return response
+
+    return app
+
+
+def test_gzip_negotiation_and_weak_etag(app):
+    response = app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert response.headers['ETag'] == 'W/"abc"'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == BODY
+
+
+def test_uncompressed_without_accept_encoding_or_below_min_size(app):
+    client = app.test_client()
+    assert 'Content-Encoding' not in client.get('/big', headers={'Accept-Encoding': 'identity'}).headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_dynamic_bodies_are_cached_by_etag_in_a_bounded_lru(app):
+    compression = app.compression
+    app.test_client().get('/big', headers={'Accept-Encoding': 'gzip'})
+    assert list(compression.compressed) == [('abc', 'gzip')]
+    compression.encode(b'a' * 2000, 'gzip', 'b')
+    compression.encode(b'c' * 2000, 'gzip', 'c')
+    assert list(compression.compressed) == [('b', 'gzip'), ('c', 'gzip')]
+
+
+def test_precompressed_bodies_bypass_the_lru(app):
+    response = app.test_client().get('/page', headers={'Accept-Encoding': 'gzip'})
+    assert response.data == b'precompressed'
+    assert not app.compression.compressed
+
+
+def test_precompress_skips_small_bodies(app):
+    assert app.compression.precompress(b'{}') == {}
+    assert gzip.decompress(app.compression.precompress(BODY)['gzip']) == BODY
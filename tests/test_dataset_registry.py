@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from services.dataset_registry import DatasetRegistry
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def cache():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+@pytest.fixture
+def registry(cache):
+    return DatasetRegistry('proj', 'june', cache=cache, check_interval=0, tag_ttl=100)
+
+
+def test_tables_follow_the_version():
+    dataset = DatasetRegistry('proj', 'june').current()
+    assert dataset.property_table == 'proj.junemonthly.juneproperty'
+    assert dataset.monthly_table == 'proj.junemonthly.junemonthly'
+    assert dataset.rollup_table == 'proj.junemonthly.property_monthly_rollup'
+
+
+def test_cutover_moves_every_worker(cache, registry):
+    other = DatasetRegistry('proj', 'june', cache=cache, check_interval=0)
+    assert registry.cutover('july') == 'june'
+    assert other.version == 'july'
+
+
+def test_pinned_only_affects_the_calling_thread(registry):
+    with registry.pinned('july') as dataset:
+        assert dataset.version == registry.version == 'july'
+    assert registry.version == 'june'
+
+
+def test_invalidate_deletes_tagged_keys(cache, registry):
+    cache.set('a', 1)
+    cache.set('b', 1)
+    registry.tag('a', ['nearby', 'property:P1'], 60)
+    registry.tag('b', ['nearby'], 60)
+    assert registry.invalidate('property:P1') == 1
+    assert cache.get('a') is None and cache.get('b') == '1'
+    assert registry.invalidate('nearby') == 1
+    assert not cache.exists(registry.tag_key('nearby', 'june'))
+
+
+def test_expired_members_are_pruned(cache, registry, monkeypatch):
+    registry.tag('a', ['nearby'], 10)
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now + 20)
+    registry.tag('b', ['nearby'], 10)
+    tag_key = registry.tag_key('nearby', 'june')
+    assert cache.zrange(tag_key, 0, -1) == ['b']
+    assert 0 < cache.ttl(tag_key) <= 100
+
+
+def test_retire_deletes_a_versions_keys(cache, registry):
+    cache.set('a', 1)
+    cache.set('fragments:details:june:P1', 1)
+    registry.tag('a', ['nearby'], 60)
+    registry.tag('a', ['top_revenue'], 60, version='july')
+    assert registry.retire('june', patterns=['fragments:*:june:*']) == 2
+    assert cache.exists(registry.tag_key('top_revenue', 'july'))
+
+
+def test_without_redis_tagging_is_a_no_op():
+    registry = DatasetRegistry('proj', 'june')
+    registry.tag('a', ['nearby'], 60)
+    assert registry.invalidate('nearby') == 0
+    assert registry.cutover('july') == 'june' and registry.version == 'july'
@@ -0,0 +1,43 @@
+import pytest
+
+from services.fieldsets import FieldSelectionError, FieldSet
+
+
+@pytest.fixture
+def fieldset():
+    return FieldSet(
+        groups={
+            'metrics': ['revenue', 'occupancy'],
+            'location': ['lat', 'lng'],
+            'details': ['bedrooms', 'revenue'],
+            'comps': []
+        },
+        always=['property_id'],
+        aliases={'summary': ['metrics', 'location']},
+        dependencies={'comps': ['location']}
+    )
+
+
+def test_empty_value_selects_every_group(fieldset):
+    assert fieldset.parse(None) == set(fieldset.groups)
+    assert fieldset.parse('') == set(fieldset.groups)
+    assert fieldset.parse(' , ') == set(fieldset.groups)
+
+
+def test_parse_strings_lists_and_aliases(fieldset):
+    assert fieldset.parse('Metrics, details') == {'metrics', 'details'}
+    assert fieldset.parse(['summary']) == {'metrics', 'location'}
+
+
+def test_unknown_group_lists_available_names(fieldset):
+    with pytest.raises(FieldSelectionError, match='summary'):
+        fieldset.parse('metrics,bogus')
+
+
+def test_required_adds_dependencies(fieldset):
+    assert fieldset.required({'comps'}) == {'comps', 'location'}
+
+
+def test_select_list_keeps_definition_order_without_duplicates(fieldset):
+    assert fieldset.select_list({'details', 'metrics'}, ', ') == 'property_id, revenue, occupancy, bedrooms'
+    assert fieldset.select_list({'comps'}, ', ') == 'property_id'
@@ -0,0 +1,57 @@
+import time
+
+import pytest
+
+from services.fragment_cache import MISSING, FragmentCache
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+@pytest.fixture
+def cache():
+    return fakeredis.FakeRedis(decode_responses=True)
+
+
+def test_fragments_are_shared_through_redis(cache):
+    FragmentCache(cache).set_many('row', 'v1', {'P1': {'revenue': 1}, 'P2': MISSING})
+    hits = FragmentCache(cache).get_many('row', 'v1', ['P1', 'P2', 'P3'])
+    assert hits == {'P1': {'revenue': 1}, 'P2': MISSING}
+
+
+def test_local_copies_keep_the_remaining_redis_ttl(cache):
+    FragmentCache(cache).set_many('row', 'v1', {'P1': MISSING}, ttl=60)
+    reader = FragmentCache(cache, ttl=86400)
+    reader.get_many('row', 'v1', ['P1'])
+    expires_at, _ = reader.local[reader.key('row', 'v1', 'P1')]
+    assert expires_at - time.time() <= 60
+
+
+def test_keys_without_expiry_use_the_default_ttl(cache):
+    reader = FragmentCache(cache, ttl=100)
+    cache.set(reader.key('row', 'v1', 'P1'), '{"revenue": 1}')
+    assert reader.get_many('row', 'v1', ['P1']) == {'P1': {'revenue': 1}}
+    expires_at, _ = reader.local[reader.key('row', 'v1', 'P1')]
+    assert 90 < expires_at - time.time() <= 100
+
+
+def test_invalidate_clears_redis_and_every_local_tier(cache):
+    writer = FragmentCache(cache, check_interval=0)
+    reader = FragmentCache(cache, check_interval=0)
+    writer.set_many('row', 'v1', {'P1': {'revenue': 1}, 'P2': {'revenue': 2}})
+    writer.set_many('details', 'v1:stats', {'P1': {'a': 1}})
+    assert set(reader.get_many('row', 'v1', ['P1', 'P2'])) == {'P1', 'P2'}
+
+    assert writer.invalidate(['P1']) == 2
+    assert reader.get_many('row', 'v1', ['P1', 'P2']) == {'P2': {'revenue': 2}}
+
+    writer.invalidate()
+    cache.delete(reader.key('row', 'v1', 'P2'))
+    assert reader.get_many('row', 'v1', ['P2']) == {}
+
+
+def test_without_redis_only_the_local_tier_is_used():
+    fragments = FragmentCache(max_local_entries=1)
+    fragments.set_many('row', 'v1', {'P1': 1, 'P2': 2})
+    assert fragments.get_many('row', 'v1', ['P1', 'P2']) == {'P2': 2}
+    assert fragments.invalidate(['P2']) == 0
+    assert fragments.get_many('row', 'v1', ['P2']) == {}
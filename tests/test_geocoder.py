@@ -0,0 +1,95 @@
+import pytest
+
+from services.geocoder import KIND_CITY, KIND_NEIGHBORHOOD, KIND_POSTAL, KIND_STATE, OfflineGeocoder, normalize
+
+ROWS = [
+    (KIND_CITY, 'Miami', '', 'FL', 25.76, -80.19, 900),
+    (KIND_CITY, 'Miami Beach', '', 'FL', 25.79, -80.13, 700),
+    (KIND_CITY, 'Portland', '', 'OR', 45.52, -122.68, 500),
+    (KIND_CITY, 'Portland', '', 'ME', 43.66, -70.26, 200),
+    (KIND_CITY, 'Seattle', '', 'WA', 47.61, -122.33, 800),
+    (KIND_CITY, 'San Diego', '', 'CA', 32.72, -117.16, 600),
+    (KIND_NEIGHBORHOOD, 'South Beach', 'Miami Beach', 'FL', 25.78, -80.13, 300),
+    (KIND_POSTAL, '2108.0', 'Boston', 'MA', 42.36, -71.07, 50),
+    (KIND_STATE, 'Florida', '', 'Florida', 27.99, -81.76, 1600)
+]
+
+
+def query_rows(rows=ROWS):
+    keys = ('kind', 'name', 'city', 'state', 'lat', 'lng', 'properties')
+    return [dict(zip(keys, row)) for row in rows]
+
+
+@pytest.fixture
+def geocoder(tmp_path):
+    geocoder = OfflineGeocoder(str(tmp_path / 'geocoder.json'), version='v1')
+    geocoder.load(query_rows)
+    return geocoder
+
+
+def test_normalize():
+    assert normalize("  Coeur d'Alene, ID ") == 'coeur dalene id'
+
+
+def test_lookup_exact_typo_and_state(geocoder):
+    assert geocoder.lookup('Miami Beach').name == 'Miami Beach'
+    assert geocoder.lookup('miami beech').name == 'Miami Beach'
+    assert geocoder.lookup('Portland').state == 'OR'
+    assert geocoder.lookup('Portland, ME').state == 'ME'
+    assert geocoder.lookup('Tallahassee, FL').name == 'Florida'
+    assert geocoder.lookup('nowhere at all') is None
+
+
+def test_lookup_postal_codes_keep_leading_zeros(geocoder):
+    place = geocoder.lookup('02108')
+    assert place.kind == KIND_POSTAL and place.name == '02108'
+    assert "= '02108'" in place.filter_sql()
+
+
+def test_index_is_reused_from_the_cache_file(geocoder, tmp_path):
+    calls = []
+    other = OfflineGeocoder(geocoder.cache_path, version='v1')
+    other.load(lambda: calls.append(1) or query_rows())
+    assert not calls and other.source == 'cache_file'
+    assert other.stats()['places'] == geocoder.stats()['places']
+
+
+def test_ensure_loaded_rebuilds_for_a_new_version(geocoder):
+    geocoder.ensure_loaded(lambda: pytest.fail('same version must not reload'), 'v1')
+    geocoder.ensure_loaded(lambda: query_rows(ROWS[:1]), 'v2')
+    assert geocoder.version == 'v2'
+    assert geocoder.source == 'bigquery'
+    assert geocoder.lookup('Seattle') is None
+
+
+def test_failed_build_falls_back_to_seed_cities(tmp_path):
+    geocoder = OfflineGeocoder(str(tmp_path / 'geocoder.json'))
+    geocoder.load(lambda: [])
+    assert geocoder.source == 'seed'
+    assert geocoder.lookup('Austin, TX').name == 'Austin'
+
+
+def test_location_ids_resolve_including_postal_codes(geocoder):
+    assert geocoder.place('city:fl:miami-beach').name == 'Miami Beach'
+    assert geocoder.place('neighborhood:fl:miami-beach:south-beach').name == 'South Beach'
+    assert geocoder.place('postal:ma:02108').name == '02108'
+    assert geocoder.place('city:fl:nowhere') is None
+
+
+def test_suggest_ranks_name_starts_before_word_matches(geocoder):
+    assert [place.name for place in geocoder.suggest('s', limit=3)] == ['Seattle', 'San Diego', 'South Beach']
+    assert [place.name for place in geocoder.suggest('beach')] == ['Miami Beach', 'South Beach']
+    assert [place.name for place in geocoder.suggest('021')] == ['02108']
+
+
+def test_suggest_filters_by_kind_and_state(geocoder):
+    assert [place.state for place in geocoder.suggest('portland, m')] == ['ME']
+    assert [place.name for place in geocoder.suggest('mia', kinds={KIND_CITY})] == ['Miami', 'Miami Beach']
+    assert geocoder.suggest('') == []
+
+
+def test_short_prefix_falls_back_to_a_full_scan_when_filters_leave_too_few(tmp_path, monkeypatch):
+    monkeypatch.setattr('services.geocoder.SHORT_PREFIX_TOP', 2)
+    geocoder = OfflineGeocoder(str(tmp_path / 'geocoder.json'))
+    geocoder.load(query_rows)
+    assert [place.name for place in geocoder.suggest('s', kinds={KIND_NEIGHBORHOOD})] == ['South Beach']
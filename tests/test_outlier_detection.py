@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from services.outlier_detection import (
+    ANALYSIS_TYPES, applicable_method, detect_outliers, mahalanobis_critical_distance,
+    mahalanobis_scores, metrics_matrix, resolve_method
+)
+
+# One metric: nine zeros and a 10 (mean 1, population std 3, sample std sqrt(10))
+SPIKE = np.array([[0.0]] * 9 + [[10.0]])
+# One metric with quartiles 2 and 4 and median 3 / MAD 1
+SKEWED = np.array([[1.0], [2.0], [3.0], [4.0], [100.0]])
+# Three comps plus one far off, in (revenue, occupancy, adr)
+SMALL_SET = np.array([
+    [100.0, 0.50, 200.0],
+    [110.0, 0.55, 210.0],
+    [105.0, 0.52, 205.0],
+    [1000.0, 0.90, 900.0]
+])
+
+
+def test_metrics_matrix_treats_missing_values_as_zero():
+    X = metrics_matrix([{'revenue_ltm': 10, 'occupancy_ltm': None, 'adr_ltm': 5}, {}])
+    assert X.tolist() == [[10.0, 0.0, 5.0], [0.0, 0.0, 0.0]]
+
+
+def test_two_sigma():
+    mask, scores, overall = detect_outliers(SPIKE, '2_sigma')
+    assert mask.tolist() == [False] * 9 + [True]
+    assert overall[-1] == pytest.approx(3.0)
+    assert overall[0] == pytest.approx(1 / 3)
+
+
+def test_iqr():
+    mask, _, overall = detect_outliers(SKEWED, 'iqr')
+    assert mask.tolist() == [False, False, False, False, True]
+    assert overall.tolist() == [0.5, 0.0, 0.0, 0.0, 48.0]
+
+
+def test_mad():
+    mask, _, overall = detect_outliers(SKEWED, 'mad')
+    assert mask.tolist() == [False, False, False, False, True]
+    assert overall[0] == pytest.approx(0.6745 * 2)
+    assert overall[-1] == pytest.approx(0.6745 * 97)
+
+
+def test_mahalanobis():
+    mask, _, distances = detect_outliers(SPIKE, 'mahalanobis')
+    assert mask.tolist() == [False] * 9 + [True]
+    assert distances[-1] == pytest.approx(9 / np.sqrt(10))
+    # Reachable: below the largest distance a sample of 10 allows
+    assert 1 < mahalanobis_critical_distance(10, 1, 0.975) < 9 / np.sqrt(10)
+
+
+def test_constant_metric_is_never_flagged():
+    X = np.column_stack([np.full(5, 7.0), SKEWED[:, 0]])
+    for method in ('2_sigma', 'iqr', 'mad'):
+        _, scores, _ = detect_outliers(X, method)
+        assert not scores[:, 0].any()
+
+
+def test_fewer_than_three_properties_flags_nothing():
+    mask, scores, overall = detect_outliers(np.array([[1.0], [100.0]]), 'mad')
+    assert not mask.any() and not overall.any()
+
+
+def test_mahalanobis_cannot_separate_small_comp_sets():
+    # With n <= k + 1 every point sits at (n - 1) / sqrt(n)
+    with pytest.raises(ValueError):
+        mahalanobis_critical_distance(4, 3, 0.975)
+    centered = SMALL_SET - SMALL_SET.mean(axis=0)
+    inverse = np.linalg.pinv(np.cov(SMALL_SET, rowvar=False))
+    distances = np.sqrt(np.einsum('ij,jk,ik->i', centered, inverse, centered))
+    assert distances == pytest.approx([1.5] * 4)
+    with pytest.raises(ValueError):
+        mahalanobis_scores(SMALL_SET, 0.975)
+
+
+def test_small_comp_sets_fall_back_to_mad():
+    assert applicable_method('mahalanobis', 4) == 'mad'
+    assert applicable_method('mahalanobis', 5) == 'mahalanobis'
+    assert applicable_method('iqr', 3) == 'iqr'
+    mask, _, _ = detect_outliers(SMALL_SET, 'mahalanobis')
+    assert mask.tolist() == [False, False, False, True]
+    assert mask.tolist() == detect_outliers(SMALL_SET, 'mad')[0].tolist()
+
+
+def test_analysis_types():
+    assert resolve_method('multivariate') == 'mahalanobis'
+    assert resolve_method('robust') == 'mad'
+    assert resolve_method(None) == '2_sigma'
+    assert resolve_method('iqr') == 'iqr'
+    assert set(ANALYSIS_TYPES) >= {'standard', 'iqr', 'robust', 'multivariate', '2_sigma', 'mahalanobis'}
+    with pytest.raises(ValueError):
+        detect_outliers(SPIKE, 'standard')
@@ -0,0 +1,54 @@
+import pyarrow as pa
+import pytest
+
+from services.pagination import (
+    InvalidCursorError, PaginationError, decode_cursor, encode_cursor, keyset_clause,
+    page_start, pagination_info, parse_page_size, sort_keys
+)
+
+QUERY_KEY = 'top_revenue:abcdef0123456789'
+
+
+def test_parse_page_size():
+    assert parse_page_size('25', 100) == 25
+    for value in ('abc', None, 0, 101):
+        with pytest.raises(PaginationError):
+            parse_page_size(value, 100)
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(QUERY_KEY, (1234.5, 'P-1'))
+    assert '=' not in cursor
+    assert decode_cursor(cursor, QUERY_KEY) == (1234.5, 'P-1')
+
+
+def test_cursor_rejects_other_queries_and_garbage():
+    cursor = encode_cursor(QUERY_KEY, (1.0, 'P1'))
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, 'nearby:0000000000000000')
+    for bad in ('not-a-cursor', encode_cursor(QUERY_KEY, (1.0, "P1' OR 1=1")),
+                encode_cursor(QUERY_KEY, (True, 'P1'))):
+        with pytest.raises(InvalidCursorError):
+            decode_cursor(bad, QUERY_KEY)
+
+
+def test_page_start_breaks_ties_by_property_id():
+    table = pa.table({'revenue': [300.0, 200.0, 200.0, 100.0], 'Property ID': ['A', 'B', 'C', 'D']})
+    keys = sort_keys(table, 'revenue')
+    assert page_start(keys, None, descending=True) == 0
+    assert page_start(keys, (200.0, 'B'), descending=True) == 2
+    assert page_start(keys, (100.0, 'D'), descending=True) == 4
+    assert page_start(sorted(keys), (200.0, 'B'), descending=False) == 2
+
+
+def test_keyset_clause():
+    assert keyset_clause('p', 'revenue', None, True) == ''
+    clause = keyset_clause('p', 'revenue', (200.0, 'B'), True)
+    assert "p.revenue < 200.0" in clause
+    assert "p.`Property ID` > 'B'" in clause
+
+
+def test_pagination_info():
+    info = pagination_info(2, [200.0, 'B'], True, QUERY_KEY)
+    assert decode_cursor(info['next_cursor'], QUERY_KEY) == (200.0, 'B')
+    assert pagination_info(2, [200.0, 'B'], False, QUERY_KEY)['next_cursor'] is None